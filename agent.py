@@ -1,14 +1,26 @@
 from langgraph.graph import StateGraph, END, START
-from langchain_core.rate_limiters import InMemoryRateLimiter
-from langgraph.prebuilt import ToolNode
+from langchain_core.runnables import RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from tools import get_rendered_html, download_file, post_request, run_code, add_dependencies, transcribe_audio, analyze_image
-from typing import TypedDict, Annotated, List, Any
-from langchain.chat_models import init_chat_model
+from langchain_core.messages import HumanMessage, ToolMessage
+from tools import get_rendered_html, download_file, post_request, run_code, add_dependencies, transcribe_audio, analyze_image, read_tool_output
+from typing import TypedDict, Annotated, List, Any, Optional
 from langgraph.graph.message import add_messages
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from logger_config import get_logger, log_task_start, log_task_end
+from tool_executor import ToolExecutor
+from context_window import (build_context, completed_task_summaries, estimate_tokens, next_task_url, resumed_history,
+                            task_boundaries)
+from jobs import current_job, record_job_metric, set_task_number
+from metrics import instrument_node, observe_llm
+from llm_limiter import llm_limiter, is_rate_limited, is_transient
+from prompt_cache import prompt_cache
+from checkpoints import checkpoint_store
+from deadlines import must_submit, record_task_end, remaining, submitted_in_task, time_hint, with_time_hint
+from model_router import model_router, light_limiter, RULE, LIGHT, STRONG
 
 load_dotenv()
 
@@ -24,24 +36,21 @@ logger = get_logger("agent")
 class AgentState(TypedDict):
     messages: Annotated[List, add_messages]
     task_counter: int  # Track task number
+    task_started_at: float  # Deadline clock of the current task (time.time())
 
 
-TOOLS = [run_code, get_rendered_html, download_file, post_request, add_dependencies, transcribe_audio, analyze_image]
+TOOLS = [run_code, get_rendered_html, download_file, post_request, add_dependencies, transcribe_audio, analyze_image, read_tool_output]
 
 
 # -------------------------------------------------
 # GEMINI LLM
 # -------------------------------------------------
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=9/60,  
-    check_every_n_seconds=1,  
-    max_bucket_size=9  
-)
-llm = init_chat_model(
-   model_provider="google_genai",
-   model="gemini-2.5-flash",
-   rate_limiter=rate_limiter
-).bind_tools(TOOLS)   
+# Calls are admitted by llm_limiter (shared across workers and processes) and
+# 429s surface to us instead of being retried blindly inside the client
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_MODEL = "gemini-2.5-flash"
+# Built on first use: the langchain/Gemini client stack is the slowest part of startup
+llm = None
 
 
 # -------------------------------------------------
@@ -68,6 +77,7 @@ GENERAL RULES:
 - NEVER re-submit unless the server explicitly allows or it's within the 3-minute limit.
 - ALWAYS inspect the server response before deciding what to do next.
 - ALWAYS use the tools provided to fetch, scrape, download, render HTML, or send requests.
+- When several tool calls do not depend on each other (e.g. downloading multiple files), request them together in one turn; they run in parallel.
 
 FILE MANAGEMENT RULES:
 - When you use download_file, files are saved to data/downloads/ directory.
@@ -76,11 +86,19 @@ FILE MANAGEMENT RULES:
 - NEVER re-download files in Python code using requests.get() or similar - use the local files.
 - File paths in Python code: "data/downloads/filename.csv" or "data/audio/audio.m4a"
 - Example: If you downloaded "demo.csv", use pd.read_csv("data/downloads/demo.csv") NOT requests.get(url)
+- get_rendered_html returns a digest of the page (text, forms, tables as CSV, media/file links, links) with absolute URLs, plus the path of the raw HTML under data/pages/. If something you need is missing from the digest, parse that saved HTML file with run_code instead of fetching the page again.
+
+CONTEXT RULES:
+- Completed tasks are replaced by a short summary; do not try to recall their details.
+- Long tool outputs are truncated with a handle. Use read_tool_output with that handle to read more instead of re-running the tool.
 
 TIME LIMIT RULES:
 - Each task has a hard 3-minute limit.
+- Your latest input ends with a [Task N clock] note showing the time left; when it tells you to submit, call post_request with your best answer immediately.
+- Slow tool calls are stopped when the task runs out of time; use what you already have rather than repeating them.
 - The server response includes a "delay" field indicating elapsed time.
 - If your answer is wrong retry again.
+- run_code is killed when it runs too long or uses too much memory; if its result has "timed_out" or "oom_killed" set, simplify or chunk the computation instead of retrying it unchanged.
 
 STOPPING CONDITION:
 - Only return "END" when a server response explicitly contains NO new URL.
@@ -107,25 +125,239 @@ prompt = ChatPromptTemplate.from_messages([
     MessagesPlaceholder(variable_name="messages")
 ])
 
-llm_with_prompt = prompt | llm
+# With an explicit context cache the system prompt and tools live server-side,
+# so only the conversation is sent
+cached_prompt = ChatPromptTemplate.from_messages([MessagesPlaceholder(variable_name="messages")])
+
+llm_with_prompt = None
+_default_chain = None
+# Same prompt and tools, but the model must call post_request (used when time is nearly up)
+_submit_chain = None
+# Same prompt and tools on model_router.light_model, for routine turns
+_light_chain = None
+_cached_chains = {}
+_llm_lock = threading.Lock()
+prompt_cache.configure(LLM_MODEL, SYSTEM_PROMPT, TOOLS)
+
+
+def get_llm_with_prompt():
+    """Create the Gemini client and prompt chain once, on the first LLM call."""
+    global llm, llm_with_prompt, _default_chain, _submit_chain, _light_chain
+    with _llm_lock:
+        if llm_with_prompt is None:
+            from langchain.chat_models import init_chat_model
+            started = time.perf_counter()
+            base = init_chat_model(
+               model_provider="google_genai",
+               model=LLM_MODEL,
+               max_retries=1
+            )
+            llm = base.bind_tools(TOOLS)
+            llm_with_prompt = _default_chain = prompt | llm
+            _submit_chain = prompt | base.bind_tools(TOOLS, tool_choice="post_request")
+            if model_router.light_model:
+                _light_chain = prompt | init_chat_model(
+                    model_provider="google_genai",
+                    model=model_router.light_model,
+                    max_retries=1
+                ).bind_tools(TOOLS)
+            logger.info(f"LLM client ready in {time.perf_counter() - started:.2f}s")
+        return llm_with_prompt
+
+
+def _select_chain(force_submit: bool = False, tier: str = STRONG):
+    """
+    (chain, cached): the chain referencing the prompt cache when one is live,
+    else the full prompt; force_submit selects the chain that must call post_request
+    and the light tier the light model's chain.
+    """
+    chain = get_llm_with_prompt()
+    # An assigned llm_with_prompt (fake or replayed model) is always used as is
+    if chain is not _default_chain:
+        return chain, False
+    if force_submit:
+        # A cached prompt cannot carry a per-call tool_config, so this turn sends the full prompt
+        return _submit_chain, False
+    if tier == LIGHT and _light_chain is not None:
+        # The prompt cache holds the strong model's prefix; light calls send the full prompt
+        return _light_chain, False
+    name = prompt_cache.get()
+    if name is None:
+        return chain, False
+    with _llm_lock:
+        if name not in _cached_chains:
+            from langchain.chat_models import init_chat_model
+            _cached_chains.clear()
+            _cached_chains[name] = cached_prompt | init_chat_model(
+                model_provider="google_genai",
+                model=LLM_MODEL,
+                max_retries=1,
+                cached_content=name
+            )
+        return _cached_chains[name], True
 
 
 # -------------------------------------------------
 # AGENT NODE
 # -------------------------------------------------
-def agent_node(state: AgentState):
-    # Check if this is a new URL (user message with URL)
+def _track_task(state: AgentState):
+    """
+    Log a task start when the last message is a new URL, or when a submission
+    in the last tool turn returned the next quiz URL, and restart the deadline
+    clock; return the task number and when it started. Each task start is
+    checkpointed so an interrupted chain resumes there.
+    """
+    task_num = state.get("task_counter", 0)
+    task_started_at = state.get("task_started_at")
     last_msg = state["messages"][-1]
+    started_url = None
     if hasattr(last_msg, "type") and last_msg.type == "human":
         # Extract URL from message
         content = last_msg.content if hasattr(last_msg, "content") else str(last_msg)
         if content.startswith("http"):
-            task_num = state.get("task_counter", 0) + 1
-            log_task_start(content, task_num)
-            state["task_counter"] = task_num
-    
-    result = llm_with_prompt.invoke({"messages": state["messages"]})
-    return {"messages": state["messages"] + [result]}
+            started_url = content
+    else:
+        for msg in reversed(state["messages"]):
+            if not isinstance(msg, ToolMessage):
+                break
+            started_url = next_task_url(msg)
+            if started_url:
+                break
+    if started_url:
+        if task_num > 0:
+            record_task_end(task_num, task_started_at)
+        task_num += 1
+        task_started_at = time.time()
+        log_task_start(started_url, task_num)
+        job = current_job.get()
+        if job is not None:
+            checkpoint_store.advance(job.id, task_num, started_url, completed_task_summaries(state["messages"]))
+    set_task_number(task_num)
+    return task_num, task_started_at
+
+
+def _prepare_turn(state: AgentState):
+    """
+    Track the task clock, route the turn and build its context with a time-left note.
+    Returns the state updates, the context, whether the model must submit now and the route.
+    """
+    task_num, task_started_at = _track_task(state)
+    messages = state["messages"]
+    boundaries = task_boundaries(messages)
+    task_start = boundaries[-1] if boundaries else 0
+    submitted = submitted_in_task(messages, task_start)
+    left = remaining(task_started_at)
+    force_submit = must_submit(left, submitted)
+    if force_submit:
+        logger.warning(f"Task {task_num}: {left:.0f}s left and nothing submitted; requiring post_request")
+        record_job_metric("forced_submissions", 1)
+    route = model_router.decide(messages, task_start, force_submit)
+    updates = {"task_counter": task_num, "task_started_at": task_started_at}
+    if route.tier == RULE:
+        # No model call, so no context either
+        return updates, None, force_submit, route
+    context = with_time_hint(build_context(messages), time_hint(task_num, left, submitted))
+    return updates, context, force_submit, route
+
+
+def _task_deadline():
+    job = current_job.get()
+    return job.task_deadline() if job is not None else None
+
+
+def _call_llm(context, force_submit: bool = False, tier: str = STRONG):
+    """One LLM turn through the tier's shared rate limiter, retrying after 429s."""
+    tokens = estimate_tokens(context)
+    limiter = light_limiter if tier == LIGHT else llm_limiter
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        ticket = limiter.acquire(tokens, _task_deadline())
+        chain, cached = _select_chain(force_submit, tier)
+        started = time.perf_counter()
+        try:
+            result = chain.invoke({"messages": context})
+        except Exception as e:
+            if cached and attempt < LLM_MAX_RETRIES and not (is_rate_limited(e) or is_transient(e)):
+                # Typically a cache that expired or was deleted: retry with the full prompt
+                prompt_cache.invalidate(e)
+                continue
+            if attempt == LLM_MAX_RETRIES or not (is_rate_limited(e) or is_transient(e)):
+                raise
+            if is_rate_limited(e):
+                limiter.throttled(e)
+            else:
+                logger.warning(f"LLM call failed ({e}); retrying")
+                time.sleep(min(2 ** attempt, 30))
+            continue
+        seconds = time.perf_counter() - started
+        observe_llm(result, seconds, cached, tier)
+        prompt_cache.record(cached, seconds, getattr(result, "usage_metadata", None))
+        limiter.settle(ticket, getattr(result, "usage_metadata", None))
+        return result
+
+
+async def _acall_llm(context, force_submit: bool = False, tier: str = STRONG):
+    tokens = estimate_tokens(context)
+    limiter = light_limiter if tier == LIGHT else llm_limiter
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        ticket = await limiter.aacquire(tokens, _task_deadline())
+        chain, cached = await asyncio.to_thread(_select_chain, force_submit, tier)
+        started = time.perf_counter()
+        try:
+            result = await chain.ainvoke({"messages": context})
+        except Exception as e:
+            if cached and attempt < LLM_MAX_RETRIES and not (is_rate_limited(e) or is_transient(e)):
+                # Typically a cache that expired or was deleted: retry with the full prompt
+                prompt_cache.invalidate(e)
+                continue
+            if attempt == LLM_MAX_RETRIES or not (is_rate_limited(e) or is_transient(e)):
+                raise
+            if is_rate_limited(e):
+                limiter.throttled(e)
+            else:
+                logger.warning(f"LLM call failed ({e}); retrying")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        seconds = time.perf_counter() - started
+        observe_llm(result, seconds, cached, tier)
+        prompt_cache.record(cached, seconds, getattr(result, "usage_metadata", None))
+        limiter.settle(ticket, getattr(result, "usage_metadata", None))
+        return result
+
+
+def agent_node(state: AgentState):
+    updates, context, force_submit, route = _prepare_turn(state)
+    started = time.perf_counter()
+    result = route.message
+    if route.tier == LIGHT:
+        try:
+            result = _call_llm(context, force_submit, LIGHT)
+        except Exception as e:
+            logger.warning(f"Light model call failed: {e}")
+        if not model_router.accepts(result):
+            route = model_router.escalate(route, "no_tool_call" if result is not None else "error")
+    if route.tier == STRONG:
+        result = _call_llm(context, force_submit)
+    model_router.record(route, time.perf_counter() - started)
+    # add_messages appends, so only the new message is returned
+    return {"messages": [result], **updates}
+
+
+async def aagent_node(state: AgentState):
+    # The checkpoint write and build_context's disk spills are blocking; keep them off the event loop
+    updates, context, force_submit, route = await asyncio.to_thread(_prepare_turn, state)
+    started = time.perf_counter()
+    result = route.message
+    if route.tier == LIGHT:
+        try:
+            result = await _acall_llm(context, force_submit, LIGHT)
+        except Exception as e:
+            logger.warning(f"Light model call failed: {e}")
+        if not model_router.accepts(result):
+            route = model_router.escalate(route, "no_tool_call" if result is not None else "error")
+    if route.tier == STRONG:
+        result = await _acall_llm(context, force_submit)
+    model_router.record(route, time.perf_counter() - started)
+    return {"messages": [result], **updates}
 
 
 # -------------------------------------------------
@@ -150,17 +382,24 @@ def route(state):
         content = last.get("content")
 
     if isinstance(content, str) and content.strip() == "END":
+        record_task_end(state.get("task_counter", 0), state.get("task_started_at"))
         log_task_end(success=True, message="All tasks completed")
         return END
     if isinstance(content, list) and content[0].get("text").strip() == "END":
+        record_task_end(state.get("task_counter", 0), state.get("task_started_at"))
         log_task_end(success=True, message="All tasks completed")
         return END
     return "agent"
 
 graph = StateGraph(AgentState)
 
-graph.add_node("agent", agent_node)
-graph.add_node("tools", ToolNode(TOOLS))
+# Sync and async entry points share one graph; under ainvoke each tool's coroutine is awaited
+tool_executor = ToolExecutor(TOOLS)
+# Every node execution is timed into the agent_node_seconds histogram
+graph.add_node("agent", RunnableLambda(instrument_node("agent", agent_node),
+                                       afunc=instrument_node("agent", aagent_node)))
+graph.add_node("tools", RunnableLambda(instrument_node("tools", tool_executor.invoke),
+                                       afunc=instrument_node("tools", tool_executor.ainvoke)))
 
 
 
@@ -177,13 +416,37 @@ app = graph.compile()
 # -------------------------------------------------
 # TEST
 # -------------------------------------------------
-def run_agent(url: str) -> str:
+def initial_state(url: str, first_task: int = 1, history: Optional[List[str]] = None) -> AgentState:
+    """Graph input for a chain starting at url; history holds digests of tasks done before a resume."""
+    messages = [resumed_history(history)] if history else []
+    messages.append(HumanMessage(content=url))
+    return {"messages": messages, "task_counter": first_task - 1}
+
+
+def run_agent(url: str, first_task: int = 1, history: Optional[List[str]] = None) -> str:
     logger.info(f"Starting agent with initial URL: {url}")
     try:
-        app.invoke({
-            "messages": [{"role": "user", "content": url}],
-            "task_counter": 0
-        },
+        app.invoke(
+            initial_state(url, first_task, history),
+            config={"recursion_limit": RECURSION_LIMIT},
+        )
+        logger.info("Agent completed successfully")
+        print("Tasks completed succesfully")
+    except Exception as e:
+        logger.error(f"Agent failed with error: {str(e)}", exc_info=True)
+        log_task_end(success=False, message=f"Error: {str(e)}")
+        raise
+
+
+async def arun_agent(url: str, first_task: int = 1, history: Optional[List[str]] = None) -> str:
+    """
+    Run the quiz chain on the current event loop using async tools and LLM calls.
+    first_task and history resume a checkpointed chain at its recorded task.
+    """
+    logger.info(f"Starting agent with initial URL: {url}" + (f" (resuming at task {first_task})" if history else ""))
+    try:
+        await app.ainvoke(
+            initial_state(url, first_task, history),
             config={"recursion_limit": RECURSION_LIMIT},
         )
         logger.info("Agent completed successfully")
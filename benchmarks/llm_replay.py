@@ -0,0 +1,129 @@
+"""
+Recorded-LLM mode for benchmark runs.
+
+A cassette is a JSONL file with one line per LLM turn: the response message
+(langchain message dict), the latency and token usage of the original call,
+and a preview of the last input message. Values that differ between runs
+(fixture server URL, email, secret) are stored as $BASE_URL, $EMAIL and
+$SECRET placeholders.
+
+RecordingLLM wraps the real prompt | model chain and writes a cassette;
+ReplayLLM serves a cassette back in order without any network calls. The
+first line holds metadata; its "source" is "recorded" for cassettes written
+by RecordingLLM and "synthetic" for hand-written fixtures.
+"""
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+from langchain_core.messages import message_to_dict, messages_from_dict
+from logger_config import get_logger
+
+logger = get_logger("llm_replay")
+
+CASSETTES_DIR = Path(__file__).parent / "cassettes"
+
+
+def _last_input(inputs) -> str:
+    messages = inputs.get("messages", []) if isinstance(inputs, dict) else []
+    if not messages:
+        return ""
+    last = messages[-1]
+    content = last.get("content") if isinstance(last, dict) else getattr(last, "content", "")
+    return str(content)[:200]
+
+
+class RecordingLLM:
+    """Pass calls through to the real chain and append every response to a cassette."""
+
+    def __init__(self, inner, path: Path, substitutions: Dict[str, str]):
+        self.inner = inner
+        self.path = path
+        # real value -> placeholder, longest first so a URL is replaced before its host
+        self.substitutions = sorted(substitutions.items(), key=lambda item: -len(item[0]))
+        self._lock = threading.Lock()
+        self._turn = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"meta": {"recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                             "source": "recorded"}}) + "\n")
+
+    def _save(self, inputs, message, seconds: float) -> None:
+        line = json.dumps({"turn": self._turn, "seconds": round(seconds, 3), "input": _last_input(inputs),
+                           "message": message_to_dict(message)})
+        for real, placeholder in self.substitutions:
+            if real:
+                line = line.replace(json.dumps(real)[1:-1], placeholder)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            self._turn += 1
+
+    def invoke(self, inputs, config=None, **kwargs):
+        started = time.perf_counter()
+        message = self.inner.invoke(inputs, config, **kwargs)
+        self._save(inputs, message, time.perf_counter() - started)
+        return message
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        started = time.perf_counter()
+        message = await self.inner.ainvoke(inputs, config, **kwargs)
+        self._save(inputs, message, time.perf_counter() - started)
+        return message
+
+
+class ReplayLLM:
+    """
+    Return the cassette's responses in order.
+
+    With simulate_latency the original call durations are slept, so chain
+    times stay comparable with live runs; without it, chain time measures
+    only the agent and its tools.
+    """
+
+    def __init__(self, path: Path, substitutions: Dict[str, str], simulate_latency: bool = False):
+        self.path = path
+        self.simulate_latency = simulate_latency
+        self.entries: List[dict] = []
+        self.meta: dict = {}
+        for raw in path.read_text().splitlines():
+            if not raw.strip():
+                continue
+            for placeholder, value in substitutions.items():
+                raw = raw.replace(placeholder, json.dumps(value)[1:-1])
+            entry = json.loads(raw)
+            if "message" in entry:
+                self.entries.append(entry)
+            elif "meta" in entry:
+                self.meta = entry["meta"]
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._turn = 0
+
+    def _next(self, inputs) -> dict:
+        with self._lock:
+            if self._turn >= len(self.entries):
+                raise RuntimeError(f"Cassette {self.path.name} exhausted after {self._turn} turns")
+            entry = self.entries[self._turn]
+            self._turn += 1
+        recorded, actual = entry.get("input", ""), _last_input(inputs)
+        if recorded and actual and recorded[:80] != actual[:80]:
+            logger.warning(f"Replay turn {entry['turn']}: input differs from the recording "
+                           f"(recorded {recorded[:80]!r}, got {actual[:80]!r})")
+        return entry
+
+    def invoke(self, inputs, config=None, **kwargs):
+        entry = self._next(inputs)
+        if self.simulate_latency:
+            time.sleep(entry.get("seconds", 0))
+        return messages_from_dict([entry["message"]])[0]
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        entry = self._next(inputs)
+        if self.simulate_latency:
+            await asyncio.sleep(entry.get("seconds", 0))
+        return messages_from_dict([entry["message"]])[0]
@@ -0,0 +1,226 @@
+"""
+Local stand-in for the quiz host.
+
+Serves a deterministic chain of quiz pages, the files they refer to (CSV,
+PNG, WAV) and a submit endpoint with the same answer semantics as the real
+server: every response carries `correct`, `delay` (seconds since the quiz
+page was first served) and, unless the chain is finished, the next `url`.
+"""
+import io
+import math
+import random
+import struct
+import threading
+import time
+import wave
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response
+
+PAGE = """<!doctype html>
+<html><head><title>Quiz: {name}</title></head>
+<body>
+<h1>Quiz {number} of {total}: {name}</h1>
+<p>{question}</p>
+{media}
+<p>Post your answer to <a href="{base}/submit">{base}/submit</a> with this JSON payload:</p>
+<pre>{{"email": "your email", "secret": "your secret", "url": "{base}/quiz/{name}", "answer": ...}}</pre>
+</body></html>
+"""
+
+
+def _sales_csv() -> bytes:
+    rng = random.Random(20)
+    rows = ["id,region,amount"]
+    for i in range(1, 201):
+        rows.append(f"{i},{rng.choice(['north', 'south', 'east', 'west'])},{rng.randint(1, 500)}")
+    return ("\n".join(rows) + "\n").encode()
+
+
+def _shapes_png() -> bytes:
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((20, 30, 69, 69), fill="#ff0000")     # 50 x 40
+    draw.rectangle((200, 100, 229, 129), fill="#ff0000")  # 30 x 30
+    draw.rectangle((300, 200, 359, 259), fill="#0000ff")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _tone_wav(seconds: float = 3.5, rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / rate))) for i in range(int(seconds * rate))
+        ))
+    return buffer.getvalue()
+
+
+def _csv_answer() -> int:
+    lines = _sales_csv().decode().splitlines()[1:]
+    return sum(int(amount) for _, region, amount in (line.split(",") for line in lines) if region == "north")
+
+
+# name -> (question, media template, file name, file builder, media type, expected answer)
+TASKS = {
+    "csv": ("Download the CSV file below and submit the sum of the amount column for rows whose region is north.",
+            '<a href="{base}/files/sales.csv">sales.csv</a>', "sales.csv", _sales_csv, "text/csv", _csv_answer),
+    "image": ("How many pixels of the image below are exactly red (#ff0000)?",
+              '<img src="{base}/files/shapes.png" alt="shapes">', "shapes.png", _shapes_png, "image/png",
+              lambda: 50 * 40 + 30 * 30),
+    "audio": ("What is the duration of the audio file below in seconds? Submit a number with one decimal.",
+              '<audio src="{base}/files/tone.wav" controls></audio>', "tone.wav", _tone_wav, "audio/wav",
+              lambda: 3.5),
+}
+DEFAULT_CHAIN = ["csv", "image", "audio"]
+
+
+def _matches(answer, expected) -> bool:
+    try:
+        return abs(float(answer) - float(expected)) < 1e-6
+    except (TypeError, ValueError):
+        return str(answer).strip() == str(expected)
+
+
+class QuizState:
+    """Per-run bookkeeping: when each page was first served and every submission."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.served: Dict[str, float] = {}
+            self.submissions: List[dict] = []
+
+    def serve(self, name: str) -> None:
+        with self._lock:
+            self.served.setdefault(name, time.time())
+
+    def submit(self, name: str, correct: bool) -> int:
+        with self._lock:
+            delay = int(time.time() - self.served.get(name, time.time()))
+            self.submissions.append({"task": name, "correct": correct, "delay": delay})
+            return delay
+
+    def results(self) -> dict:
+        with self._lock:
+            solved = {s["task"] for s in self.submissions if s["correct"]}
+            return {"submissions": list(self.submissions), "solved": sorted(solved)}
+
+
+def create_app(chain: Optional[List[str]] = None, email: str = "bench@example.com",
+               secret: str = "bench-secret") -> FastAPI:
+    chain = chain or DEFAULT_CHAIN
+    unknown = [name for name in chain if name not in TASKS]
+    if unknown:
+        raise ValueError(f"Unknown quiz tasks: {', '.join(unknown)} (available: {', '.join(TASKS)})")
+    app = FastAPI()
+    app.state.quiz = state = QuizState()
+    files = {}
+
+    def base(request: Request) -> str:
+        return str(request.base_url).rstrip("/")
+
+    @app.get("/quiz/{name}", response_class=HTMLResponse)
+    def quiz(name: str, request: Request):
+        if name not in chain:
+            raise HTTPException(status_code=404, detail="Unknown quiz")
+        state.serve(name)
+        question, media = TASKS[name][0], TASKS[name][1]
+        return PAGE.format(name=name, number=chain.index(name) + 1, total=len(chain), question=question,
+                           media=media.format(base=base(request)), base=base(request))
+
+    @app.get("/files/{filename}")
+    def file(filename: str):
+        for name in chain:
+            _, _, task_file, build, media_type, _ = TASKS[name]
+            if task_file == filename:
+                if filename not in files:
+                    files[filename] = build()
+                return Response(files[filename], media_type=media_type)
+        raise HTTPException(status_code=404, detail="Unknown file")
+
+    @app.post("/submit")
+    async def submit(request: Request):
+        data = await request.json()
+        if data.get("secret") != secret or data.get("email") != email:
+            raise HTTPException(status_code=403, detail="Invalid email or secret")
+        name = str(data.get("url", "")).rstrip("/").rsplit("/", 1)[-1]
+        if name not in chain:
+            raise HTTPException(status_code=400, detail="Unknown quiz url")
+        correct = _matches(data.get("answer"), TASKS[name][5]())
+        delay = state.submit(name, correct)
+        response = {"correct": correct, "delay": delay}
+        if not correct:
+            response["reason"] = "Wrong answer"
+        position = chain.index(name)
+        if position + 1 < len(chain):
+            response["url"] = f"{base(request)}/quiz/{chain[position + 1]}"
+        return response
+
+    @app.get("/results")
+    def results():
+        return state.results()
+
+    @app.post("/reset")
+    def reset():
+        state.reset()
+        return {"status": "ok"}
+
+    return app
+
+
+class QuizServer:
+    """Run create_app() with uvicorn on a background thread."""
+
+    def __init__(self, chain: Optional[List[str]] = None, port: int = 0, email: str = "bench@example.com",
+                 secret: str = "bench-secret"):
+        import socket
+        import uvicorn
+        if port == 0:
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+        self.port = port
+        self.chain = chain or DEFAULT_CHAIN
+        self.app = create_app(self.chain, email, secret)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self.server.run, name="quiz-fixture-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def start_url(self) -> str:
+        return f"{self.base_url}/quiz/{self.chain[0]}"
+
+    def start(self) -> "QuizServer":
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Quiz fixture server did not start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve the local quiz chain used by the benchmarks.")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--tasks", default=",".join(DEFAULT_CHAIN), help=f"comma-separated, from {', '.join(TASKS)}")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.tasks.split(",")), host="127.0.0.1", port=args.port)
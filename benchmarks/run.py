@@ -0,0 +1,219 @@
+"""
+Benchmark the agent end to end against the local quiz chain.
+
+    python -m benchmarks.run                     # replay the shipped (synthetic) cassette, 3 runs
+    python -m benchmarks.run --llm record        # call Gemini and write a new cassette
+    python -m benchmarks.run --json out.json --baseline benchmarks/baseline.json
+
+Each run resets the fixture server, drives agent.arun_agent over the whole
+chain and reports chain time, per-tool latency, LLM calls and tokens, and
+correctness; peak RSS of the process and its children is reported at the
+end. Runs after the first see warm download/result caches and a warm
+run_code interpreter pool, as a long-running server would.
+
+The shipped cassette is a synthetic smoke fixture with scripted answers, not
+a model recording: replaying it measures the agent's own overhead and
+catches regressions in tools and plumbing, not in model behaviour.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# The agent reads these at import time; the fixture server checks the same values
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("SECRET", "bench-secret")
+
+import httpx
+from benchmarks.llm_replay import CASSETTES_DIR, RecordingLLM, ReplayLLM
+from benchmarks.quiz_server import DEFAULT_CHAIN, QuizServer
+
+DEFAULT_CASSETTE = CASSETTES_DIR / "fixture_chain.jsonl"
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_once(agent, server: QuizServer, number: int) -> dict:
+    from jobs import Job, current_job, RUNNING, SUCCEEDED, FAILED
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{server.base_url}/reset")
+    job = Job(id=f"bench-{number}-{uuid.uuid4().hex[:6]}", url=server.start_url, state=RUNNING,
+              started_at=time.time())
+    token = current_job.set(job)
+    started = time.perf_counter()
+    try:
+        await agent.arun_agent(server.start_url)
+        job.state = SUCCEEDED
+    except Exception as e:
+        job.state, job.error = FAILED, str(e)
+    finally:
+        chain_seconds = time.perf_counter() - started
+        job.finished_at = time.time()
+        current_job.reset(token)
+    async with httpx.AsyncClient() as client:
+        results = (await client.get(f"{server.base_url}/results")).json()
+    report = job.to_dict()
+    return {
+        "run": number,
+        "state": job.state,
+        "error": job.error,
+        "chain_seconds": round(chain_seconds, 3),
+        "solved": results["solved"],
+        "submissions": len(results["submissions"]),
+        "llm_calls": int(report["metrics"].get("llm_calls", 0)),
+        "llm_seconds": report["metrics"].get("llm_seconds", 0.0),
+        "tokens_input": int(report["metrics"].get("tokens_input", 0)),
+        "tokens_output": int(report["metrics"].get("tokens_output", 0)),
+        "turns": {tier: int(report["metrics"].get(f"turns_{tier}", 0)) for tier in ("rule", "light", "strong")},
+        "tool_timings": report["tool_timings"],
+    }
+
+
+def summarize(runs: list, chain: list) -> dict:
+    tools = {}
+    for run in runs:
+        for name, timing in run["tool_timings"].items():
+            t = tools.setdefault(name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            t["calls"] += timing["calls"]
+            t["total_seconds"] += timing["total_seconds"]
+            t["max_seconds"] = max(t["max_seconds"], timing["max_seconds"])
+    for t in tools.values():
+        t["mean_seconds"] = round(t["total_seconds"] / t["calls"], 4) if t["calls"] else 0.0
+        t["total_seconds"] = round(t["total_seconds"], 3)
+    times = [run["chain_seconds"] for run in runs]
+    return {
+        "runs": len(runs),
+        "all_solved": all(sorted(run["solved"]) == sorted(chain) for run in runs),
+        "chain_seconds_median": round(statistics.median(times), 3),
+        "chain_seconds_min": min(times),
+        "chain_seconds_max": max(times),
+        "tokens_input_median": statistics.median(run["tokens_input"] for run in runs),
+        "tokens_output_median": statistics.median(run["tokens_output"] for run in runs),
+        "tools": tools,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_rss_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def print_report(runs: list, summary: dict, chain: list, llm: str = "") -> None:
+    print(f"\nChain: {' -> '.join(chain)}")
+    if llm:
+        print(f"LLM: {llm}")
+    print(f"{'run':>4} {'state':>10} {'seconds':>9} {'solved':>7} {'llm':>5} {'tok in':>8} {'tok out':>8} "
+          f"{'turns rule/light/strong':>24}")
+    for run in runs:
+        turns = "/".join(str(run["turns"][tier]) for tier in ("rule", "light", "strong"))
+        print(f"{run['run']:>4} {run['state']:>10} {run['chain_seconds']:>9.2f} "
+              f"{len(run['solved'])}/{len(chain):<5} {run['llm_calls']:>5} {run['tokens_input']:>8} "
+              f"{run['tokens_output']:>8} {turns:>24}")
+        if run["error"]:
+            print(f"     error: {run['error']}")
+    print(f"\n{'tool':<20} {'calls':>6} {'mean s':>9} {'max s':>9} {'total s':>9}")
+    for name, t in sorted(summary["tools"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"{name:<20} {t['calls']:>6} {t['mean_seconds']:>9.3f} {t['max_seconds']:>9.3f} "
+              f"{t['total_seconds']:>9.2f}")
+    print(f"\nchain seconds: median {summary['chain_seconds_median']:.2f} "
+          f"(min {summary['chain_seconds_min']:.2f}, max {summary['chain_seconds_max']:.2f})")
+    print(f"peak RSS: {summary['peak_rss_mb']} MB (children {summary['peak_rss_children_mb']} MB)")
+    print(f"all tasks solved: {summary['all_solved']}")
+
+
+def compare(summary: dict, baseline_path: Path, max_regression: float) -> list:
+    """Failures against a previous --json report; an empty list means no regression."""
+    baseline = json.loads(baseline_path.read_text())["summary"]
+    failures = []
+    for key in ("chain_seconds_median", "tokens_input_median", "peak_rss_mb"):
+        before, after = baseline.get(key), summary[key]
+        if before and after > before * (1 + max_regression):
+            failures.append(f"{key}: {after} vs baseline {before} (+{(after / before - 1) * 100:.0f}%)")
+    if baseline.get("all_solved") and not summary["all_solved"]:
+        failures.append("not every task was solved (baseline solved all)")
+    return failures
+
+
+async def main_async(args) -> dict:
+    chain = args.tasks.split(",")
+    server = QuizServer(chain, port=args.port, email=os.environ["EMAIL"], secret=os.environ["SECRET"]).start()
+    substitutions = {"$BASE_URL": server.base_url, "$EMAIL": os.environ["EMAIL"], "$SECRET": os.environ["SECRET"]}
+    if args.llm != "live":
+        # The replayed model never contacts Gemini, but the client stack still wants a key
+        os.environ.setdefault("GOOGLE_API_KEY", "replay")
+    if args.llm == "replay":
+        # Replayed turns use no quota; keep the shared limiter (and its database) out of the timings
+        os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+        os.environ.setdefault("LLM_LIGHT_REQUESTS_PER_MINUTE", "0")
+    import agent
+    from tools.worker_pool import worker_pool
+    from tools.http_client import aclose_async_client, close_client
+    worker_pool.start()
+    llm = None
+    if args.llm == "replay":
+        llm = ReplayLLM(Path(args.cassette), substitutions, simulate_latency=args.replay_latency)
+        agent.llm_with_prompt = llm
+    elif args.llm == "record":
+        agent.llm_with_prompt = RecordingLLM(agent.get_llm_with_prompt(), Path(args.cassette),
+                                             {value: placeholder for placeholder, value in substitutions.items()})
+    runs = []
+    try:
+        for number in range(1, args.runs + 1):
+            if isinstance(llm, ReplayLLM):
+                llm.rewind()
+            runs.append(await run_once(agent, server, number))
+            # A cassette is one chain; further runs replay it rather than append to it
+            if args.llm == "record":
+                agent.llm_with_prompt = ReplayLLM(Path(args.cassette), substitutions)
+                llm = agent.llm_with_prompt
+    finally:
+        await asyncio.to_thread(worker_pool.shutdown)
+        await aclose_async_client()
+        close_client()
+        server.stop()
+    if isinstance(llm, ReplayLLM):
+        source = llm.meta.get("source", "unknown")
+        described = f"replay of {llm.path.name} ({source}" + (
+            ": scripted answers, not a model recording)" if source == "synthetic" else ")")
+    else:
+        described = args.llm
+    return {"chain": chain, "llm": args.llm, "llm_description": described, "runs": runs,
+            "summary": summarize(runs, chain)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the agent on the local quiz chain.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm", choices=["replay", "record", "live"], default="replay",
+                        help="replay a cassette (default), record a new one from Gemini, or call Gemini without recording")
+    parser.add_argument("--cassette", default=str(DEFAULT_CASSETTE))
+    parser.add_argument("--replay-latency", action="store_true",
+                        help="sleep for the recorded LLM latency of every replayed turn")
+    parser.add_argument("--tasks", default=",".join(DEFAULT_CHAIN), help="comma-separated quiz chain")
+    parser.add_argument("--port", type=int, default=0, help="fixture server port (0 = any free port)")
+    parser.add_argument("--json", help="write the full report to this file")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative increase over the baseline (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report["runs"], report["summary"], report["chain"], report["llm_description"])
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"report written to {args.json}")
+    failures = compare(report["summary"], Path(args.baseline), args.max_regression) if args.baseline else []
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures or not report["summary"]["all_solved"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+from logger_config import get_logger, DATA_DIR
+
+logger = get_logger("checkpoints")
+
+# Record quiz progress so interrupted chains resume at their last task
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "1") == "1"
+CHECKPOINTS_DB = Path(os.getenv("CHECKPOINTS_DB", str(DATA_DIR / "checkpoints.sqlite")))
+# Times a chain is resumed (after a crash or a restart) before it is given up
+CHECKPOINT_MAX_RESUMES = int(os.getenv("CHECKPOINT_MAX_RESUMES", "2"))
+# Interrupted chains older than this are not resumed on startup (their tasks have long expired)
+CHECKPOINT_MAX_AGE_SECONDS = float(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", "3600"))
+# Finished checkpoints kept for inspection
+CHECKPOINT_HISTORY_SIZE = int(os.getenv("CHECKPOINT_HISTORY_SIZE", "200"))
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+
+
+@dataclass
+class Checkpoint:
+    """Where a chain stands: the URL of its current task and digests of the tasks before it."""
+    job_id: str
+    start_url: str
+    priority: int
+    task_number: int
+    task_url: str
+    resumes: int
+    updated_at: float
+    summaries: List[str] = field(default_factory=list)
+
+
+def _encode(summaries: List[str]) -> bytes:
+    return zlib.compress(json.dumps(summaries).encode())
+
+
+def _decode(blob: Optional[bytes]) -> List[str]:
+    return json.loads(zlib.decompress(blob)) if blob else []
+
+
+class CheckpointStore:
+    """
+    Durable per-job progress, keyed by job ID.
+
+    A checkpoint is written when a quiz task starts: its number and URL plus
+    the rule-based digests of the finished tasks (zlib-compressed JSON, a few
+    hundred bytes per task). Page HTML, tool outputs and LLM messages are
+    never stored; a resumed chain starts the recorded task afresh with the
+    digests as its history, which is also all the context the agent keeps of
+    finished tasks.
+    """
+
+    def __init__(self, path: Path = CHECKPOINTS_DB, enabled: bool = CHECKPOINTS_ENABLED,
+                 max_resumes: int = CHECKPOINT_MAX_RESUMES, max_age: float = CHECKPOINT_MAX_AGE_SECONDS,
+                 history_size: int = CHECKPOINT_HISTORY_SIZE):
+        self.path = path
+        self.enabled = enabled
+        self.max_resumes = max_resumes
+        self.max_age = max_age
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._stats = {"written": 0, "resumed": 0}
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as db, db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS checkpoints (
+                        job_id TEXT PRIMARY KEY,
+                        start_url TEXT NOT NULL,
+                        priority INTEGER NOT NULL,
+                        status TEXT NOT NULL,
+                        task_number INTEGER NOT NULL,
+                        task_url TEXT NOT NULL,
+                        summaries BLOB,
+                        resumes INTEGER NOT NULL DEFAULT 0,
+                        error TEXT,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _row(row) -> Checkpoint:
+        job_id, start_url, priority, task_number, task_url, summaries, resumes, updated_at = row
+        return Checkpoint(job_id, start_url, priority, task_number, task_url, resumes, updated_at,
+                          _decode(summaries))
+
+    # -------------------------------------------------
+    # WRITES
+    # -------------------------------------------------
+    def begin(self, job_id: str, url: str, priority: int = 0) -> None:
+        """Register a job; a job that already has a checkpoint (a resume) keeps it."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            db.execute("INSERT OR IGNORE INTO checkpoints (job_id, start_url, priority, status, task_number, "
+                       "task_url, created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+                       (job_id, url, priority, RUNNING, url, now, now))
+            db.execute("UPDATE checkpoints SET status = ?, updated_at = ? WHERE job_id = ?", (RUNNING, now, job_id))
+
+    def advance(self, job_id: str, task_number: int, task_url: str, summaries: List[str]) -> None:
+        """Record that task `task_number` at `task_url` has started."""
+        if not self.enabled:
+            return
+        blob = _encode(summaries)
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE checkpoints SET task_number = ?, task_url = ?, summaries = ?, updated_at = ? "
+                       "WHERE job_id = ?", (task_number, task_url, blob, time.time(), job_id))
+        self._count("written")
+        logger.info(f"Checkpoint: job {job_id} at task {task_number} ({task_url}, {len(blob)} bytes of history)")
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE checkpoints SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                       (status, error, time.time(), job_id))
+            db.execute("DELETE FROM checkpoints WHERE status != ? AND job_id NOT IN (SELECT job_id FROM checkpoints "
+                       "WHERE status != ? ORDER BY updated_at DESC LIMIT ?)", (RUNNING, RUNNING, self.history_size))
+
+    # -------------------------------------------------
+    # RESUME
+    # -------------------------------------------------
+    def load(self, job_id: str) -> Optional[Checkpoint]:
+        if not self.enabled:
+            return None
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT job_id, start_url, priority, task_number, task_url, summaries, resumes, "
+                             "updated_at FROM checkpoints WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def claim_resume(self, job_id: str) -> Optional[Checkpoint]:
+        """Count one resume of an interrupted job; None when it has none left or never reached a task."""
+        checkpoint = self.load(job_id)
+        if checkpoint is None or checkpoint.task_number == 0 or checkpoint.resumes >= self.max_resumes:
+            return None
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE checkpoints SET resumes = resumes + 1 WHERE job_id = ?", (job_id,))
+        self._count("resumed")
+        checkpoint.resumes += 1
+        return checkpoint
+
+    def interrupted(self) -> List[Checkpoint]:
+        """Jobs left running by a previous process, oldest first, recent enough to be worth resuming."""
+        if not self.enabled:
+            return []
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE checkpoints SET status = ?, error = 'too old to resume' WHERE status = ? "
+                       "AND updated_at < ?", (FAILED, RUNNING, time.time() - self.max_age))
+            rows = db.execute("SELECT job_id, start_url, priority, task_number, task_url, summaries, resumes, "
+                              "updated_at FROM checkpoints WHERE status = ? ORDER BY created_at",
+                              (RUNNING,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"enabled": self.enabled, **self._stats}
+        if self.enabled:
+            with closing(self._connect()) as db:
+                stats.update(dict(db.execute("SELECT status, COUNT(*) FROM checkpoints GROUP BY status")))
+        return stats
+
+
+checkpoint_store = CheckpointStore()
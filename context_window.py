@@ -0,0 +1,200 @@
+import json
+import os
+from typing import Any, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import convert_to_messages
+from logger_config import get_logger
+from tools.tool_output import save_tool_output
+
+logger = get_logger("context_window")
+
+# Tool outputs longer than this are spilled to disk when they enter the state
+TOOL_OUTPUT_MAX_CHARS = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "20000"))
+# Approximate prompt budget (tokens) for the conversation sent on each turn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "32000"))
+# Size older tool outputs are cut to when the budget is exceeded
+COMPACTED_OUTPUT_CHARS = int(os.getenv("COMPACTED_OUTPUT_CHARS", "1500"))
+# Characters kept per completed task in the running summary
+TASK_SUMMARY_CHARS = 600
+
+CHARS_PER_TOKEN = 4
+# Name of the message carrying digests of tasks finished before a checkpoint resume
+RESUMED_HISTORY = "resumed_history"
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token) for budgeting."""
+    chars = 0
+    for m in messages:
+        chars += len(m.content) if isinstance(m.content, str) else len(json.dumps(m.content))
+        for call in getattr(m, "tool_calls", None) or []:
+            chars += len(json.dumps(call.get("args", {}), default=str))
+    return chars // CHARS_PER_TOKEN
+
+
+def _truncate(content: str, keep: int) -> str:
+    """Keep the head of a long output and point to the full copy on disk."""
+    handle = save_tool_output(content)
+    return (
+        f"{content[:keep]}\n"
+        f"... [truncated: showing {keep} of {len(content)} characters. "
+        f"Call read_tool_output(handle=\"{handle}\", offset={keep}) to read the rest]"
+    )
+
+
+def compact_tool_message(message: ToolMessage, max_chars: int = TOOL_OUTPUT_MAX_CHARS) -> ToolMessage:
+    """Spill an oversized tool output to disk, leaving a digest plus a handle in the state."""
+    content = message.content
+    if not isinstance(content, str) or len(content) <= max_chars:
+        return message
+    if message.name == "read_tool_output":
+        # Already a bounded slice of a spilled output; spilling it again would hide the
+        # original handle and the offset to continue from
+        return message
+    logger.info(f"Truncating {message.name} output from {len(content)} to {max_chars} characters")
+    return message.model_copy(update={"content": _truncate(content, max_chars)})
+
+
+# -------------------------------------------------
+# TASK BOUNDARIES
+# -------------------------------------------------
+def response_json(message: ToolMessage) -> Optional[dict]:
+    try:
+        data = json.loads(message.content)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def next_task_url(message: BaseMessage) -> Optional[str]:
+    """Return the next quiz URL if this is a post_request result that starts a new task."""
+    if not isinstance(message, ToolMessage) or message.name != "post_request":
+        return None
+    data = response_json(message)
+    url = data.get("url") if data else None
+    return url if isinstance(url, str) and url.startswith("http") else None
+
+
+def task_boundaries(messages: List[BaseMessage]) -> List[int]:
+    """
+    Indices where a quiz task starts.
+
+    A task starts at a human message holding a URL (where log_task_start fires),
+    or at the AIMessage whose post_request call returned a new quiz URL. The
+    AIMessage is used rather than the ToolMessage so tool calls stay paired
+    with their results when earlier messages are dropped.
+    """
+    boundaries = []
+    last_ai = None
+    for i, m in enumerate(messages):
+        if isinstance(m, AIMessage):
+            last_ai = i
+        elif isinstance(m, HumanMessage) and isinstance(m.content, str) and m.content.startswith("http"):
+            boundaries.append(i)
+        elif next_task_url(m) and last_ai is not None and last_ai not in boundaries:
+            boundaries.append(last_ai)
+    return boundaries
+
+
+def _summarise_task(number: int, messages: List[BaseMessage], start: int, end: int) -> str:
+    """
+    Rule-based digest of a finished task: its URL, final submission and server reply.
+
+    A task that began with a submission (the boundary AIMessage) takes its URL
+    from that reply, and the submission that closed it is the AIMessage at the
+    next boundary, so both ends are adjusted before scanning.
+    """
+    url, answer, reply = None, None, None
+    i = start
+    if isinstance(messages[i], AIMessage):
+        i += 1
+        while i < len(messages) and isinstance(messages[i], ToolMessage):
+            url = url or next_task_url(messages[i])
+            i += 1
+    j = end + 1
+    while j < len(messages) and isinstance(messages[j], ToolMessage):
+        j += 1
+
+    for m in messages[i:j]:
+        if isinstance(m, HumanMessage) and isinstance(m.content, str) and m.content.startswith("http"):
+            url = m.content
+        elif isinstance(m, AIMessage):
+            for call in m.tool_calls or []:
+                if call["name"] == "get_rendered_html" and url is None:
+                    url = call["args"].get("url")
+                elif call["name"] == "post_request":
+                    answer = call["args"].get("payload")
+        elif isinstance(m, ToolMessage) and m.name == "post_request":
+            reply = m.content
+
+    line = f"- Task {number}: {url or 'unknown URL'}"
+    if answer is not None:
+        line += f" | submitted: {json.dumps(answer, default=str)}"
+    if reply is not None:
+        line += f" | server replied: {reply}"
+    return line[:TASK_SUMMARY_CHARS]
+
+
+def completed_task_summaries(messages: List[BaseMessage], boundaries: Optional[List[int]] = None) -> List[str]:
+    """Digests of every task before the current one, including those carried over by a resume."""
+    boundaries = task_boundaries(messages) if boundaries is None else boundaries
+    if not boundaries or (len(boundaries) == 1 and boundaries[0] == 0):
+        return []
+    starts = ([0] if boundaries[0] > 0 else []) + boundaries
+    summaries = []
+    for start, end in zip(starts, starts[1:]):
+        if getattr(messages[start], "name", None) == RESUMED_HISTORY:
+            summaries.extend(messages[start].additional_kwargs.get("task_summaries", []))
+        else:
+            summaries.append(_summarise_task(len(summaries) + 1, messages, start, end))
+    return summaries
+
+
+def resumed_history(summaries: List[str]) -> HumanMessage:
+    """Opening message of a chain resumed from a checkpoint; build_context folds it into the summary."""
+    return HumanMessage(content="Summary of quiz tasks completed before a restart:\n" + "\n".join(summaries),
+                        name=RESUMED_HISTORY, additional_kwargs={"task_summaries": list(summaries)})
+
+
+# -------------------------------------------------
+# CONTEXT STAGE
+# -------------------------------------------------
+def build_context(messages: List[Any], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[BaseMessage]:
+    """
+    Build the bounded message list sent to the LLM for one turn.
+
+    Completed quiz tasks are collapsed into a short summary, and if the
+    current task still exceeds the token budget its older tool outputs are
+    cut down (oldest first) to a digest plus a read_tool_output handle.
+    The state itself is left untouched.
+    """
+    messages = convert_to_messages(messages)
+    boundaries = task_boundaries(messages)
+
+    context: List[BaseMessage] = list(messages)
+    summaries = completed_task_summaries(messages, boundaries)
+    if len(boundaries) > 1 or (boundaries and boundaries[0] > 0):
+        current = boundaries[-1]
+        context = [HumanMessage(content=(
+            "Summary of completed quiz tasks (full history omitted to save context):\n"
+            + "\n".join(summaries)
+            + "\nContinue with the current task below."
+        ))] + messages[current:]
+
+    tokens = estimate_tokens(context)
+    if tokens > token_budget:
+        # Compact tool outputs oldest first, always leaving the latest one intact
+        for i, m in enumerate(context[:-1]):
+            if tokens <= token_budget:
+                break
+            if isinstance(m, ToolMessage) and isinstance(m.content, str) \
+                    and len(m.content) > COMPACTED_OUTPUT_CHARS:
+                before = len(m.content)
+                context[i] = m.model_copy(update={"content": _truncate(m.content, COMPACTED_OUTPUT_CHARS)})
+                tokens -= (before - len(context[i].content)) // CHARS_PER_TOKEN
+        if tokens > token_budget:
+            logger.warning(f"Context still ~{tokens} tokens after compaction (budget {token_budget})")
+
+    logger.info(f"Context: {len(context)}/{len(messages)} messages, ~{tokens} tokens "
+                f"({len(summaries)} completed tasks summarised)")
+    return context
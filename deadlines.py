@@ -0,0 +1,102 @@
+import contextvars
+import os
+import time
+from typing import List, Optional
+from langchain_core.messages import AIMessage, BaseMessage
+from logger_config import get_logger
+from jobs import TASK_TIME_LIMIT_SECONDS, record_job_metric
+from metrics import Histogram, LATENCY_BUCKETS
+
+logger = get_logger("deadlines")
+
+# Time kept free at the end of a task for the last LLM turn and the submission
+DEADLINE_SUBMIT_RESERVE_SECONDS = float(os.getenv("DEADLINE_SUBMIT_RESERVE_SECONDS", "15"))
+# With less than this left and nothing submitted, the model is made to call post_request
+DEADLINE_FORCE_SUBMIT_SECONDS = float(os.getenv("DEADLINE_FORCE_SUBMIT_SECONDS", "25"))
+# Tools always get at least this long, even past the deadline
+DEADLINE_MIN_TOOL_SECONDS = float(os.getenv("DEADLINE_MIN_TOOL_SECONDS", "5"))
+# Extra time a tool gets past its capped timeout to stop by itself before it is pre-empted
+DEADLINE_PREEMPT_GRACE_SECONDS = float(os.getenv("DEADLINE_PREEMPT_GRACE_SECONDS", "3"))
+
+TASK_SECONDS = Histogram("agent_task_seconds", "Wall time of each quiz task by deadline outcome",
+                         LATENCY_BUCKETS + (180, 240))
+
+# When the tool call running in this context must be done (set by the tool executor)
+tool_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("tool_deadline", default=None)
+
+
+def remaining(task_started_at: Optional[float]) -> Optional[float]:
+    """Seconds left in the task started at task_started_at (negative once overdue)."""
+    if task_started_at is None:
+        return None
+    return task_started_at + TASK_TIME_LIMIT_SECONDS - time.time()
+
+
+def tool_budget(task_started_at: Optional[float]) -> Optional[float]:
+    """Seconds a tool call may take now, leaving the submission reserve."""
+    left = remaining(task_started_at)
+    if left is None:
+        return None
+    return max(left - DEADLINE_SUBMIT_RESERVE_SECONDS, DEADLINE_MIN_TOOL_SECONDS)
+
+
+def cap_timeout(timeout: float) -> float:
+    """A tool's own timeout, shortened to what is left of the current tool call's budget."""
+    deadline = tool_deadline.get()
+    if deadline is None:
+        return timeout
+    return min(timeout, max(deadline - time.time(), DEADLINE_MIN_TOOL_SECONDS))
+
+
+def submitted_in_task(messages: List[BaseMessage], task_start: int) -> bool:
+    """Whether post_request was called since the message that started the current task."""
+    return any(isinstance(m, AIMessage) and any(c["name"] == "post_request" for c in m.tool_calls or [])
+               for m in messages[task_start + 1:])
+
+
+def must_submit(left: Optional[float], submitted: bool) -> bool:
+    return left is not None and left < DEADLINE_FORCE_SUBMIT_SECONDS and not submitted
+
+
+def time_hint(task_number: int, left: Optional[float], submitted: bool) -> Optional[str]:
+    """One-line clock note appended to the model's latest input."""
+    if left is None:
+        return None
+    if left <= 0:
+        return (f"[Task {task_number} clock: {-left:.0f}s past the {TASK_TIME_LIMIT_SECONDS:.0f}s limit. "
+                "Submit your best answer now; the reply still gives the next URL.]")
+    if must_submit(left, submitted):
+        return (f"[Task {task_number} clock: {left:.0f}s left. Submit your best answer with post_request now, "
+                "even if unsure.]")
+    return f"[Task {task_number} clock: {left:.0f}s of {TASK_TIME_LIMIT_SECONDS:.0f}s left.]"
+
+
+def with_time_hint(context: List[BaseMessage], hint: Optional[str]) -> List[BaseMessage]:
+    """Copy of context with hint appended to the last message (the state is not touched)."""
+    if not hint or not context:
+        return context
+    last = context[-1]
+    if isinstance(last.content, str):
+        content = f"{last.content}\n\n{hint}"
+    else:
+        content = list(last.content) + [{"type": "text", "text": hint}]
+    return context[:-1] + [last.model_copy(update={"content": content})]
+
+
+def record_task_end(task_number: int, task_started_at: Optional[float]) -> None:
+    """Time a finished task and count it as a deadline miss when it ran over the limit."""
+    if task_started_at is None:
+        return
+    seconds = time.time() - task_started_at
+    missed = seconds > TASK_TIME_LIMIT_SECONDS
+    TASK_SECONDS.observe(seconds, outcome="missed" if missed else "met")
+    record_job_metric("tasks_finished", 1)
+    if missed:
+        record_job_metric("deadline_misses", 1)
+        logger.warning(f"Task {task_number} missed its deadline: {seconds:.0f}s "
+                       f"(limit {TASK_TIME_LIMIT_SECONDS:.0f}s)",
+                       extra={"event": "deadline_miss", "task_seconds": round(seconds, 1)})
+    else:
+        logger.info(f"Task {task_number} finished in {seconds:.0f}s "
+                    f"({TASK_TIME_LIMIT_SECONDS - seconds:.0f}s to spare)",
+                    extra={"event": "task_finished", "task_seconds": round(seconds, 1)})
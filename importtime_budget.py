@@ -0,0 +1,54 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Startup budget for `import main` (cumulative, in milliseconds)
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str):
+    """Run `python -X importtime -c "import <module>"` in a fresh interpreter; return (total_ms, rows)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent) // 2))
+    total = next((cumulative for name, _, cumulative, _ in rows if name == module), 0.0)
+    return total, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the server against a budget.")
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                        help="fail when the cumulative import time exceeds this")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest top-level imports to show")
+    args = parser.parse_args()
+
+    total, rows = measure(args.module)
+    # Direct imports of the measured module (depth 1) show where the time goes
+    direct = sorted((r for r in rows if r[3] == 1), key=lambda r: r[2], reverse=True)
+    print(f"import {args.module}: {total:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_ms, cumulative_ms, _ in direct[:args.top]:
+        print(f"{cumulative_ms:14.1f} {self_ms:9.1f}  {name}")
+
+    if total > args.budget_ms:
+        print(f"FAIL: import {args.module} is {total - args.budget_ms:.0f} ms over budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+from logger_config import get_logger
+
+logger = get_logger("jobs")
+
+# Quiz chains running at the same time (each may drive Chromium and run_code)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker before /hitme answers 429
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "10"))
+# Finished jobs kept for GET /jobs/{id}
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "200"))
+# Time the quiz server allows for each task of a chain
+TASK_TIME_LIMIT_SECONDS = float(os.getenv("TASK_TIME_LIMIT_SECONDS", "180"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+
+
+@dataclass
+class Job:
+    """One /hitme request: a quiz chain starting at url."""
+    id: str
+    url: str
+    priority: int = 0
+    state: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    task_number: int = 0
+    task_started_at: Optional[float] = None
+    error: Optional[str] = None
+    tool_timings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # Accumulated instrumentation (LLM time, tokens, bytes, subprocess CPU, ...)
+    metrics: Dict[str, float] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_tool(self, name: str, seconds: float) -> None:
+        # Tool calls of one turn may run on several threads
+        with self._lock:
+            t = self.tool_timings.setdefault(name, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            t["calls"] += 1
+            t["total_seconds"] += seconds
+            t["max_seconds"] = max(t["max_seconds"], seconds)
+
+    def add_metric(self, name: str, value: float) -> None:
+        with self._lock:
+            self.metrics[name] = self.metrics.get(name, 0) + value
+
+    def task_deadline(self) -> Optional[float]:
+        """Wall-clock time at which the current task runs out of time."""
+        if self.task_started_at is None:
+            return None
+        return self.task_started_at + TASK_TIME_LIMIT_SECONDS
+
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            timings = {
+                name: {**t, "total_seconds": round(t["total_seconds"], 3), "max_seconds": round(t["max_seconds"], 3)}
+                for name, t in self.tool_timings.items()
+            }
+            metrics = {name: round(value, 3) for name, value in self.metrics.items()}
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "priority": self.priority,
+            "state": self.state,
+            "task_number": self.task_number,
+            "queued_seconds": round((self.started_at or self.finished_at or time.time()) - self.submitted_at, 3),
+            "elapsed_seconds": round(self.elapsed_seconds(), 3),
+            "error": self.error,
+            "tool_timings": timings,
+            "metrics": metrics,
+        }
+
+
+# The job whose quiz chain is running in this context (copied into tool threads and tasks)
+current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("current_job", default=None)
+
+
+def set_task_number(task_number: int) -> None:
+    job = current_job.get()
+    if job is not None:
+        if task_number != job.task_number or job.task_started_at is None:
+            job.task_started_at = time.time()
+        job.task_number = task_number
+
+
+def record_tool_timing(name: str, seconds: float) -> None:
+    job = current_job.get()
+    if job is not None:
+        job.record_tool(name, seconds)
+
+
+def record_job_metric(name: str, value: float) -> None:
+    job = current_job.get()
+    if job is not None:
+        job.add_metric(name, value)
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when no more jobs can be admitted."""
+
+
+class JobScheduler:
+    """
+    Bounded scheduler for quiz chains.
+
+    At most `workers` chains run at once; further jobs wait in a priority
+    queue (lower priority value first, FIFO within a priority) of at most
+    `queue_size` entries, beyond which submit() raises QueueFull so the API
+    can answer 429 instead of starting unbounded browsers and interpreters.
+    """
+
+    def __init__(self, runner: Callable[[str], Awaitable[Any]], workers: int = JOB_WORKERS,
+                 queue_size: int = JOB_QUEUE_SIZE, history_size: int = JOB_HISTORY_SIZE):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.history_size = history_size
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._seq = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks = []
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job scheduler started ({self.workers} workers, queue size {self.queue_size})")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self.jobs.values():
+            if job.state == QUEUED:
+                job.state, job.finished_at = CANCELLED, time.time()
+
+    def submit(self, url: str, priority: int = 0, job_id: Optional[str] = None) -> Job:
+        """Queue a chain; job_id is given when re-queuing an interrupted job under its old ID."""
+        if self._queue is None:
+            self.start()
+        if self._queue.qsize() >= self.queue_size:
+            raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+        job = Job(id=job_id or uuid.uuid4().hex[:12], url=url, priority=priority)
+        self.jobs[job.id] = job
+        self._trim_history()
+        self._queue.put_nowait((priority, next(self._seq), job))
+        logger.info(f"Job {job.id} queued (priority {priority}, {self._queue.qsize()} waiting): {url}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _trim_history(self) -> None:
+        finished = [j.id for j in self.jobs.values() if j.state not in (QUEUED, RUNNING)]
+        for job_id in finished[:max(0, len(self.jobs) - self.history_size)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.state, job.started_at = RUNNING, time.time()
+        logger.info(f"Job {job.id} started after {job.started_at - job.submitted_at:.1f}s in queue")
+        token = current_job.set(job)
+        try:
+            await self.runner(job.url)
+            job.state = SUCCEEDED
+        except asyncio.CancelledError:
+            job.state, job.error = CANCELLED, "Scheduler shut down"
+            raise
+        except Exception as e:
+            job.state, job.error = FAILED, str(e)
+        finally:
+            current_job.reset(token)
+            job.finished_at = time.time()
+            logger.info(f"Job {job.id} {job.state} in {job.elapsed_seconds():.1f}s "
+                        f"(task {job.task_number})")
+
+    def stats(self) -> Dict[str, Any]:
+        states = [j.state for j in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": states.count(QUEUED),
+            "running": states.count(RUNNING),
+            "succeeded": states.count(SUCCEEDED),
+            "failed": states.count(FAILED),
+        }
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from logger_config import get_logger, DATA_DIR
+from metrics import Histogram, LATENCY_BUCKETS
+
+logger = get_logger("llm_limiter")
+
+# Quota shared by every process using the same limiter database (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "9"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "250000"))
+LLM_LIMITER_DB = Path(os.getenv("LLM_LIMITER_DB", str(DATA_DIR / "llm_limiter.sqlite")))
+# Rate multiplier applied on a 429, and requests/minute regained per successful call
+LLM_RATE_BACKOFF = float(os.getenv("LLM_RATE_BACKOFF", "0.5"))
+LLM_RATE_RECOVERY = float(os.getenv("LLM_RATE_RECOVERY", "0.25"))
+# Pause after a 429 that does not say how long to wait
+LLM_DEFAULT_RETRY_AFTER = float(os.getenv("LLM_DEFAULT_RETRY_AFTER", "10"))
+# How often waiting callers re-check the shared state
+LLM_LIMITER_POLL_SECONDS = 0.25
+
+WINDOW_SECONDS = 60.0
+# A waiter that has not polled for this long is treated as gone (crashed process)
+STALE_WAITER_SECONDS = 5.0
+
+WAIT_SECONDS = Histogram("agent_llm_rate_wait_seconds", "Time LLM calls waited for the shared rate limiter",
+                         LATENCY_BUCKETS)
+
+RETRY_DELAY = re.compile(r"retry(?:[ _-]?delay|[ _-]?after| in)[\"':\s{]*(?:seconds:\s*)?([\d.]+)", re.IGNORECASE)
+
+
+@dataclass
+class Ticket:
+    """A granted LLM call; settle() replaces the token estimate with the real usage."""
+    id: int
+    tokens: int
+    waited: float
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for a provider 429 / RESOURCE_EXHAUSTED, however the client library wraps it."""
+    for e in (error, error.__cause__):
+        if e is None:
+            continue
+        code = getattr(e, "code", None) or getattr(e, "status_code", None)
+        if code == 429 or getattr(code, "value", None) == 429 or type(e).__name__ == "ResourceExhausted":
+            return True
+        text = str(e)
+        if "429" in text or "RESOURCE_EXHAUSTED" in text:
+            return True
+    return False
+
+
+def is_transient(error: Exception) -> bool:
+    """Provider-side failures (500/503/504) worth retrying after a short backoff."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return getattr(code, "value", code) in (500, 502, 503, 504) or type(error).__name__ in (
+        "ServiceUnavailable", "InternalServerError", "DeadlineExceeded")
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait: Retry-After header, retry_after attribute or RetryInfo in the body."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+    if isinstance(getattr(error, "retry_after", None), (int, float)):
+        return float(error.retry_after)
+    match = RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class SharedRateLimiter:
+    """
+    Requests- and tokens-per-minute limiter shared through SQLite.
+
+    Every granted call is logged in a table, so all workers and processes
+    using the same database share one sliding 60 s window. The request rate
+    adapts AIMD-style: a 429 multiplies it by LLM_RATE_BACKOFF and blocks
+    everyone until the provider's retry delay has passed, and each
+    successful call adds LLM_RATE_RECOVERY back, up to the configured quota.
+    Token estimates are reconciled with the real usage after each call.
+    When several callers wait, the one whose task deadline is nearest goes
+    first.
+    """
+
+    def __init__(self, path: Path = LLM_LIMITER_DB, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE):
+        self.path = path
+        self.max_rpm = requests_per_minute
+        self.max_tpm = tokens_per_minute
+        self.enabled = requests_per_minute > 0
+        self._lock = threading.Lock()
+        self._stats = {"granted": 0, "waited": 0, "wait_seconds": 0.0, "rate_limited": 0}
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as db, db:
+                db.execute("CREATE TABLE IF NOT EXISTS calls (id INTEGER PRIMARY KEY, at REAL NOT NULL, "
+                           "tokens INTEGER NOT NULL)")
+                db.execute("CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, deadline REAL NOT NULL, "
+                           "seen REAL NOT NULL)")
+                db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+                db.execute("INSERT OR IGNORE INTO state VALUES ('rpm', ?), ('blocked_until', 0)", (self.max_rpm,))
+                # The quota may have been changed since the database was created
+                db.execute("UPDATE state SET value = MIN(value, ?) WHERE key = 'rpm'", (self.max_rpm,))
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _count(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    # -------------------------------------------------
+    # ADMISSION
+    # -------------------------------------------------
+    def _try_acquire(self, waiter: str, deadline: float, tokens: int) -> tuple:
+        """One admission attempt: (call id, 0) when granted, else (None, seconds worth waiting)."""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM calls WHERE at < ?", (now - WINDOW_SECONDS,))
+                db.execute("DELETE FROM waiters WHERE seen < ?", (now - STALE_WAITER_SECONDS,))
+                db.execute("INSERT OR REPLACE INTO waiters VALUES (?, ?, ?)", (waiter, deadline, now))
+                state = dict(db.execute("SELECT key, value FROM state"))
+                if now < state["blocked_until"]:
+                    return None, state["blocked_until"] - now
+                first = db.execute("SELECT id FROM waiters ORDER BY deadline, id LIMIT 1").fetchone()[0]
+                if first != waiter:
+                    return None, LLM_LIMITER_POLL_SECONDS
+                count, used, oldest = db.execute("SELECT COUNT(*), COALESCE(SUM(tokens), 0), MIN(at) "
+                                                 "FROM calls").fetchone()
+                # A call bigger than the whole token budget still goes through once the window is empty
+                if count < max(1, int(state["rpm"])) and (used + tokens <= self.max_tpm or count == 0):
+                    call = db.execute("INSERT INTO calls (at, tokens) VALUES (?, ?)", (now, tokens)).lastrowid
+                    db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+                    return call, 0.0
+                return None, max(oldest + WINDOW_SECONDS - now, LLM_LIMITER_POLL_SECONDS)
+            finally:
+                db.execute("COMMIT")
+
+    def _leave(self, waiter: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+    def _granted(self, call: int, tokens: int, started: float) -> Ticket:
+        waited = time.perf_counter() - started
+        WAIT_SECONDS.observe(waited)
+        self._count("granted")
+        if waited > LLM_LIMITER_POLL_SECONDS:
+            self._count("waited")
+            self._count("wait_seconds", waited)
+            logger.info(f"LLM call waited {waited:.1f}s for the rate limiter")
+        return Ticket(call, tokens, waited)
+
+    def acquire(self, tokens: int, deadline: Optional[float] = None) -> Ticket:
+        """Block until a call of about `tokens` tokens fits the shared budget."""
+        if not self.enabled:
+            return Ticket(0, tokens, 0.0)
+        waiter, started = uuid.uuid4().hex, time.perf_counter()
+        deadline = deadline or time.time() + WINDOW_SECONDS * 3
+        try:
+            while True:
+                call, wait = self._try_acquire(waiter, deadline, tokens)
+                if call is not None:
+                    return self._granted(call, tokens, started)
+                # Poll at least every few seconds to keep our place in the queue alive
+                time.sleep(min(wait, STALE_WAITER_SECONDS / 2))
+        except BaseException:
+            self._leave(waiter)
+            raise
+
+    async def aacquire(self, tokens: int, deadline: Optional[float] = None) -> Ticket:
+        if not self.enabled:
+            return Ticket(0, tokens, 0.0)
+        waiter, started = uuid.uuid4().hex, time.perf_counter()
+        deadline = deadline or time.time() + WINDOW_SECONDS * 3
+        try:
+            while True:
+                call, wait = await asyncio.to_thread(self._try_acquire, waiter, deadline, tokens)
+                if call is not None:
+                    return self._granted(call, tokens, started)
+                await asyncio.sleep(min(wait, STALE_WAITER_SECONDS / 2))
+        except BaseException:
+            await asyncio.to_thread(self._leave, waiter)
+            raise
+
+    # -------------------------------------------------
+    # FEEDBACK
+    # -------------------------------------------------
+    def settle(self, ticket: Ticket, usage: Optional[dict]) -> None:
+        """Record the real token usage of a successful call and regain some rate."""
+        if not self.enabled:
+            return
+        tokens = (usage or {}).get("total_tokens")
+        with closing(self._connect()) as db, db:
+            if tokens is not None:
+                db.execute("UPDATE calls SET tokens = ? WHERE id = ?", (int(tokens), ticket.id))
+            db.execute("UPDATE state SET value = MIN(value + ?, ?) WHERE key = 'rpm'",
+                       (LLM_RATE_RECOVERY, self.max_rpm))
+
+    def throttled(self, error: Exception) -> float:
+        """Back off after a 429: lower the shared rate and pause every caller; returns the pause."""
+        self._count("rate_limited")
+        if not self.enabled:
+            return retry_after(error) or LLM_DEFAULT_RETRY_AFTER
+        pause = retry_after(error) or LLM_DEFAULT_RETRY_AFTER
+        with closing(self._connect()) as db, db:
+            db.execute("UPDATE state SET value = MAX(1, value * ?) WHERE key = 'rpm'", (LLM_RATE_BACKOFF,))
+            db.execute("UPDATE state SET value = MAX(value, ?) WHERE key = 'blocked_until'", (time.time() + pause,))
+            rpm = db.execute("SELECT value FROM state WHERE key = 'rpm'").fetchone()[0]
+        logger.warning(f"LLM rate limited; pausing {pause:.1f}s and lowering the shared rate to {rpm:.2f}/min")
+        return pause
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"enabled": self.enabled, "max_requests_per_minute": self.max_rpm,
+                     "max_tokens_per_minute": self.max_tpm, **self._stats}
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        if self.enabled:
+            now = time.time()
+            with closing(self._connect()) as db:
+                state = dict(db.execute("SELECT key, value FROM state"))
+                count, used = db.execute("SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM calls WHERE at >= ?",
+                                         (now - WINDOW_SECONDS,)).fetchone()
+                waiting = db.execute("SELECT COUNT(*) FROM waiters WHERE seen >= ?",
+                                     (now - STALE_WAITER_SECONDS,)).fetchone()[0]
+            stats.update({"requests_per_minute": round(state["rpm"], 2), "window_requests": count,
+                          "window_tokens": used, "waiting": waiting,
+                          "blocked_seconds": round(max(0.0, state["blocked_until"] - now), 1)})
+        return stats
+
+
+llm_limiter = SharedRateLimiter()
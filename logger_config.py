@@ -1,5 +1,12 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import sys
 from datetime import datetime
 from pathlib import Path
 
@@ -10,6 +17,9 @@ DATA_DIR = PROJECT_ROOT / "data"
 DOWNLOADS_DIR = DATA_DIR / "downloads"
 AUDIO_DIR = DATA_DIR / "audio"
 CODE_WORKSPACE_DIR = DATA_DIR / "workspace"
+TOOL_OUTPUT_DIR = DATA_DIR / "tool_outputs"
+CACHE_DIR = DATA_DIR / "cache"
+PAGES_DIR = DATA_DIR / "pages"
 
 # Create all necessary directories
 LOGS_DIR.mkdir(exist_ok=True)
@@ -17,22 +27,107 @@ DATA_DIR.mkdir(exist_ok=True)
 DOWNLOADS_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 CODE_WORKSPACE_DIR.mkdir(exist_ok=True)
+TOOL_OUTPUT_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
+PAGES_DIR.mkdir(exist_ok=True)
 
 # Configure logging
 LOG_FILE = LOGS_DIR / "log.log"
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(job_tag)s%(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line to log.log; "text" keeps the console format
+LOG_FILE_FORMAT = os.getenv("LOG_FILE_FORMAT", "json")
+# log.log is rotated past this size, keeping LOG_BACKUP_COUNT old files
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 
-# Create logger
-logging.basicConfig(
-    level=logging.INFO,
-    format=LOG_FORMAT,
-    datefmt=DATE_FORMAT,
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode='a'),
-        logging.StreamHandler()  # Also print to console
-    ]
-)
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JobContextFilter(logging.Filter):
+    """Stamp records with the job ID and task number of the job running in this context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # jobs imports this module, so it is looked up lazily rather than imported
+        current_job = getattr(sys.modules.get("jobs"), "current_job", None)
+        job = current_job.get() if current_job is not None else None
+        record.job_id = job.id if job is not None else None
+        record.task_number = job.task_number if job is not None else None
+        record.job_tag = f"[{job.id} #{job.task_number}] " if job is not None else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, job, task, message and any extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "job_id": getattr(record, "job_id", None),
+            "task": getattr(record, "task_number", None),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in ("job_id", "task_number", "job_tag"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records for the listener thread without formatting them here.
+
+    The stock QueueHandler renders the whole message in the caller; this one
+    only merges the arguments and renders a traceback, so formatting and all
+    disk and console I/O happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler() -> logging.Handler:
+    # Pool worker processes append to the file but leave rotation to the server process
+    if multiprocessing.parent_process() is not None:
+        handler = logging.FileHandler(LOG_FILE, mode="a", encoding="utf-8")
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, mode="a", maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    handler.setFormatter(JsonFormatter() if LOG_FILE_FORMAT == "json" else logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    return handler
+
+
+def _configure_logging() -> logging.handlers.QueueListener:
+    """Route every record through a queue to a listener thread that owns the file and console handlers."""
+    console = logging.StreamHandler()  # Also print to console
+    console.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(JobContextFilter())
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, _file_handler(), console, respect_handler_level=True)
+    listener.start()
+    # Drain whatever is still queued when the interpreter exits
+    atexit.register(listener.stop)
+    return listener
+
+
+listener = _configure_logging()
 
 logger = logging.getLogger("TDS-Agent")
 
@@ -45,6 +140,9 @@ logger.info(f"Data Directory: {DATA_DIR}")
 logger.info(f"Downloads Directory: {DOWNLOADS_DIR}")
 logger.info(f"Audio Directory: {AUDIO_DIR}")
 logger.info(f"Code Workspace: {CODE_WORKSPACE_DIR}")
+logger.info(f"Tool Outputs: {TOOL_OUTPUT_DIR}")
+logger.info(f"Cache Directory: {CACHE_DIR}")
+logger.info(f"Pages Directory: {PAGES_DIR}")
 logger.info("="*80)
 
 def get_logger(name: str = None):
@@ -54,29 +152,27 @@ def get_logger(name: str = None):
     return logger
 
 def log_task_start(task_url: str, task_number: int = None):
-    """Log the start of a new task/quiz question."""
-    logger.info("")
-    logger.info("╔" + "═"*78 + "╗")
+    """Log the start of a new task/quiz question (one record, drawn as a box)."""
+    lines = ["", "╔" + "═"*78 + "╗"]
     if task_number:
-        logger.info(f"║ NEW TASK #{task_number:<70} ║")
+        lines.append(f"║ NEW TASK #{task_number:<70} ║")
     else:
-        logger.info(f"║ NEW TASK{'':<70} ║")
-    logger.info("╠" + "═"*78 + "╣")
-    logger.info(f"║ URL: {task_url:<71} ║")
-    logger.info(f"║ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S'):<69} ║")
-    logger.info("╚" + "═"*78 + "╝")
-    logger.info("")
+        lines.append(f"║ NEW TASK{'':<70} ║")
+    lines.append("╠" + "═"*78 + "╣")
+    lines.append(f"║ URL: {task_url:<71} ║")
+    lines.append(f"║ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S'):<69} ║")
+    lines.append("╚" + "═"*78 + "╝")
+    logger.info("\n".join(lines), extra={"event": "task_start", "url": task_url})
 
 def log_task_end(success: bool = True, message: str = ""):
-    """Log the end of a task."""
-    logger.info("")
-    logger.info("╔" + "═"*78 + "╗")
+    """Log the end of a task (one record, drawn as a box)."""
+    lines = ["", "╔" + "═"*78 + "╗"]
     if success:
-        logger.info(f"║ TASK COMPLETED ✓{'':<63} ║")
+        lines.append(f"║ TASK COMPLETED ✓{'':<63} ║")
     else:
-        logger.info(f"║ TASK FAILED ✗{'':<66} ║")
+        lines.append(f"║ TASK FAILED ✗{'':<66} ║")
     if message:
-        logger.info(f"║ {message:<75} ║")
-    logger.info(f"║ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S'):<69} ║")
-    logger.info("╚" + "═"*78 + "╝")
-    logger.info("")
+        lines.append(f"║ {message:<75} ║")
+    lines.append(f"║ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S'):<69} ║")
+    lines.append("╚" + "═"*78 + "╝")
+    logger.info("\n".join(lines), extra={"event": "task_end", "success": success})
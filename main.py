@@ -1,9 +1,25 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from agent import run_agent
+from contextlib import asynccontextmanager
+from checkpoints import checkpoint_store, DONE as CHECKPOINT_DONE, FAILED as CHECKPOINT_FAILED
+from jobs import JobScheduler, QueueFull, current_job
+from llm_limiter import llm_limiter
+from prompt_cache import prompt_cache
+from metrics import render_metrics
+from tools.browser_pool import browser_pool
+from tools.dependency_broker import dependency_broker
+from tools.download_cache import download_cache
+from tools.http_client import aclose_async_client, close_client, pool_stats
+from tools.ocr_engine import shutdown_pool as shutdown_ocr_pool
+from tools.page_fetcher import page_fetcher
+from tools.result_cache import result_cache
+from tools.worker_pool import worker_pool
 from dotenv import load_dotenv
+from logger_config import get_logger
+import asyncio
+import importlib
 import uvicorn
 import os
 import time
@@ -12,8 +28,99 @@ load_dotenv()
 
 EMAIL = os.getenv("EMAIL") 
 SECRET = os.getenv("SECRET")
+BROWSER_PREWARM = os.getenv("BROWSER_PREWARM", "0") == "1"
+# Import the agent graph and LLM client in the background right after startup
+AGENT_PREWARM = os.getenv("AGENT_PREWARM", "1") == "1"
 
-app = FastAPI()
+logger = get_logger("main")
+
+
+async def run_job(url: str):
+    # agent pulls in langgraph and the LLM stack; importing it lazily (off the
+    # event loop) keeps server startup fast
+    agent = await asyncio.to_thread(importlib.import_module, "agent")
+    job = current_job.get()
+    await asyncio.to_thread(checkpoint_store.begin, job.id, url, job.priority)
+    # A job re-queued after a restart continues from its checkpoint
+    checkpoint = await asyncio.to_thread(checkpoint_store.claim_resume, job.id)
+    while True:
+        try:
+            if checkpoint is None:
+                await agent.arun_agent(url)
+            else:
+                logger.info(f"Job {job.id} resuming at task {checkpoint.task_number}: {checkpoint.task_url} "
+                            f"(resume {checkpoint.resumes}/{checkpoint_store.max_resumes})")
+                await agent.arun_agent(checkpoint.task_url, checkpoint.task_number, checkpoint.summaries)
+        except asyncio.CancelledError:
+            # Shutdown: the checkpoint stays "running" and the job resumes after the restart
+            raise
+        except Exception as e:
+            # A crash mid-chain (browser, worker, API) restarts the current task, not the chain
+            checkpoint = await asyncio.to_thread(checkpoint_store.claim_resume, job.id)
+            if checkpoint is None:
+                await asyncio.to_thread(checkpoint_store.finish, job.id, CHECKPOINT_FAILED, str(e))
+                raise
+            logger.warning(f"Job {job.id} failed at task {checkpoint.task_number}: {e}")
+            continue
+        await asyncio.to_thread(checkpoint_store.finish, job.id, CHECKPOINT_DONE)
+        return
+
+
+def resume_interrupted_jobs() -> None:
+    """Re-queue chains a previous process left unfinished, under their original job IDs."""
+    for checkpoint in checkpoint_store.interrupted():
+        try:
+            scheduler.submit(checkpoint.start_url, checkpoint.priority, job_id=checkpoint.job_id)
+            logger.info(f"Re-queued interrupted job {checkpoint.job_id} (task {checkpoint.task_number})")
+        except QueueFull:
+            logger.warning(f"Queue full; interrupted job {checkpoint.job_id} not resumed")
+            break
+
+
+def prewarm_agent():
+    started = time.perf_counter()
+    try:
+        importlib.import_module("agent").get_llm_with_prompt()
+        # The agent configures the prompt cache on import; create it before the first job needs it
+        prompt_cache.get()
+        logger.info(f"Agent prewarmed in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"Agent prewarm failed, will initialise on the first job: {e}")
+
+
+scheduler = JobScheduler(run_job)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Launch shared resources on startup and release them on shutdown."""
+    scheduler.start()
+    resume_interrupted_jobs()
+    # Pre-start run_code interpreters in the background
+    worker_pool.start()
+    prewarm = None
+    if AGENT_PREWARM:
+        # Not awaited: the server accepts requests while this runs, and a job that
+        # arrives first simply waits on the same import
+        prewarm = asyncio.create_task(asyncio.to_thread(prewarm_agent))
+    if BROWSER_PREWARM:
+        try:
+            await asyncio.to_thread(browser_pool.start)
+        except Exception as e:
+            logger.warning(f"Browser pool prewarm failed, will launch lazily: {e}")
+    yield
+    if prewarm is not None and not prewarm.done():
+        await prewarm
+    await scheduler.shutdown()
+    await asyncio.to_thread(browser_pool.shutdown)
+    await asyncio.to_thread(worker_pool.shutdown)
+    await asyncio.to_thread(shutdown_ocr_pool)
+    await asyncio.to_thread(prompt_cache.close)
+    await aclose_async_client()
+    close_client()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -31,8 +138,32 @@ def root():
         "uptime_seconds": int(time.time() - START_TIME)
     }
 
+@app.get("/stats")
+def stats():
+    """Job scheduler, connection pool, cache, fetcher, browser pool, dependency, LLM quota/cache/routing and checkpoint statistics."""
+    # model_router pulls in the message/context stack and the tools package; keep it out of startup
+    from model_router import model_router
+    return {
+        "jobs": scheduler.stats(),
+        "http": pool_stats(),
+        "download_cache": download_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "page_fetcher": page_fetcher.stats(),
+        "browser_pool": browser_pool.stats(),
+        "dependencies": dependency_broker.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "model_router": model_router.stats(),
+        "checkpoints": checkpoint_store.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Latency, token, byte and CPU histograms in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/hitme")
-async def hitme(request: Request, background_tasks: BackgroundTasks):
+async def hitme(request: Request):
     try:
         data = await request.json()
     except Exception:
@@ -46,10 +177,27 @@ async def hitme(request: Request, background_tasks: BackgroundTasks):
     
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
+    priority = data.get("priority", 0)
+    if not isinstance(priority, int):
+        raise HTTPException(status_code=400, detail="Invalid priority")
+    try:
+        job = scheduler.submit(url, priority=priority)
+    except QueueFull as e:
+        logger.warning(f"Rejecting job for {url}: {e}")
+        raise HTTPException(status_code=429, detail="Too many jobs queued, retry later",
+                            headers={"Retry-After": "30"})
     print("Verified starting the task...")
-    background_tasks.add_task(run_agent, url)
 
-    return JSONResponse(status_code=200, content={"status": "ok"})
+    return JSONResponse(status_code=200, content={"status": "ok", "job_id": job.id})
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """State, current task number, elapsed time and per-tool timings of a job."""
+    job = scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+import asyncio
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from logger_config import get_logger
+from jobs import record_job_metric, record_tool_timing
+
+logger = get_logger("metrics")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Minimal thread-safe Prometheus histogram with labels."""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> (bucket counts, sum, count)
+        self._series: Dict[Tuple[Tuple[str, str], ...], List] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            for bound, n in zip(self.buckets, counts):
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {n}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, 'le="+Inf"')} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+REGISTRY: List[Histogram] = []
+
+NODE_SECONDS = Histogram("agent_node_seconds", "Wall time of each graph node execution", LATENCY_BUCKETS)
+LLM_SECONDS = Histogram("agent_llm_call_seconds", "Wall time of each LLM call", LATENCY_BUCKETS)
+LLM_TOKENS = Histogram("agent_llm_tokens", "Tokens per LLM call by direction", TOKEN_BUCKETS)
+TOOL_SECONDS = Histogram("agent_tool_seconds", "Wall time of each tool call", LATENCY_BUCKETS)
+DOWNLOAD_BYTES = Histogram("agent_download_bytes", "Bytes fetched per download by source", BYTE_BUCKETS)
+SUBPROCESS_CPU_SECONDS = Histogram("agent_subprocess_cpu_seconds", "CPU time of tool subprocesses",
+                                   LATENCY_BUCKETS)
+
+
+# -------------------------------------------------
+# RECORDING
+# -------------------------------------------------
+def observe_node(node: str, seconds: float) -> None:
+    NODE_SECONDS.observe(seconds, node=node)
+    record_job_metric(f"{node}_node_seconds", seconds)
+
+
+def observe_llm(message, seconds: float, cached: bool = False, tier: str = "strong") -> None:
+    """
+    Record latency and token usage (from usage_metadata) of one LLM response.
+    cached marks calls that referenced the prompt cache instead of sending the prefix;
+    tier is the model tier the call was routed to.
+    """
+    LLM_SECONDS.observe(seconds, prompt_cache="cached" if cached else "uncached", tier=tier)
+    record_job_metric("llm_calls", 1)
+    record_job_metric("llm_seconds", seconds)
+    record_job_metric(f"llm_seconds_{tier}", seconds)
+    usage = getattr(message, "usage_metadata", None) or {}
+    for direction, key in (("input", "input_tokens"), ("output", "output_tokens")):
+        if usage.get(key) is not None:
+            LLM_TOKENS.observe(usage[key], direction=direction)
+            record_job_metric(f"tokens_{direction}", usage[key])
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read")
+    if cache_read:
+        LLM_TOKENS.observe(cache_read, direction="cached")
+        record_job_metric("tokens_cached", cache_read)
+
+
+def observe_tool(name: str, seconds: float) -> None:
+    TOOL_SECONDS.observe(seconds, tool=name)
+    record_tool_timing(name, seconds)
+
+
+def observe_download(source: str, size: int) -> None:
+    """source is "network" for bytes transferred, "cache" for bytes served from disk."""
+    DOWNLOAD_BYTES.observe(size, source=source)
+    record_job_metric(f"bytes_{source}", size)
+
+
+def observe_subprocess_cpu(tool: str, seconds: float) -> None:
+    SUBPROCESS_CPU_SECONDS.observe(seconds, tool=tool)
+    record_job_metric("subprocess_cpu_seconds", seconds)
+
+
+def instrument_node(node: str, func: Callable) -> Callable:
+    """Wrap a sync or async graph node so every execution is timed."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def _async_node(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe_node(node, time.perf_counter() - started)
+        return _async_node
+
+    @functools.wraps(func)
+    def _node(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe_node(node, time.perf_counter() - started)
+    return _node
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
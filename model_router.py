@@ -0,0 +1,162 @@
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from logger_config import get_logger, DATA_DIR
+from context_window import next_task_url, response_json
+from jobs import record_job_metric
+from llm_limiter import SharedRateLimiter
+from metrics import Histogram, LATENCY_BUCKETS
+
+logger = get_logger("model_router")
+
+# Route routine turns to a lighter model and URL hops to no model at all
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "1") == "1"
+# Model for routine turns ("" = every model turn goes to LLM_MODEL)
+LLM_LIGHT_MODEL = os.getenv("LLM_LIGHT_MODEL", "gemini-2.5-flash-lite")
+# A turn whose tool results all came from these tools (and succeeded) is routine
+MODEL_ROUTER_LIGHT_AFTER = [t.strip() for t in os.getenv("MODEL_ROUTER_LIGHT_AFTER",
+                                                        "run_code,download_file,add_dependencies").split(",")
+                            if t.strip()]
+# The light model has its own Gemini quota, so it gets its own shared limiter (0 = unlimited)
+LLM_LIGHT_REQUESTS_PER_MINUTE = float(os.getenv("LLM_LIGHT_REQUESTS_PER_MINUTE", "15"))
+LLM_LIGHT_TOKENS_PER_MINUTE = int(os.getenv("LLM_LIGHT_TOKENS_PER_MINUTE", "250000"))
+LLM_LIGHT_LIMITER_DB = Path(os.getenv("LLM_LIGHT_LIMITER_DB", str(DATA_DIR / "llm_limiter_light.sqlite")))
+
+RULE, LIGHT, STRONG = "rule", "light", "strong"
+
+TURN_SECONDS = Histogram("agent_turn_seconds", "Wall time of each agent turn by model tier and routing reason",
+                         LATENCY_BUCKETS)
+
+light_limiter = SharedRateLimiter(LLM_LIGHT_LIMITER_DB, LLM_LIGHT_REQUESTS_PER_MINUTE, LLM_LIGHT_TOKENS_PER_MINUTE)
+
+
+@dataclass
+class Route:
+    """Where one agent turn goes; rule turns carry the message that stands in for the model's."""
+    tier: str
+    reason: str
+    message: Optional[AIMessage] = None
+
+
+def _fetch(url: str) -> AIMessage:
+    call = {"name": "get_rendered_html", "args": {"url": url}, "id": f"route_{uuid.uuid4().hex[:12]}",
+            "type": "tool_call"}
+    return AIMessage(content="", tool_calls=[call], response_metadata={"model_tier": RULE})
+
+
+def _failed(message: BaseMessage) -> bool:
+    """A tool error, a run_code that did not finish cleanly, or a wrong answer."""
+    if not isinstance(message, ToolMessage):
+        return False
+    if message.status == "error":
+        return True
+    data = response_json(message)
+    if not data:
+        return False
+    if message.name == "run_code":
+        return data.get("return_code") != 0 or bool(data.get("timed_out") or data.get("oom_killed"))
+    if message.name == "post_request":
+        return data.get("correct") is False
+    return False
+
+
+class ModelRouter:
+    """
+    Pick the tier of each agent turn from the conversation.
+
+    rule:   the next step is fixed and needs no model: fetching a quiz URL
+            (the first one, or one a submission returned) and ending the
+            chain after a correct answer without a next URL.
+    light:  routine turns after tools in MODEL_ROUTER_LIGHT_AFTER succeeded,
+            typically submitting or post-processing a computed value.
+    strong: everything else: reading a new page, transcript or image,
+            deadline-forced submissions, and every turn of a task once a
+            tool failed or an answer was wrong in it.
+
+    A light turn that fails or answers without a tool call is escalated and
+    re-run on the strong model, so only a strong turn can end the chain with
+    text. Turn latency per tier and reason goes to agent_turn_seconds.
+    """
+
+    def __init__(self, enabled: bool = MODEL_ROUTER_ENABLED, light_model: str = LLM_LIGHT_MODEL,
+                 light_after: List[str] = MODEL_ROUTER_LIGHT_AFTER):
+        self.enabled = enabled
+        self.light_model = light_model or None
+        self.light_after = set(light_after)
+        self._lock = threading.Lock()
+        self._turns = {tier: {"turns": 0, "seconds": 0.0, "reasons": {}} for tier in (RULE, LIGHT, STRONG)}
+        self._escalations = {}
+
+    def decide(self, messages: List[BaseMessage], task_start: int, force_submit: bool = False) -> Route:
+        """Route the turn that answers messages; task_start is the index where the current task began."""
+        if not self.enabled:
+            return Route(STRONG, "disabled")
+        if force_submit:
+            return Route(STRONG, "deadline")
+        last = messages[-1]
+        if isinstance(last, HumanMessage) and isinstance(last.content, str) and last.content.startswith("http"):
+            return Route(RULE, "follow_url", _fetch(last.content))
+        results = []
+        for m in reversed(messages):
+            if not isinstance(m, ToolMessage):
+                break
+            results.append(m)
+        if not results:
+            return Route(STRONG, "no_tool_results")
+        for m in results:
+            url = next_task_url(m)
+            if url:
+                return Route(RULE, "follow_url", _fetch(url))
+        if len(results) == 1 and results[0].name == "post_request":
+            data = response_json(results[0])
+            if data and data.get("correct") is True and not data.get("url"):
+                return Route(RULE, "chain_done", AIMessage(content="END", response_metadata={"model_tier": RULE}))
+        if any(_failed(m) for m in messages[task_start:]):
+            return Route(STRONG, "after_failure")
+        if self.light_model and all(m.name in self.light_after for m in results):
+            return Route(LIGHT, "routine")
+        return Route(STRONG, "new_information")
+
+    @staticmethod
+    def accepts(result: Optional[AIMessage]) -> bool:
+        """Whether a light turn's result can be used: it must call a tool."""
+        return result is not None and bool(getattr(result, "tool_calls", None))
+
+    def escalate(self, route: Route, reason: str) -> Route:
+        with self._lock:
+            self._escalations[reason] = self._escalations.get(reason, 0) + 1
+        record_job_metric("model_escalations", 1)
+        logger.warning(f"Escalating {route.tier} turn ({route.reason}) to the strong model: {reason}",
+                       extra={"event": "model_escalation", "reason": reason})
+        return Route(STRONG, f"escalated_{reason}")
+
+    def record(self, route: Route, seconds: float) -> None:
+        TURN_SECONDS.observe(seconds, tier=route.tier, reason=route.reason)
+        record_job_metric(f"turns_{route.tier}", 1)
+        with self._lock:
+            turns = self._turns[route.tier]
+            turns["turns"] += 1
+            turns["seconds"] += seconds
+            turns["reasons"][route.reason] = turns["reasons"].get(route.reason, 0) + 1
+        logger.info(f"Turn routed to {route.tier} ({route.reason}) in {seconds:.2f}s",
+                    extra={"event": "model_route", "tier": route.tier, "reason": route.reason})
+
+    def stats(self) -> dict:
+        with self._lock:
+            tiers = {tier: {**t, "reasons": dict(t["reasons"]), "seconds": round(t["seconds"], 3),
+                            "mean_seconds": round(t["seconds"] / t["turns"], 3) if t["turns"] else None}
+                     for tier, t in self._turns.items()}
+            return {
+                "enabled": self.enabled,
+                "light_model": self.light_model,
+                **tiers,
+                "escalations": dict(self._escalations),
+                "light_limiter": light_limiter.stats(),
+            }
+
+
+model_router = ModelRouter()
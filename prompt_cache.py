@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from typing import Any, List, Optional
+from logger_config import get_logger
+
+logger = get_logger("prompt_cache")
+
+# Use Gemini explicit context caching for the system prompt and tool schemas
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") == "1"
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+# The cache's TTL is extended when less than this is left
+PROMPT_CACHE_REFRESH_SECONDS = int(os.getenv("PROMPT_CACHE_REFRESH_SECONDS", "300"))
+# After a failure (quota, prefix below the model's minimum, API error) calls go uncached this long
+PROMPT_CACHE_RETRY_SECONDS = float(os.getenv("PROMPT_CACHE_RETRY_SECONDS", "600"))
+
+
+def function_declarations(tools: List[Any]) -> List[dict]:
+    """JSON-schema declarations of langchain tools, as bind_tools would send them."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    return [convert_to_openai_tool(tool)["function"] for tool in tools]
+
+
+class PromptCache:
+    """
+    Explicit Gemini context cache of the static prompt prefix.
+
+    The system prompt and tool declarations are uploaded once per process as
+    a CachedContent; calls then reference it by name and send only the
+    conversation. The TTL is extended shortly before it runs out. When
+    creating or using the cache fails, calls fall back to sending the full
+    prompt until PROMPT_CACHE_RETRY_SECONDS have passed. Per-mode call
+    counts, latency and prompt tokens are kept so the saving can be checked.
+    """
+
+    def __init__(self, enabled: bool = PROMPT_CACHE_ENABLED, ttl: int = PROMPT_CACHE_TTL_SECONDS,
+                 refresh: int = PROMPT_CACHE_REFRESH_SECONDS, retry: float = PROMPT_CACHE_RETRY_SECONDS):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.refresh = refresh
+        self.retry = retry
+        self.model: Optional[str] = None
+        self.system_prompt: Optional[str] = None
+        self.tools: List[Any] = []
+        self.name: Optional[str] = None
+        self.expires_at = 0.0
+        self.prefix_tokens: Optional[int] = None
+        self._retry_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+        self._events = {"created": 0, "refreshed": 0, "failures": 0, "invalidated": 0}
+        self._calls = {mode: {"calls": 0, "seconds": 0.0, "input_tokens": 0, "cached_tokens": 0}
+                       for mode in ("cached", "uncached")}
+        self.last_error: Optional[str] = None
+
+    def configure(self, model: str, system_prompt: str, tools: List[Any]) -> None:
+        self.model, self.system_prompt, self.tools = model, system_prompt, list(tools)
+
+    def _genai(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        return self._client
+
+    # -------------------------------------------------
+    # LIFECYCLE
+    # -------------------------------------------------
+    def _create(self) -> None:
+        from google.genai import types
+        started = time.perf_counter()
+        declarations = [types.FunctionDeclaration(name=d["name"], description=d.get("description", ""),
+                                                  parameters_json_schema=d.get("parameters"))
+                        for d in function_declarations(self.tools)]
+        cache = self._genai().caches.create(
+            model=f"models/{self.model}",
+            config=types.CreateCachedContentConfig(
+                display_name="quiz-agent-prompt",
+                system_instruction=self.system_prompt,
+                tools=[types.Tool(function_declarations=declarations)],
+                ttl=f"{self.ttl}s",
+            ),
+        )
+        self.name, self.expires_at = cache.name, time.time() + self.ttl
+        self.prefix_tokens = getattr(cache.usage_metadata, "total_token_count", None)
+        self._events["created"] += 1
+        logger.info(f"Prompt cache {cache.name} created ({self.prefix_tokens} tokens, ttl {self.ttl}s) "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    def _extend(self) -> None:
+        from google.genai import types
+        self._genai().caches.update(name=self.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+        self.expires_at = time.time() + self.ttl
+        self._events["refreshed"] += 1
+        logger.info(f"Prompt cache {self.name} extended by {self.ttl}s")
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.name, self.expires_at = None, 0.0
+        self._retry_at = time.time() + self.retry
+        self._events["failures"] += 1
+        self.last_error = f"{action}: {error}"
+        logger.warning(f"Prompt cache {action} failed, sending the full prompt for {self.retry:.0f}s: {error}")
+
+    def get(self) -> Optional[str]:
+        """Name of a live cache for the prompt prefix, or None to send the full prompt."""
+        if not self.enabled or self.model is None:
+            return None
+        with self._lock:
+            now = time.time()
+            if self.name and now < self.expires_at - self.refresh:
+                return self.name
+            if now < self._retry_at:
+                return None
+            if self.name and now < self.expires_at:
+                try:
+                    self._extend()
+                    return self.name
+                except Exception as e:
+                    # Extending failed but the cache may still be usable; a new one replaces it below
+                    logger.warning(f"Prompt cache {self.name} could not be extended: {e}")
+            try:
+                self._create()
+            except Exception as e:
+                self._failed("create", e)
+            return self.name
+
+    def invalidate(self, error: Exception) -> None:
+        """Drop a cache the API rejected (expired, deleted elsewhere) and fall back for a while."""
+        with self._lock:
+            self._events["invalidated"] += 1
+            self._failed("use", error)
+
+    def close(self) -> None:
+        """Delete the cache so it stops accruing storage time after shutdown."""
+        with self._lock:
+            name, self.name = self.name, None
+        if name:
+            try:
+                self._genai().caches.delete(name=name)
+                logger.info(f"Prompt cache {name} deleted")
+            except Exception as e:
+                logger.warning(f"Prompt cache {name} could not be deleted: {e}")
+
+    # -------------------------------------------------
+    # ACCOUNTING
+    # -------------------------------------------------
+    def record(self, cached: bool, seconds: float, usage: Optional[dict]) -> None:
+        usage = usage or {}
+        with self._lock:
+            calls = self._calls["cached" if cached else "uncached"]
+            calls["calls"] += 1
+            calls["seconds"] += seconds
+            calls["input_tokens"] += usage.get("input_tokens") or 0
+            calls["cached_tokens"] += (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            modes = {}
+            for mode, c in self._calls.items():
+                modes[mode] = {
+                    **c,
+                    "seconds": round(c["seconds"], 3),
+                    "mean_seconds": round(c["seconds"] / c["calls"], 3) if c["calls"] else None,
+                    "mean_input_tokens": round(c["input_tokens"] / c["calls"]) if c["calls"] else None,
+                }
+            return {
+                "enabled": self.enabled,
+                "name": self.name,
+                "expires_in_seconds": round(self.expires_at - time.time()) if self.name else None,
+                "prefix_tokens": self.prefix_tokens,
+                **self._events,
+                "last_error": self.last_error,
+                **modes,
+            }
+
+
+prompt_cache = PromptCache()
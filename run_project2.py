@@ -1,7 +1,7 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from agent import run_agent
+from agent import arun_agent
 
 # Load environment variables
 load_dotenv()
@@ -14,8 +14,8 @@ def main():
     
     # Run the agent
     try:
-        # run_agent is synchronous in the provided agent.py (it uses app.invoke)
-        run_agent(start_url)
+        # arun_agent drives the whole chain on a single event loop (it uses app.ainvoke)
+        asyncio.run(arun_agent(start_url))
     except Exception as e:
         print(f"An error occurred: {e}")
 
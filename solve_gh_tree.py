@@ -1,5 +1,5 @@
-import requests
 import os
+from tools.http_client import get_client
 
 def solve():
     owner = "sanand0"
@@ -12,7 +12,7 @@ def solve():
     url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{sha}?recursive=1"
     print(f"Fetching: {url}")
     
-    resp = requests.get(url)
+    resp = get_client().get(url)
     resp.raise_for_status()
     data = resp.json()
     
@@ -0,0 +1,62 @@
+"""
+Shared fixtures.
+
+Tests run from the project root (the modules are imported as top-level
+modules, like the app does) and never need network access: HTTP tests talk
+to a local server started per test.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+
+class Route:
+    """A canned response; `requests` records the headers of every request served."""
+
+    def __init__(self, body: bytes, headers: dict = None, etag: str = None):
+        self.body = body
+        self.headers = dict(headers or {})
+        self.etag = etag
+        self.requests = []
+
+
+@pytest.fixture
+def http_server():
+    """Local HTTP server; register responses with server.route(path, body, ...)."""
+    routes = {}
+
+    def route(path: str, body: bytes, headers: dict = None, etag: str = None) -> Route:
+        routes[path] = Route(body, headers, etag)
+        return routes[path]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            route = routes.get(self.path)
+            if route is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            route.requests.append(dict(self.headers))
+            not_modified = route.etag is not None and self.headers.get("If-None-Match") == route.etag
+            self.send_response(304 if not_modified else 200)
+            for name, value in route.headers.items():
+                self.send_header(name, value)
+            if route.etag:
+                self.send_header("ETag", route.etag)
+            self.send_header("Content-Length", "0" if not_modified else str(len(route.body)))
+            self.end_headers()
+            if not not_modified:
+                self.wfile.write(route.body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.route = route
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
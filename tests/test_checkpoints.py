@@ -0,0 +1,79 @@
+import time
+import pytest
+from checkpoints import DONE, FAILED, CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(path=tmp_path / "checkpoints.sqlite", enabled=True, max_resumes=2,
+                           max_age=3600, history_size=2)
+
+
+def test_advance_records_task_and_history(store):
+    store.begin("job", "http://q/start", priority=3)
+    store.advance("job", 2, "http://q/task/2", ["task 1: answered 42"])
+
+    checkpoint = store.load("job")
+
+    assert (checkpoint.start_url, checkpoint.priority) == ("http://q/start", 3)
+    assert (checkpoint.task_number, checkpoint.task_url) == (2, "http://q/task/2")
+    assert checkpoint.summaries == ["task 1: answered 42"]
+
+
+def test_begin_keeps_an_existing_checkpoint(store):
+    store.begin("job", "http://q/start")
+    store.advance("job", 3, "http://q/task/3", ["one", "two"])
+
+    store.begin("job", "http://q/start")
+
+    assert store.load("job").task_number == 3
+
+
+def test_resumes_are_limited(store):
+    store.begin("job", "http://q/start")
+    store.advance("job", 1, "http://q/task/1", [])
+
+    assert store.claim_resume("job").resumes == 1
+    assert store.claim_resume("job").resumes == 2
+    assert store.claim_resume("job") is None
+    assert store.stats()["resumed"] == 2
+
+
+def test_job_that_never_reached_a_task_is_not_resumed(store):
+    store.begin("job", "http://q/start")
+
+    assert store.claim_resume("job") is None
+    assert store.claim_resume("unknown") is None
+
+
+def test_interrupted_lists_running_jobs_and_expires_old_ones(store, monkeypatch):
+    store.begin("old", "http://q/old")
+    later = time.time() + 7200
+    monkeypatch.setattr(time, "time", lambda: later)
+    store.begin("recent", "http://q/recent")
+    store.begin("finished", "http://q/finished")
+    store.finish("finished", DONE)
+
+    assert [checkpoint.job_id for checkpoint in store.interrupted()] == ["recent"]
+    assert store.stats()[FAILED] == 1
+
+
+def test_finished_history_is_trimmed(store):
+    for number in range(4):
+        store.begin(f"job-{number}", "http://q/start")
+        store.finish(f"job-{number}", DONE)
+    store.begin("running", "http://q/start")
+
+    assert store.load("job-0") is None
+    assert store.load("job-3") is not None
+    assert store.load("running") is not None
+
+
+def test_disabled_store_writes_nothing(tmp_path):
+    store = CheckpointStore(path=tmp_path / "checkpoints.sqlite", enabled=False)
+    store.begin("job", "http://q/start")
+    store.advance("job", 1, "http://q/task/1", [])
+
+    assert store.load("job") is None
+    assert store.interrupted() == []
+    assert not (tmp_path / "checkpoints.sqlite").exists()
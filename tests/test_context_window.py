@@ -0,0 +1,124 @@
+import re
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+import tools.tool_output as tool_output
+from context_window import (
+    build_context, compact_tool_message, completed_task_summaries, estimate_tokens, resumed_history,
+    task_boundaries,
+)
+
+
+@pytest.fixture(autouse=True)
+def outputs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_output, "TOOL_OUTPUT_DIR", tmp_path)
+    return tmp_path
+
+
+def call(name: str, args: dict, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id, "type": "tool_call"}])
+
+
+def result(name: str, content: str, call_id: str) -> ToolMessage:
+    return ToolMessage(content=content, name=name, tool_call_id=call_id)
+
+
+def task(url: str, answer: int, next_url: str = None, page: str = "page", n: int = 0) -> list:
+    """Messages of one quiz task: fetch the page, submit, get the server's reply."""
+    reply = '{"correct": true' + (f', "url": "{next_url}"' if next_url else "") + "}"
+    return [
+        call("get_rendered_html", {"url": url}, f"fetch{n}"),
+        result("get_rendered_html", page, f"fetch{n}"),
+        call("post_request", {"payload": {"answer": answer}}, f"post{n}"),
+        result("post_request", reply, f"post{n}"),
+    ]
+
+
+def handle_of(content: str) -> str:
+    return re.search(r'handle="(\w+)"', content).group(1)
+
+
+def test_short_output_is_kept():
+    message = result("run_code", "ok", "1")
+    assert compact_tool_message(message, max_chars=100) is message
+
+
+def test_long_output_is_spilled_with_a_handle():
+    content = "x" * 50 + "y" * 50
+    compacted = compact_tool_message(result("run_code", content, "1"), max_chars=50)
+
+    assert compacted.content.startswith("x" * 50 + "\n")
+    assert "offset=50" in compacted.content
+    assert tool_output.load_tool_output(handle_of(compacted.content)) == content
+
+
+def test_read_tool_output_slices_are_not_spilled_again():
+    message = result("read_tool_output", "z" * 200, "1")
+    assert compact_tool_message(message, max_chars=50) is message
+
+
+def test_read_continues_where_the_digest_stops():
+    content = "".join(str(i % 10) for i in range(120))
+    compacted = compact_tool_message(result("run_code", content, "1"), max_chars=50)
+
+    rest = tool_output.read_tool_output.func(handle_of(compacted.content), offset=50, length=40)
+
+    assert rest.startswith(content[50:90])
+    assert rest.endswith("[30 more characters; continue with offset=90]")
+
+
+def test_estimate_tokens_counts_content_and_tool_arguments():
+    messages = [HumanMessage(content="a" * 40), call("run_code", {"code": "b" * 40}, "1")]
+    assert estimate_tokens(messages) == (40 + len('{"code": "' + "b" * 40 + '"}')) // 4
+
+
+def test_task_boundaries():
+    messages = [HumanMessage(content="http://q/1")] + task("http://q/1", 1, "http://q/2") + \
+        task("http://q/2", 2, n=1)
+    # The second task starts at the AIMessage whose post_request returned its URL
+    assert task_boundaries(messages) == [0, 3]
+
+
+def test_single_task_context_is_unchanged():
+    messages = [HumanMessage(content="http://q/1")] + task("http://q/1", 1)
+    assert build_context(messages) == messages
+
+
+def test_completed_tasks_are_summarised():
+    messages = [HumanMessage(content="http://q/1")] + task("http://q/1", 1, "http://q/2") + \
+        task("http://q/2", 2, n=1)
+
+    context = build_context(messages)
+
+    summary = context[0].content
+    assert "Task 1: http://q/1" in summary
+    assert 'submitted: {"answer": 1}' in summary
+    assert "http://q/2" in summary
+    # The current task keeps its submission call paired with the tool result
+    assert context[1:] == messages[3:]
+
+
+def test_resumed_history_is_folded_into_the_summary():
+    messages = [resumed_history(["- Task 1: http://q/1 | submitted: 7"]), HumanMessage(content="http://q/2")] + \
+        task("http://q/2", 2)
+
+    assert completed_task_summaries(messages) == ["- Task 1: http://q/1 | submitted: 7"]
+    assert "submitted: 7" in build_context(messages)[0].content
+
+
+def test_over_budget_compacts_oldest_outputs_first():
+    messages = [HumanMessage(content="http://q/1"),
+                call("run_code", {}, "a"), result("run_code", "a" * 8000, "a"),
+                call("run_code", {}, "b"), result("run_code", "b" * 8000, "b"),
+                call("run_code", {}, "c"), result("run_code", "c" * 8000, "c")]
+
+    context = build_context(messages, token_budget=4500)
+
+    assert "[truncated" in context[2].content
+    assert context[4].content == "b" * 8000
+    assert context[6].content == "c" * 8000
+    assert messages[2].content == "a" * 8000  # the state itself is not touched
+
+
+def test_latest_output_is_never_compacted():
+    messages = [HumanMessage(content="http://q/1"), call("run_code", {}, "a"), result("run_code", "a" * 8000, "a")]
+    assert build_context(messages, token_budget=100)[-1].content == "a" * 8000
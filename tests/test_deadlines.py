@@ -0,0 +1,135 @@
+import asyncio
+import time
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+import deadlines
+import tool_executor
+from deadlines import (
+    DEADLINE_MIN_TOOL_SECONDS, DEADLINE_SUBMIT_RESERVE_SECONDS, TASK_TIME_LIMIT_SECONDS, cap_timeout, must_submit,
+    remaining, submitted_in_task, time_hint, tool_budget, tool_deadline, with_time_hint,
+)
+from tool_executor import ToolExecutor
+
+
+def test_cap_timeout_outside_a_tool_call():
+    assert cap_timeout(120) == 120
+
+
+def test_cap_timeout_shortens_to_the_call_deadline():
+    token = tool_deadline.set(time.time() + 30)
+    try:
+        assert 29 < cap_timeout(120) <= 30
+        assert cap_timeout(10) == 10
+    finally:
+        tool_deadline.reset(token)
+
+
+def test_cap_timeout_keeps_a_minimum_past_the_deadline():
+    token = tool_deadline.set(time.time() - 60)
+    try:
+        assert cap_timeout(120) == DEADLINE_MIN_TOOL_SECONDS
+    finally:
+        tool_deadline.reset(token)
+
+
+def test_tool_budget_leaves_the_submission_reserve():
+    started = time.time()
+    assert remaining(None) is None and tool_budget(None) is None
+    expected = TASK_TIME_LIMIT_SECONDS - DEADLINE_SUBMIT_RESERVE_SECONDS
+    assert expected - 1 < tool_budget(started) <= expected
+    assert tool_budget(started - TASK_TIME_LIMIT_SECONDS) == DEADLINE_MIN_TOOL_SECONDS
+
+
+def test_must_submit():
+    assert must_submit(5, submitted=False)
+    assert not must_submit(5, submitted=True)
+    assert not must_submit(TASK_TIME_LIMIT_SECONDS, submitted=False)
+    assert not must_submit(None, submitted=False)
+
+
+def test_time_hints():
+    assert time_hint(1, None, False) is None
+    assert time_hint(2, 100, False) == f"[Task 2 clock: 100s of {TASK_TIME_LIMIT_SECONDS:.0f}s left.]"
+    assert "Submit your best answer with post_request now" in time_hint(2, 5, False)
+    assert "past the" in time_hint(2, -12, True)
+
+
+def test_with_time_hint_copies_the_last_message():
+    context = [HumanMessage(content="http://q/1"), ToolMessage(content="42", tool_call_id="1")]
+    hinted = with_time_hint(context, "[clock]")
+
+    assert hinted[-1].content == "42\n\n[clock]"
+    assert context[-1].content == "42"
+    multimodal = [HumanMessage(content=[{"type": "text", "text": "look"}])]
+    assert with_time_hint(multimodal, "[clock]")[-1].content[-1] == {"type": "text", "text": "[clock]"}
+    assert with_time_hint(context, None) is context
+
+
+def test_submitted_in_task():
+    post = AIMessage(content="", tool_calls=[{"name": "post_request", "args": {}, "id": "p", "type": "tool_call"}])
+    messages = [HumanMessage(content="http://q/1"), post]
+    assert submitted_in_task(messages, 0)
+    assert not submitted_in_task(messages, 1)
+
+
+# -------------------------------------------------
+# PRE-EMPTION IN THE TOOL EXECUTOR
+# -------------------------------------------------
+@tool
+def quick() -> str:
+    """Report the timeout a 100 s tool would get now."""
+    return f"{cap_timeout(100):.1f}"
+
+
+@tool
+def stuck() -> str:
+    """Outlive every deadline."""
+    time.sleep(1)
+    return "too late"
+
+
+async def _aquick() -> str:
+    return f"{cap_timeout(100):.1f}"
+
+
+async def _astuck() -> str:
+    await asyncio.sleep(30)
+    return "too late"
+
+
+quick.coroutine = _aquick
+stuck.coroutine = _astuck
+
+
+@pytest.fixture
+def overdue_state(monkeypatch):
+    """A task already past its limit, so tools get only the (shortened) minimum."""
+    monkeypatch.setattr(deadlines, "DEADLINE_MIN_TOOL_SECONDS", 0.2)
+    monkeypatch.setattr(tool_executor, "DEADLINE_PREEMPT_GRACE_SECONDS", 0.1)
+    calls = [{"name": name, "args": {}, "id": name, "type": "tool_call"} for name in ("quick", "stuck")]
+    return {"messages": [AIMessage(content="", tool_calls=calls)],
+            "task_started_at": time.time() - TASK_TIME_LIMIT_SECONDS}
+
+
+def _check_preempted(messages):
+    assert [m.tool_call_id for m in messages] == ["quick", "stuck"]
+    assert messages[0].content == "0.2"
+    assert messages[1].status == "error"
+    assert "submit your best answer" in messages[1].content
+
+
+def test_stuck_tool_is_preempted(overdue_state):
+    started = time.perf_counter()
+    result = ToolExecutor([quick, stuck]).invoke(overdue_state, {})
+
+    assert time.perf_counter() - started < 0.9
+    _check_preempted(result["messages"])
+
+
+def test_stuck_tool_is_preempted_async(overdue_state):
+    started = time.perf_counter()
+    result = asyncio.run(ToolExecutor([quick, stuck]).ainvoke(overdue_state, {}))
+
+    assert time.perf_counter() - started < 0.9
+    _check_preempted(result["messages"])
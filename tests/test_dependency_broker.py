@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import pytest
+from packaging.requirements import Requirement
+import tools.dependency_broker as broker
+from tools.dependency_broker import DependencyBroker, Resolution, canonical_name, overlay_env
+from tools.run_code import WORKER_SCRIPT
+
+
+@pytest.fixture
+def overlay(tmp_path, monkeypatch):
+    path = tmp_path / "overlay"
+    path.mkdir()
+    monkeypatch.setattr(broker, "DEPS_OVERLAY_DIR", path)
+    return path
+
+
+def test_canonical_name():
+    assert canonical_name("Scikit_Learn") == canonical_name("scikit.learn") == "scikit-learn"
+
+
+def test_overlay_env_keeps_overlay_off_pythonpath(overlay):
+    env = overlay_env({"PYTHONPATH": os.pathsep.join(["/src", str(overlay)])})
+    assert env["PYTHONPATH"] == "/src"
+    assert env["DEPS_OVERLAY_DIR"] == str(overlay)
+    assert "PYTHONPATH" not in overlay_env({"PYTHONPATH": str(overlay)})
+
+
+def test_overlay_comes_after_site_packages_in_workers(overlay, tmp_path):
+    # A stand-in for a project package, and one only the overlay provides
+    (overlay / "pytest").mkdir()
+    (overlay / "pytest" / "__init__.py").write_text("raise ImportError('overlay shadowed the project')\n")
+    (overlay / "overlay_only.py").write_text("VALUE = 42\n")
+    script = tmp_path / "snippet.py"
+    script.write_text("import sys, pytest, overlay_only\n"
+                      f"print(overlay_only.VALUE, sys.path[-1] == {str(overlay)!r})\n")
+
+    result = subprocess.run([sys.executable, str(WORKER_SCRIPT), "--once", str(script)],
+                            env=overlay_env(), capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["42", "True"]
+
+
+@pytest.mark.parametrize("requirement, version, expected", [
+    ("pandas", "2.3.3", True),
+    ("pandas>=2", "2.3.3", True),
+    ("pandas<2", "2.3.3", False),
+    ("pandas", None, False),
+])
+def test_satisfied(requirement, version, expected):
+    assert DependencyBroker._satisfied(requirement, version) is expected
+
+
+def test_installed_packages_resolve_without_installing(overlay, monkeypatch):
+    deps = DependencyBroker(overlay=overlay, wheelhouse="", offline=True)
+    monkeypatch.setattr(deps, "_install_one", lambda requirement: pytest.fail(f"installed {requirement}"))
+
+    [resolution] = deps.ensure(["pytest"])
+
+    assert resolution.status == "installed"
+
+
+def test_project_package_is_never_replaced(overlay):
+    deps = DependencyBroker(overlay=overlay, wheelhouse="", offline=True)
+
+    [resolution] = deps.ensure(["pytest<1"])
+
+    assert resolution.status == "failed"
+    assert "part of the project environment" in resolution.error
+
+
+def test_missing_dependency_is_reported_by_name(overlay, monkeypatch):
+    deps = DependencyBroker(overlay=overlay, wheelhouse="", offline=True)
+    requires = {"newpkg": ["pytest>=1", "missing-dep>=2"]}
+    monkeypatch.setattr(deps, "_dependencies",
+                        lambda name, extras: [Requirement(r) for r in requires.get(name, [])])
+    installed = []
+
+    def install_one(requirement):
+        installed.append(requirement)
+        return ("wheelhouse", None) if requirement == "newpkg" else (None, "wheelhouse: not found")
+
+    monkeypatch.setattr(deps, "_install_one", install_one)
+
+    [resolution] = deps.ensure(["newpkg"])
+
+    assert installed == ["newpkg", "missing-dep>=2"]
+    assert resolution.status == "failed"
+    assert "missing-dep>=2 (wheelhouse: not found)" in resolution.error
+
+
+def test_describe_includes_warnings():
+    line = Resolution("pkg", "index", "1.0", 0.5, "needs numpy<2").describe()
+    assert line.endswith("; warning: needs numpy<2")
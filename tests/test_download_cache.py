@@ -0,0 +1,125 @@
+import asyncio
+import sqlite3
+import pytest
+from tools.download_cache import DownloadCache, freshness_lifetime
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(root=tmp_path / "downloads", max_mb=1, fresh_seconds=0)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({}, 0.0),
+    ({"cache-control": "no-store"}, None),
+    ({"cache-control": "private, no-cache"}, 0.0),
+    ({"cache-control": "public, max-age=120"}, 120.0),
+    ({"cache-control": "max-age=120", "age": "100"}, 20.0),
+    ({"cache-control": "max-age=120", "age": "500"}, 0.0),
+    ({"cache-control": "max-age=120", "age": "soon"}, 120.0),
+])
+def test_freshness_lifetime(headers, expected):
+    assert freshness_lifetime(headers, 0.0) == expected
+
+
+def test_freshness_lifetime_default_applies_without_max_age():
+    assert freshness_lifetime({}, 30.0) == 30.0
+    assert freshness_lifetime({"cache-control": "no-cache"}, 30.0) == 0.0
+
+
+def test_revalidates_every_time_by_default(cache, http_server, tmp_path):
+    route = http_server.route("/data.csv", b"a,b\n1,2\n", etag='"v1"')
+    url = http_server.url + "/data.csv"
+
+    first = cache.download_to(url, tmp_path / "first.csv")
+    second = cache.download_to(url, tmp_path / "second.csv")
+
+    assert (first.status, second.status) == ("miss", "revalidated")
+    assert route.requests[1]["If-None-Match"] == '"v1"'
+    assert (tmp_path / "second.csv").read_bytes() == b"a,b\n1,2\n"
+
+
+def test_changed_content_is_downloaded_again(cache, http_server, tmp_path):
+    route = http_server.route("/q", b"first", etag='"1"')
+    url = http_server.url + "/q"
+    cache.download_to(url, tmp_path / "a")
+
+    route.body, route.etag = b"second", '"2"'
+    result = cache.download_to(url, tmp_path / "b")
+
+    assert result.status == "miss"
+    assert (tmp_path / "b").read_bytes() == b"second"
+
+
+def test_max_age_is_served_without_a_request(cache, http_server, tmp_path):
+    route = http_server.route("/static", b"x" * 10, {"Cache-Control": "max-age=3600"}, etag='"s"')
+    url = http_server.url + "/static"
+
+    cache.download_to(url, tmp_path / "a")
+    result = cache.download_to(url, tmp_path / "b")
+
+    assert result.status == "hit"
+    assert len(route.requests) == 1
+
+
+def test_no_store_is_never_indexed(cache, http_server, tmp_path):
+    route = http_server.route("/live", b"live", {"Cache-Control": "no-store"}, etag='"l"')
+    url = http_server.url + "/live"
+
+    first = cache.download_to(url, tmp_path / "a")
+    second = cache.download_to(url, tmp_path / "b")
+
+    assert (first.status, second.status) == ("no-store", "no-store")
+    assert "If-None-Match" not in route.requests[1]
+    assert (tmp_path / "b").read_bytes() == b"live"
+    assert not first.path.exists()
+    assert list(cache.blobs.iterdir()) == []
+    assert cache.stats()["blobs"] == 0
+
+
+def test_async_twin_revalidates(cache, http_server, tmp_path):
+    http_server.route("/a", b"async", etag='"a"')
+    url = http_server.url + "/a"
+
+    async def both():
+        return [await cache.adownload_to(url, tmp_path / name) for name in ("a", "b")]
+
+    assert [r.status for r in asyncio.run(both())] == ["miss", "revalidated"]
+
+
+def test_identical_content_is_stored_once(cache, http_server, tmp_path):
+    http_server.route("/one", b"same bytes")
+    http_server.route("/two", b"same bytes")
+
+    a = cache.download_to(http_server.url + "/one", tmp_path / "a")
+    b = cache.download_to(http_server.url + "/two", tmp_path / "b")
+
+    assert a.path == b.path
+    assert cache.stats()["blobs"] == 1
+
+
+def test_least_recently_used_blob_is_evicted(tmp_path, http_server):
+    cache = DownloadCache(root=tmp_path / "downloads", max_mb=1, fresh_seconds=3600)
+    for name in ("old", "recent", "new"):
+        http_server.route(f"/{name}", name.encode() * (400 * 1024 // len(name)))
+
+    old = cache.download_to(http_server.url + "/old", tmp_path / "old")
+    cache.download_to(http_server.url + "/recent", tmp_path / "recent")
+    cache.download_to(http_server.url + "/new", tmp_path / "new")
+
+    assert not old.path.exists()
+    assert cache.stats()["blobs"] == 2
+    assert cache.download_to(http_server.url + "/recent", tmp_path / "again").status == "hit"
+
+
+def test_index_without_fresh_until_is_upgraded(tmp_path):
+    root = tmp_path / "downloads"
+    root.mkdir()
+    with sqlite3.connect(root / "index.sqlite") as db:
+        db.execute("CREATE TABLE entries (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, "
+                   "etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, last_access REAL NOT NULL)")
+
+    DownloadCache(root=root)
+
+    with sqlite3.connect(root / "index.sqlite") as db:
+        assert "fresh_until" in {row[1] for row in db.execute("PRAGMA table_info(entries)")}
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from PIL import Image
+import tools.image_stats as image_stats
+from tools.image_stats import (
+    _nearest, channel_histograms, channel_stats, color_counts, dominant_colors, image_diff, load_rgb, parse_color,
+)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch, tmp_path):
+    # Several chunks per test image, so chunked accumulation is exercised
+    monkeypatch.setattr(image_stats, "IMAGE_STATS_CHUNK_PIXELS", 1000)
+    monkeypatch.setattr(image_stats, "ARRAYS_DIR", tmp_path / "arrays")
+
+
+def flag() -> np.ndarray:
+    """100x60: left third red, middle white, right third blue."""
+    pixels = np.zeros((60, 100, 3), dtype=np.uint8)
+    pixels[:, :30] = (255, 0, 0)
+    pixels[:, 30:70] = (255, 255, 255)
+    pixels[:, 70:] = (0, 0, 255)
+    return pixels
+
+
+@pytest.mark.parametrize("text, rgb", [
+    ("#ff8800", (255, 136, 0)),
+    ("ff8800", (255, 136, 0)),
+    ("#f80", (255, 136, 0)),
+    ("255, 136, 0", (255, 136, 0)),
+    ("rgb(255,136,0)", (255, 136, 0)),
+    ("red", (255, 0, 0)),
+])
+def test_parse_color(text, rgb):
+    assert parse_color(text) == rgb
+
+
+def test_histograms_match_numpy():
+    pixels = np.random.default_rng(0).integers(0, 256, (50, 70, 3), dtype=np.uint8)
+    counts = channel_histograms(pixels)
+    for c in range(3):
+        assert (counts[c] == np.bincount(pixels[..., c].ravel(), minlength=256)).all()
+
+
+def test_channel_stats():
+    text = channel_stats(flag())
+    assert "Pixels: 6000 (100x60)" in text
+    red = flag()[..., 0]
+    assert f"      R     0   255 {red.mean():8.2f} {red.std():8.2f}     255" in text
+    assert "Mean colour: #b266b2" in text
+
+
+def test_color_counts_and_tolerance():
+    pixels = flag()
+    pixels[0, 0] = (250, 5, 5)
+
+    text = color_counts(pixels, color="#ff0000", tolerance=5)
+
+    assert "distinct colours: 4" in text
+    assert "#ffffff rgb(255, 255, 255): 2400 px (40.00%)" in text
+    assert "Pixels matching #ff0000 (tolerance 5): 1800 (30.00%)" in text
+
+
+def test_nearest_matches_brute_force():
+    rng = np.random.default_rng(1)
+    points = rng.integers(0, 256, (500, 3), dtype=np.uint8)
+    centers = rng.uniform(0, 255, (6, 3))
+
+    labels, distances = _nearest(points, centers)
+
+    full = ((points[:, None, :].astype(np.float64) - centers[None]) ** 2).sum(axis=2)
+    assert (labels == full.argmin(axis=1)).all()
+    assert np.allclose(distances, full.min(axis=1), rtol=1e-5)
+
+
+def test_dominant_colors_finds_the_flag():
+    text = dominant_colors(flag(), k=3)
+    assert "#ffffff rgb(255, 255, 255): 40.00%" in text
+    assert "#ff0000 rgb(255, 0, 0): 30.00%" in text
+    assert "#0000ff rgb(0, 0, 255): 30.00%" in text
+
+
+def test_dominant_colors_never_asks_for_more_clusters_than_colours():
+    assert "k=3" in dominant_colors(flag(), k=8)
+
+
+def test_image_diff(tmp_path):
+    before, after = flag(), flag()
+    after[10:20, 40:45] = (0, 0, 0)
+
+    text = image_diff(before, after, mask_path=tmp_path / "mask.png")
+
+    assert "Changed pixels: 50 of 6000" in text
+    assert "Bounding box of changes: x 40-44, y 10-19" in text
+    mask = np.asarray(Image.open(tmp_path / "mask.png"))
+    assert mask.sum() == 50 * 255
+    assert "differ in size" in image_diff(before, after[:10])
+
+
+def test_large_images_are_memory_mapped_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_stats, "IMAGE_MEMMAP_PIXELS", 100)
+    path = tmp_path / "flag.png"
+    Image.fromarray(flag()).save(path)
+
+    pixels = load_rgb(str(path))
+
+    assert isinstance(pixels, np.memmap)
+    assert (np.asarray(pixels) == flag()).all()
+    assert len(list((tmp_path / "arrays").glob("*.npy"))) == 1
+    assert (np.asarray(load_rgb(str(path))) == flag()).all()
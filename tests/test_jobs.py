@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from jobs import CANCELLED, FAILED, SUCCEEDED, JobScheduler, QueueFull, current_job, record_tool_timing
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_priority_order_with_fifo_ties():
+    async def scenario():
+        started = []
+        gate = asyncio.Event()
+
+        async def runner(url):
+            started.append(url)
+            if url == "blocker":
+                await gate.wait()
+
+        scheduler = JobScheduler(runner, workers=1, queue_size=10)
+        scheduler.submit("blocker")
+        await asyncio.sleep(0)  # the single worker picks up the blocker
+        for url, priority in [("low-1", 5), ("high", 0), ("low-2", 5)]:
+            scheduler.submit(url, priority=priority)
+        gate.set()
+        await scheduler._queue.join()
+        await scheduler.shutdown()
+        return started
+
+    assert run(scenario()) == ["blocker", "high", "low-1", "low-2"]
+
+
+def test_queue_limit_raises_queue_full():
+    async def scenario():
+        gate = asyncio.Event()
+        scheduler = JobScheduler(lambda url: gate.wait(), workers=1, queue_size=1)
+        scheduler.submit("running")
+        await asyncio.sleep(0)
+        scheduler.submit("waiting")
+        with pytest.raises(QueueFull):
+            scheduler.submit("rejected")
+        queued = scheduler.get(next(reversed(scheduler.jobs)))
+        await scheduler.shutdown()
+        return queued
+
+    assert run(scenario()).state == CANCELLED
+
+
+def test_job_outcome_and_metrics_are_recorded():
+    async def runner(url):
+        assert current_job.get().url == url
+        record_tool_timing("get_rendered_html", 0.5)
+        if url == "bad":
+            raise RuntimeError("quiz server refused the answer")
+
+    async def scenario():
+        scheduler = JobScheduler(runner, workers=2, queue_size=10)
+        good, bad = scheduler.submit("good"), scheduler.submit("bad")
+        await scheduler._queue.join()
+        await scheduler.shutdown()
+        return good, bad, scheduler.stats()
+
+    good, bad, stats = run(scenario())
+
+    assert good.state == SUCCEEDED
+    assert (bad.state, bad.error) == (FAILED, "quiz server refused the answer")
+    assert good.to_dict()["tool_timings"]["get_rendered_html"]["calls"] == 1
+    assert (stats["succeeded"], stats["failed"]) == (1, 1)
+    assert current_job.get() is None
+
+
+def test_history_keeps_only_recent_finished_jobs():
+    async def scenario():
+        async def runner(url):
+            pass
+
+        scheduler = JobScheduler(runner, workers=1, queue_size=10, history_size=2)
+        for number in range(4):
+            scheduler.submit(f"job-{number}", job_id=f"job-{number}")
+            await scheduler._queue.join()
+        await scheduler.shutdown()
+        return list(scheduler.jobs)
+
+    assert run(scenario()) == ["job-2", "job-3"]
@@ -0,0 +1,129 @@
+import time
+from contextlib import closing
+import httpx
+import pytest
+import llm_limiter
+from llm_limiter import LLM_LIMITER_POLL_SECONDS, SharedRateLimiter, is_rate_limited, retry_after
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return SharedRateLimiter(tmp_path / "limiter.sqlite", requests_per_minute=8, tokens_per_minute=1000)
+
+
+def rpm(limiter) -> float:
+    return limiter.stats()["requests_per_minute"]
+
+
+def test_disabled_limiter_never_waits(tmp_path):
+    limiter = SharedRateLimiter(tmp_path / "off.sqlite", requests_per_minute=0)
+    assert limiter.acquire(10**9).waited == 0.0
+    assert not (tmp_path / "off.sqlite").exists()
+
+
+def test_request_quota_is_enforced(tmp_path):
+    limiter = SharedRateLimiter(tmp_path / "l.sqlite", requests_per_minute=2, tokens_per_minute=1000)
+    assert limiter._try_acquire("a", time.time(), 10)[0] is not None
+    assert limiter._try_acquire("b", time.time(), 10)[0] is not None
+
+    call, wait = limiter._try_acquire("c", time.time(), 10)
+
+    assert call is None
+    assert 59 < wait <= 60
+
+
+def test_token_quota_is_enforced_but_never_deadlocks(limiter):
+    assert limiter._try_acquire("a", time.time(), 900)[0] is not None
+    assert limiter._try_acquire("b", time.time(), 200)[0] is None
+
+
+def test_oversized_call_goes_through_on_an_empty_window(limiter):
+    assert limiter._try_acquire("a", time.time(), 5000)[0] is not None
+
+
+def test_settle_replaces_the_token_estimate(limiter):
+    ticket = limiter.acquire(900)
+    limiter.settle(ticket, {"total_tokens": 100})
+
+    assert limiter.stats()["window_tokens"] == 100
+    assert limiter._try_acquire("b", time.time(), 800)[0] is not None
+
+
+def test_429_halves_the_rate_and_pauses_everyone(limiter):
+    pause = limiter.throttled(RateLimited("quota exceeded, retry in 30s"))
+
+    assert pause == 30
+    assert rpm(limiter) == 8 * llm_limiter.LLM_RATE_BACKOFF
+    call, wait = limiter._try_acquire("a", time.time(), 10)
+    assert call is None and 29 < wait <= 30
+    assert limiter.stats()["rate_limited"] == 1
+
+
+def test_rate_backs_off_multiplicatively_to_one(limiter):
+    for _ in range(10):
+        limiter.throttled(RateLimited("429"))
+    assert rpm(limiter) == 1
+
+
+def test_successes_recover_additively_up_to_the_quota(limiter):
+    limiter.throttled(RateLimited("429"))
+    ticket = llm_limiter.Ticket(0, 0, 0.0)
+
+    limiter.settle(ticket, None)
+    assert rpm(limiter) == 8 * llm_limiter.LLM_RATE_BACKOFF + llm_limiter.LLM_RATE_RECOVERY
+    for _ in range(100):
+        limiter.settle(ticket, None)
+    assert rpm(limiter) == 8
+
+
+def test_nearest_deadline_goes_first(limiter):
+    now = time.time()
+    with closing(limiter._connect()) as db:
+        db.execute("INSERT INTO waiters VALUES ('urgent', ?, ?)", (now + 10, now))
+
+    assert limiter._try_acquire("relaxed", now + 100, 10) == (None, LLM_LIMITER_POLL_SECONDS)
+    assert limiter._try_acquire("urgent", now + 10, 10)[0] is not None
+    assert limiter._try_acquire("relaxed", now + 100, 10)[0] is not None
+
+
+def test_stale_waiters_do_not_block_the_queue(limiter):
+    long_ago = time.time() - 60
+    with closing(limiter._connect()) as db:
+        db.execute("INSERT INTO waiters VALUES ('crashed', 0, ?)", (long_ago,))
+
+    assert limiter._try_acquire("alive", time.time() + 100, 10)[0] is not None
+
+
+def test_lower_quota_applies_to_an_existing_database(tmp_path):
+    SharedRateLimiter(tmp_path / "l.sqlite", requests_per_minute=20)
+    assert rpm(SharedRateLimiter(tmp_path / "l.sqlite", requests_per_minute=5)) == 5
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimited("x"), True),
+    (Exception("429 RESOURCE_EXHAUSTED"), True),
+    (type("ResourceExhausted", (Exception,), {})("quota"), True),
+    (Exception("500 internal"), False),
+])
+def test_is_rate_limited(error, expected):
+    assert is_rate_limited(error) is expected
+
+
+def test_is_rate_limited_looks_through_the_cause():
+    error = RuntimeError("wrapped")
+    error.__cause__ = RateLimited("x")
+    assert is_rate_limited(error)
+
+
+def test_retry_after_sources():
+    class WithResponse(Exception):
+        response = httpx.Response(429, headers={"Retry-After": "7"})
+
+    assert retry_after(WithResponse()) == 7
+    assert retry_after(Exception("'retryDelay': '12s'")) == 12
+    assert retry_after(Exception("Please retry in 3.5s.")) == 3.5
+    assert retry_after(Exception("quota exceeded")) is None
@@ -0,0 +1,89 @@
+import json
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from model_router import LIGHT, RULE, STRONG, ModelRouter
+
+
+def router(**kwargs) -> ModelRouter:
+    return ModelRouter(**{"enabled": True, "light_model": "light", "light_after": ["run_code"], **kwargs})
+
+
+def call(name: str, call_id: str, **args) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id, "type": "tool_call"}])
+
+
+def result(name: str, content, call_id: str, status: str = "success") -> ToolMessage:
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return ToolMessage(content=content, name=name, tool_call_id=call_id, status=status)
+
+
+START = [SystemMessage(content="rules"), HumanMessage(content="http://q/1")]
+
+
+def test_first_url_is_fetched_without_a_model():
+    route = router().decide(START, task_start=1)
+
+    assert (route.tier, route.reason) == (RULE, "follow_url")
+    assert route.message.tool_calls[0]["name"] == "get_rendered_html"
+    assert route.message.tool_calls[0]["args"] == {"url": "http://q/1"}
+
+
+def test_next_task_url_is_followed_without_a_model():
+    messages = START + [call("post_request", "p"), result("post_request", {"correct": True, "url": "http://q/2"}, "p")]
+    route = router().decide(messages, task_start=1)
+    assert route.tier == RULE and route.message.tool_calls[0]["args"]["url"] == "http://q/2"
+
+
+def test_chain_ends_after_a_final_correct_answer():
+    messages = START + [call("post_request", "p"), result("post_request", {"correct": True}, "p")]
+    route = router().decide(messages, task_start=1)
+    assert (route.tier, route.reason, route.message.content) == (RULE, "chain_done", "END")
+
+
+def test_wrong_answer_goes_to_the_strong_model():
+    messages = START + [call("post_request", "p"), result("post_request", {"correct": False}, "p")]
+    assert router().decide(messages, task_start=1).reason == "after_failure"
+
+
+def test_routine_turn_after_run_code_goes_light():
+    messages = START + [call("run_code", "r"), result("run_code", {"return_code": 0, "stdout": "42"}, "r")]
+    assert router().decide(messages, task_start=1).tier == LIGHT
+
+
+def test_new_page_needs_the_strong_model():
+    messages = START + [call("get_rendered_html", "g"), result("get_rendered_html", "<html>", "g")]
+    assert router().decide(messages, task_start=1).reason == "new_information"
+
+
+def test_a_failure_anywhere_in_the_task_keeps_it_strong():
+    messages = START + [
+        call("run_code", "r1"), result("run_code", {"return_code": 1}, "r1"),
+        call("run_code", "r2"), result("run_code", {"return_code": 0}, "r2"),
+    ]
+    assert router().decide(messages, task_start=1).tier == STRONG
+    # ...but not in the next task
+    assert router().decide(messages, task_start=4).tier == LIGHT
+
+
+def test_deadline_and_disabled_are_strong():
+    messages = START + [call("run_code", "r"), result("run_code", {"return_code": 0}, "r")]
+    assert router().decide(messages, task_start=1, force_submit=True).reason == "deadline"
+    assert router(enabled=False).decide(messages, task_start=1).reason == "disabled"
+    assert router(light_model="").decide(messages, task_start=1).tier == STRONG
+
+
+def test_light_results_must_call_a_tool():
+    assert ModelRouter.accepts(call("post_request", "p"))
+    assert not ModelRouter.accepts(AIMessage(content="The answer is 42"))
+    assert not ModelRouter.accepts(None)
+
+
+def test_escalations_and_turns_are_counted():
+    r = router()
+    route = r.decide(START + [call("run_code", "r"), result("run_code", {"return_code": 0}, "r")], task_start=1)
+    r.record(r.escalate(route, "no_tool_call"), 1.5)
+
+    stats = r.stats()
+    assert stats["escalations"] == {"no_tool_call": 1}
+    assert stats["strong"]["turns"] == 1
+    assert stats["strong"]["reasons"] == {"escalated_no_tool_call": 1}
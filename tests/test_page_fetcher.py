@@ -0,0 +1,158 @@
+import httpx
+import pytest
+import tools.page_fetcher as page_fetcher_module
+from tools.page_fetcher import (
+    RENDER, STATIC, PageFetcher, _looks_like_html, _looks_like_text, render_reason, url_pattern,
+)
+
+ARTICLE = "<html><body><h1>Quiz</h1><p>" + "Plain server-rendered text. " * 20 + "</p></body></html>"
+
+
+def response(body, content_type=None, status=200) -> httpx.Response:
+    headers = {"content-type": content_type} if content_type else {}
+    content = body.encode() if isinstance(body, str) else body
+    return httpx.Response(status, headers=headers, content=content, request=httpx.Request("GET", "http://q/"))
+
+
+@pytest.mark.parametrize("html, reason", [
+    (ARTICLE, None),
+    ("<div id='out'></div><script>document.getElementById('out').innerHTML = atob('SGk=')</script>",
+     "inline script mutates the DOM"),
+    ("<body><div id='root'></div><script src='/app.js'></script></body>", "empty app root #root"),
+    ("<body><p>Hi</p><noscript>Please enable JavaScript to continue</noscript></body>", "page asks for JavaScript"),
+    ("<body><p>Loading</p><script src='/bundle.js'></script></body>", "scripts present but little visible text"),
+    # External scripts alongside real content do not need a browser
+    (ARTICLE.replace("</body>", "<script src='/analytics.js'></script></body>"), None),
+])
+def test_render_reason(html, reason):
+    assert render_reason(html) == reason
+
+
+def test_render_reason_ignores_filled_app_root():
+    html = "<div id='app'><p>" + "Rendered on the server. " * 20 + "</p></div><script src='/app.js'></script>"
+    assert render_reason(html) is None
+
+
+@pytest.mark.parametrize("body, content_type, expected", [
+    ("<!DOCTYPE html><html></html>", "text/html; charset=utf-8", True),
+    ("<!doctype html><html></html>", None, True),
+    ("  <html><body></body></html>", "application/octet-stream", True),
+    ('{"a": 1}', "application/json", False),
+    ("<html>", "text/plain", False),
+])
+def test_looks_like_html(body, content_type, expected):
+    assert _looks_like_html(response(body, content_type)) is expected
+
+
+@pytest.mark.parametrize("body, content_type, expected", [
+    ('{"a": 1}', "application/json", True),
+    ("a,b\n1,2\n", "text/csv", True),
+    ("<rss></rss>", "application/rss+xml", True),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "image/png", False),
+    (b"%PDF-1.7 \xe2\xe3\xcf\xd3", "application/pdf", False),
+    ("plain words", None, True),
+    (b"\x00\x01\x02", None, False),
+    (b"\xff\xfe\xfa binary", "application/octet-stream", False),
+    # A multi-byte character cut by the 1024-byte sample is still text
+    ("a" * 1023 + "é", None, True),
+])
+def test_looks_like_text(body, content_type, expected):
+    assert _looks_like_text(response(body, content_type)) is expected
+
+
+def test_url_pattern_collapses_variable_segments():
+    assert url_pattern("https://quiz.example/q/834?x=1") == "quiz.example/q/*"
+    assert url_pattern("https://quiz.example/task/0123456789abcdef/start") == "quiz.example/task/*/start"
+    assert url_pattern("https://quiz.example/about") == "quiz.example/about"
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        result = self.responses[url]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.rendered = []
+
+    def render(self, url, wait_until=None):
+        self.rendered.append(url)
+        return "<html><body>rendered</body></html>"
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    browser = FakeBrowser()
+    monkeypatch.setattr(page_fetcher_module, "browser_pool", browser)
+
+    def make(responses):
+        client = FakeClient(responses)
+        monkeypatch.setattr(page_fetcher_module, "get_client", lambda: client)
+        return PageFetcher(mode="auto", ttl=3600), client, browser
+
+    return make
+
+
+def test_static_page_is_not_rendered(fetcher):
+    pages, client, browser = fetcher({"http://q/1": response(ARTICLE, "text/html")})
+
+    result = pages.fetch("http://q/1")
+
+    assert (result.tier, result.is_html) == (STATIC, True)
+    assert browser.rendered == []
+
+
+def test_client_rendered_page_marks_its_pattern(fetcher):
+    spa = response("<body><div id='root'></div><script src='/app.js'></script></body>", "text/html")
+    pages, client, browser = fetcher({"http://q/task/1": spa, "http://q/task/2": spa})
+
+    assert pages.fetch("http://q/task/1").tier == RENDER
+    second = pages.fetch("http://q/task/2")
+
+    assert (second.tier, second.reason) == (RENDER, "cached decision")
+    assert client.calls == 1  # the wasted GET is skipped for the rest of the pattern
+    assert pages.stats()["patterns_render"] == 1
+
+
+@pytest.mark.parametrize("failure", [
+    response("missing", "text/html", status=404),
+    httpx.ConnectError("connection refused"),
+])
+def test_failures_escalate_only_the_call_at_hand(fetcher, failure):
+    pages, client, browser = fetcher({"http://q/page/1": failure, "http://q/page/2": response(ARTICLE, "text/html")})
+
+    assert pages.fetch("http://q/page/1").tier == RENDER
+    assert pages.fetch("http://q/page/2").tier == STATIC
+    assert pages.stats()["patterns_render"] == 0
+
+
+def test_text_is_returned_as_is_and_binary_as_a_notice(fetcher):
+    pages, client, browser = fetcher({
+        "http://q/data.json": response('{"answer": 42}', "application/json"),
+        "http://q/chart.png": response(b"\x89PNG\r\n\x1a\n" + bytes(100), "image/png"),
+    })
+
+    data = pages.fetch("http://q/data.json")
+    image = pages.fetch("http://q/chart.png")
+
+    assert (data.html, data.is_html) == ('{"answer": 42}', False)
+    assert image.is_html is False
+    assert "not a web page: image/png, 108 bytes" in image.html
+    assert "download_file" in image.html
+    assert browser.rendered == []
+
+
+def test_render_mode_always_uses_the_browser(fetcher):
+    pages, client, browser = fetcher({})
+    pages.mode = RENDER
+
+    assert pages.fetch("http://q/1").reason == "FETCH_MODE=render"
+    assert client.calls == 0
@@ -0,0 +1,69 @@
+import signal
+import pytest
+import tools.process_limits as process_limits
+from tools.process_limits import (
+    TAIL_CHARS, THREAD_VARIABLES, OutputCapture, looks_like_oom, read_capped_file, snippet_env,
+)
+
+
+def test_output_under_the_cap_is_kept_whole():
+    capture = OutputCapture(max_chars=100)
+    capture.feed(b"hello ")
+    capture.feed(b"world")
+    assert capture.text() == "hello world"
+
+
+def test_capped_output_keeps_head_and_tail():
+    capture = OutputCapture(max_chars=10)
+    for _ in range(1000):
+        capture.feed(b"x" * 10)
+    capture.feed(b"\nTraceback: the last line")
+
+    text = capture.text()
+
+    assert text.startswith("x" * 10 + "\n... [output truncated: ")
+    assert text.endswith("Traceback: the last line")
+    assert capture.total == 10000 + len(b"\nTraceback: the last line")
+    assert len(capture.tail) == TAIL_CHARS
+
+
+def test_multibyte_characters_split_by_the_cap_do_not_raise():
+    capture = OutputCapture(max_chars=3)
+    capture.feed("héé".encode())
+    assert capture.text().startswith("h")
+
+
+def test_read_capped_file(tmp_path):
+    path = tmp_path / "out.txt"
+    assert read_capped_file(path) == ""
+    path.write_bytes(b"a" * 50 + b"b" * 5000 + b"END")
+
+    text = read_capped_file(path, max_chars=50)
+
+    assert text.startswith("a" * 50 + "\n... [output truncated: 3003 bytes omitted]")
+    assert text.endswith("END")
+
+
+@pytest.mark.parametrize("return_code, stderr, killed_by_us, expected", [
+    (1, "Traceback ...\nMemoryError", False, True),
+    (-signal.SIGKILL, "", False, True),
+    (-signal.SIGKILL, "", True, False),
+    (1, "ValueError: bad", False, False),
+    (0, "", False, False),
+])
+def test_looks_like_oom(return_code, stderr, killed_by_us, expected):
+    assert looks_like_oom(return_code, stderr, killed_by_us) is expected
+
+
+def test_snippet_env_caps_thread_pools_unless_set(monkeypatch):
+    monkeypatch.setattr(process_limits, "RUN_CODE_MAX_THREADS", 4)
+    env = snippet_env({"OMP_NUM_THREADS": "1", "PATH": "/bin"})
+
+    assert env["OMP_NUM_THREADS"] == "1"
+    assert all(env[name] == "4" for name in THREAD_VARIABLES if name != "OMP_NUM_THREADS")
+    assert env["PATH"] == "/bin"
+
+
+def test_snippet_env_leaves_threads_alone_when_disabled(monkeypatch):
+    monkeypatch.setattr(process_limits, "RUN_CODE_MAX_THREADS", 0)
+    assert snippet_env({}) == {}
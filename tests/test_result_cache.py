@@ -0,0 +1,92 @@
+import asyncio
+import time
+import pytest
+from tools.result_cache import ResultCache
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / "clip.mp3"
+    path.write_bytes(b"ID3 audio bytes")
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(path=tmp_path / "results.sqlite", ttl=3600, max_mb=1)
+
+
+def test_same_content_under_another_name_hits(cache, media, tmp_path):
+    calls = []
+    compute = lambda: calls.append(1) or "hello world"
+
+    copy = tmp_path / "renamed.mp3"
+    copy.write_bytes(media.read_bytes())
+
+    assert cache.cached("transcript", str(media), {"model": "m"}, compute) == "hello world"
+    assert cache.cached("transcript", str(copy), {"model": "m"}, compute) == "hello world"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_params_and_kind_are_part_of_the_key(cache, media):
+    cache.cached("transcript", str(media), {"language": "en"}, lambda: "english")
+
+    assert cache.cached("transcript", str(media), {"language": "fr"}, lambda: "french") == "french"
+    assert cache.cached("ocr", str(media), {"language": "en"}, lambda: "text") == "text"
+    assert cache.cached("transcript", str(media), {"language": "en"}, lambda: "again") == "english"
+
+
+def test_errors_are_not_stored(cache, media):
+    cache.cached("ocr", str(media), {}, lambda: "Error: tesseract missing")
+
+    assert cache.cached("ocr", str(media), {}, lambda: "recognised") == "recognised"
+    assert cache.stats()["entries"] == 1
+
+
+def test_use_cache_false_recomputes_and_refreshes(cache, media):
+    cache.cached("ocr", str(media), {}, lambda: "old")
+
+    assert cache.cached("ocr", str(media), {}, lambda: "new", use_cache=False) == "new"
+    assert cache.cached("ocr", str(media), {}, lambda: "unused") == "new"
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_expired_entries_are_dropped(cache, media, monkeypatch):
+    cache.cached("ocr", str(media), {}, lambda: "stale")
+    later = time.time() + 7200
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert cache.cached("ocr", str(media), {}, lambda: "fresh") == "fresh"
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    value = "x" * (400 * 1024)
+    cache.put("a", "ocr", value)
+    cache.put("b", "ocr", value)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", "ocr", value)
+
+    assert cache.get("a") == value
+    assert cache.get("b") is None
+    assert cache.get("c") == value
+
+
+def test_disabled_cache_always_computes(tmp_path, media):
+    cache = ResultCache(path=tmp_path / "results.sqlite", enabled=False)
+    calls = []
+
+    for _ in range(2):
+        cache.cached("ocr", str(media), {}, lambda: calls.append(1) or "text")
+
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_async_twin_shares_entries(cache, media):
+    async def compute():
+        return "async text"
+
+    assert asyncio.run(cache.acached("ocr", str(media), {}, compute)) == "async text"
+    assert cache.cached("ocr", str(media), {}, lambda: "unused") == "async text"
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from tool_executor import DEFAULT_TOOL_CONCURRENCY_LIMITS, ToolExecutor, _parse_limits
+
+active = {"now": 0, "peak": 0}
+lock = threading.Lock()
+
+
+def _enter():
+    with lock:
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+
+
+def _leave():
+    with lock:
+        active["now"] -= 1
+
+
+@tool
+def slow(value: str) -> str:
+    """Echo value after a short pause."""
+    _enter()
+    time.sleep(0.2)
+    _leave()
+    return value
+
+
+async def _aslow(value: str) -> str:
+    _enter()
+    await asyncio.sleep(0.2)
+    _leave()
+    return value
+
+
+slow.coroutine = _aslow
+
+
+@tool
+def broken() -> str:
+    """Always fail."""
+    raise RuntimeError("disk on fire")
+
+
+def state(*calls) -> dict:
+    tool_calls = [{"name": name, "args": args, "id": f"{name}{i}", "type": "tool_call"}
+                  for i, (name, args) in enumerate(calls)]
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def setup_function():
+    active.update(now=0, peak=0)
+
+
+def test_calls_run_concurrently_in_the_requested_order():
+    executor = ToolExecutor([slow], parallelism=4, limits={})
+    started = time.perf_counter()
+
+    result = executor.invoke(state(*[("slow", {"value": str(i)}) for i in range(4)]), {})
+
+    assert [m.content for m in result["messages"]] == ["0", "1", "2", "3"]
+    assert time.perf_counter() - started < 0.6
+    assert active["peak"] == 4
+
+
+def test_per_tool_limit_is_respected():
+    executor = ToolExecutor([slow], parallelism=4, limits={"slow": 2})
+    executor.invoke(state(*[("slow", {"value": str(i)}) for i in range(4)]), {})
+    assert active["peak"] == 2
+
+
+def test_async_calls_respect_turn_parallelism_and_order():
+    executor = ToolExecutor([slow], parallelism=2, limits={})
+
+    result = asyncio.run(executor.ainvoke(state(*[("slow", {"value": str(i)}) for i in range(4)]), {}))
+
+    assert [m.content for m in result["messages"]] == ["0", "1", "2", "3"]
+    assert active["peak"] == 2
+
+
+def test_failures_and_unknown_tools_become_error_messages():
+    result = ToolExecutor([slow, broken], limits={}).invoke(
+        state(("broken", {}), ("missing", {}), ("slow", {"value": "ok"})), {})
+
+    broken_result, missing, ok = result["messages"]
+    assert broken_result.status == "error" and "disk on fire" in broken_result.content
+    assert missing.status == "error" and "Unknown tool missing" in missing.content
+    assert ok.content == "ok"
+
+
+def test_parse_limits():
+    limits = _parse_limits("run_code=5, get_rendered_html = 1,bogus,analyze_image=x")
+    assert limits["run_code"] == 5
+    assert limits["get_rendered_html"] == 1
+    assert limits["analyze_image"] == DEFAULT_TOOL_CONCURRENCY_LIMITS["analyze_image"]
+    assert _parse_limits(None) == DEFAULT_TOOL_CONCURRENCY_LIMITS
@@ -0,0 +1,48 @@
+import pytest
+from tools.worker_pool import WorkerPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Nothing to preload: the tests only need a warm interpreter, not pandas
+    monkeypatch.setenv("RUN_CODE_PRELOAD", "")
+    pool = WorkerPool(size=1)
+    yield pool
+    pool.shutdown()
+
+
+def run(pool, tmp_path, code: str, timeout: float = 30) -> dict:
+    path = tmp_path / "snippet.py"
+    path.write_text(code)
+    return pool.run(path, timeout)
+
+
+def test_snippets_share_a_worker_but_not_a_namespace(pool, tmp_path):
+    first = run(pool, tmp_path, "import os\nsecret = 1\nprint(os.getpid())")
+    second = run(pool, tmp_path, "import os\nprint(os.getpid())\nprint(secret)")
+
+    assert first["return_code"] == 0
+    assert second["stdout"].splitlines()[0] == first["stdout"].strip()
+    assert second["return_code"] == 1
+    assert "NameError" in second["stderr"]
+
+
+def test_timeout_kills_the_worker_and_a_new_one_takes_over(pool, tmp_path):
+    result = run(pool, tmp_path, "while True:\n    pass", timeout=1)
+
+    assert result["timed_out"] and not result["oom_killed"]
+    assert "Timed out" in result["stderr"]
+    assert run(pool, tmp_path, "print('next')")["stdout"] == "next\n"
+
+
+def test_memory_cap_surfaces_as_oom(pool, tmp_path):
+    result = run(pool, tmp_path, "data = bytearray(4 * 1024 ** 3)")
+
+    assert result["oom_killed"]
+    assert "MemoryError" in result["stderr"]
+    assert run(pool, tmp_path, "print('still alive')")["stdout"] == "still alive\n"
+
+
+def test_blas_threads_are_capped_in_workers(pool, tmp_path):
+    result = run(pool, tmp_path, "import os\nprint(os.environ.get('OPENBLAS_NUM_THREADS'))")
+    assert result["stdout"].strip() not in ("", "None")
@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from logger_config import get_logger
+from context_window import compact_tool_message
+from deadlines import DEADLINE_PREEMPT_GRACE_SECONDS, remaining, tool_budget, tool_deadline
+from jobs import record_job_metric
+from metrics import observe_tool
+
+logger = get_logger("tool_executor")
+
+# Max tool calls from a single LLM turn that run at the same time
+TOOL_PARALLELISM = int(os.getenv("TOOL_PARALLELISM", "4"))
+
+# Process-wide caps per tool, shared by every running chain.
+# Override with e.g. TOOL_CONCURRENCY_LIMITS="get_rendered_html=2,run_code=3"
+DEFAULT_TOOL_CONCURRENCY_LIMITS = {
+    "get_rendered_html": 2,
+    "run_code": 2,
+    "add_dependencies": 1,
+    "transcribe_audio": 2,
+    "analyze_image": 2,
+}
+
+
+def _parse_limits(spec: Optional[str]) -> Dict[str, int]:
+    limits = dict(DEFAULT_TOOL_CONCURRENCY_LIMITS)
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid tool concurrency limit: {item!r}")
+    return limits
+
+
+TOOL_CONCURRENCY_LIMITS = _parse_limits(os.getenv("TOOL_CONCURRENCY_LIMITS"))
+
+
+class ToolExecutor:
+    """
+    Graph node that executes all tool calls of the last AIMessage concurrently.
+
+    Independent calls (e.g. several downloads plus an image analysis) run in
+    parallel up to TOOL_PARALLELISM, each tool additionally respecting its own
+    process-wide limit. Results are returned in the order the model requested
+    them, and the wall-clock time saved versus sequential execution is logged.
+
+    Every call gets the time left in the quiz task (minus the submission
+    reserve) as its deadline: tools read it through deadlines.cap_timeout,
+    and a call still running shortly after it is pre-empted and answered
+    with an error telling the model to submit with what it has.
+    """
+
+    def __init__(self, tools: List[Any], parallelism: int = TOOL_PARALLELISM,
+                 limits: Dict[str, int] = TOOL_CONCURRENCY_LIMITS):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.parallelism = max(1, parallelism)
+        self.limits = limits
+        self._thread_limits = {
+            name: threading.BoundedSemaphore(n) for name, n in limits.items() if n > 0
+        }
+        self._async_limits: Dict[str, asyncio.Semaphore] = {}
+
+    # -------------------------------------------------
+    # HELPERS
+    # -------------------------------------------------
+    @staticmethod
+    def _tool_calls(state) -> List[Dict[str, Any]]:
+        last = state["messages"][-1]
+        if isinstance(last, dict):
+            return last.get("tool_calls") or []
+        return getattr(last, "tool_calls", None) or []
+
+    def _error_message(self, call: Dict[str, Any], error: str) -> ToolMessage:
+        logger.error(f"Tool {call['name']} failed: {error}")
+        return ToolMessage(
+            content=f"Error: {error}",
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+
+    def _preempted_message(self, call: Dict[str, Any], seconds: float, state) -> ToolMessage:
+        left = remaining(state.get("task_started_at"))
+        logger.warning(f"Tool {call['name']} pre-empted after {seconds:.0f}s ({left:.0f}s left in the task)",
+                       extra={"event": "tool_preempted", "tool": call["name"]})
+        record_job_metric("tools_preempted", 1)
+        observe_tool(call["name"], seconds)
+        return ToolMessage(
+            content=(f"Error: {call['name']} was stopped after {seconds:.0f}s because only {max(left, 0):.0f}s "
+                     "are left for this task. Do not retry it; submit your best answer with what you have."),
+            name=call["name"],
+            tool_call_id=call["id"],
+            status="error",
+        )
+
+    def _async_limit(self, name: str) -> Optional[asyncio.Semaphore]:
+        limit = self.limits.get(name, 0)
+        if limit <= 0:
+            return None
+        if name not in self._async_limits:
+            self._async_limits[name] = asyncio.Semaphore(limit)
+        return self._async_limits[name]
+
+    def _log_timings(self, timings: List[float], wall: float) -> None:
+        if len(timings) < 2:
+            return
+        sequential = sum(timings)
+        logger.info(
+            f"Ran {len(timings)} tool calls in {wall:.2f}s "
+            f"(sequential {sequential:.2f}s, saved {sequential - wall:.2f}s)"
+        )
+
+    # -------------------------------------------------
+    # SYNC
+    # -------------------------------------------------
+    def _run_one(self, call: Dict[str, Any], config: RunnableConfig):
+        started = time.perf_counter()
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._error_message(call, f"Unknown tool {call['name']}"), 0.0
+
+        limit = self._thread_limits.get(call["name"])
+        try:
+            if limit:
+                with limit:
+                    message = tool.invoke({**call, "type": "tool_call"}, config)
+            else:
+                message = tool.invoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            message = self._error_message(call, str(e))
+        elapsed = time.perf_counter() - started
+        observe_tool(call["name"], elapsed)
+        return compact_tool_message(message), elapsed
+
+    def invoke(self, state, config: RunnableConfig):
+        calls = self._tool_calls(state)
+        started = time.perf_counter()
+        budget = tool_budget(state.get("task_started_at"))
+        if len(calls) == 1 and budget is None:
+            results = [self._run_one(calls[0], config)]
+        else:
+            token = tool_deadline.set(time.time() + budget if budget is not None else None)
+            pool = ThreadPoolExecutor(max_workers=min(self.parallelism, len(calls)))
+            try:
+                # Copy the caller's context so per-job context variables reach each thread
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_one, c, config)
+                    for c in calls
+                ]
+                wait(futures, timeout=budget + DEADLINE_PREEMPT_GRACE_SECONDS if budget is not None else None)
+                results = [
+                    f.result() if f.done() else (self._preempted_message(c, time.perf_counter() - started, state), 0.0)
+                    for c, f in zip(calls, futures)
+                ]
+            finally:
+                tool_deadline.reset(token)
+                # Pre-empted threads cannot be killed; they finish in the background
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._log_timings([t for _, t in results], time.perf_counter() - started)
+        return {"messages": [m for m, _ in results]}
+
+    # -------------------------------------------------
+    # ASYNC
+    # -------------------------------------------------
+    async def _arun_one(self, call: Dict[str, Any], config: RunnableConfig,
+                        turn_limit: asyncio.Semaphore):
+        started = time.perf_counter()
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return self._error_message(call, f"Unknown tool {call['name']}"), 0.0
+
+        limit = self._async_limit(call["name"])
+        try:
+            async with turn_limit:
+                if limit:
+                    async with limit:
+                        message = await tool.ainvoke({**call, "type": "tool_call"}, config)
+                else:
+                    message = await tool.ainvoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            message = self._error_message(call, str(e))
+        elapsed = time.perf_counter() - started
+        observe_tool(call["name"], elapsed)
+        return compact_tool_message(message), elapsed
+
+    async def _arun_within(self, call: Dict[str, Any], config: RunnableConfig, turn_limit: asyncio.Semaphore,
+                           budget: Optional[float], state):
+        if budget is None:
+            return await self._arun_one(call, config, turn_limit)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._arun_one(call, config, turn_limit),
+                                          timeout=budget + DEADLINE_PREEMPT_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            return self._preempted_message(call, time.perf_counter() - started, state), 0.0
+
+    async def ainvoke(self, state, config: RunnableConfig):
+        calls = self._tool_calls(state)
+        started = time.perf_counter()
+        turn_limit = asyncio.Semaphore(self.parallelism)
+        budget = tool_budget(state.get("task_started_at"))
+        # Set before gather so every call's task inherits it
+        token = tool_deadline.set(time.time() + budget if budget is not None else None)
+        try:
+            # gather preserves the order of the requested tool calls
+            results = await asyncio.gather(*(self._arun_within(c, config, turn_limit, budget, state) for c in calls))
+        finally:
+            tool_deadline.reset(token)
+        self._log_timings([t for _, t in results], time.perf_counter() - started)
+        return {"messages": [m for m, _ in results]}
@@ -5,3 +5,4 @@ from .download_file import download_file
 from .add_dependencies import add_dependencies
 from .audio_transcriber import transcribe_audio
 from .image_analyzer import analyze_image
+from .tool_output import read_tool_output
@@ -1,47 +1,66 @@
 from typing import List
 from langchain_core.tools import tool
-import subprocess
+import asyncio
 from logger_config import get_logger
+from .dependency_broker import dependency_broker
 
 logger = get_logger("add_dependencies")
 
+
+def _summary(dependencies: List[str]) -> str:
+    resolutions = dependency_broker.ensure(dependencies)
+    failed = [r for r in resolutions if r.status == "failed"]
+    lines = [r.describe() for r in resolutions]
+    if failed:
+        lines.insert(0, "Dependency installation failed for: " + ", ".join(r.requirement for r in failed))
+        logger.error("\n".join(lines))
+    else:
+        lines.insert(0, "Successfully installed dependencies: " + ", ".join(dependencies))
+        logger.info(lines[0])
+    return "\n".join(lines)
+
+
 @tool
 def add_dependencies(dependencies: List[str]) -> str:
     """
     Install the given Python packages into the environment.
 
+    Packages that are already installed return immediately. Missing ones are
+    installed into a shared overlay that run_code and the other tools can
+    import from right away; the project's own dependencies are never changed.
+
     Parameters:
         dependencies (List[str]):
             A list of Python package names to install. Each name must match the 
-            corresponding package name on PyPI.
+            corresponding package name on PyPI. Version specifiers such as
+            "pandas>=2" are allowed.
 
     Returns:
         str:
-            A message indicating success or failure.
+            A message indicating success or failure, with one line per package.
     """
     logger.info(f"Installing dependencies: {', '.join(dependencies)}")
     
     try:
-        subprocess.check_call(
-            ["uv", "add"] + dependencies,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        success_msg = "Successfully installed dependencies: " + ", ".join(dependencies)
-        logger.info(success_msg)
-        return success_msg
+        return _summary(dependencies)
     
-    except subprocess.CalledProcessError as e:
-        error_msg = (
-            "Dependency installation failed.\n"
-            f"Exit code: {e.returncode}\n"
-            f"Error: {e.stderr or 'No error output.'}"
-        )
+    except Exception as e:
+        error_msg = f"Unexpected error while installing dependencies: {e}"
         logger.error(error_msg)
         return error_msg
+
+
+async def aadd_dependencies(dependencies: List[str]) -> str:
+    """Async twin of add_dependencies; index lookups and installs run in a thread."""
+    logger.info(f"Installing dependencies: {', '.join(dependencies)}")
+    
+    try:
+        return await asyncio.to_thread(_summary, dependencies)
     
     except Exception as e:
         error_msg = f"Unexpected error while installing dependencies: {e}"
         logger.error(error_msg)
-        return error_msg 
+        return error_msg
+
+
+add_dependencies.coroutine = aadd_dependencies
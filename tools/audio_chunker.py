@@ -0,0 +1,139 @@
+import os
+import re
+import shutil
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+from logger_config import get_logger
+
+logger = get_logger("audio_chunker")
+
+# Audio longer than this is split into chunks of roughly this many seconds
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "120"))
+# Chunks transcribed at the same time (per transcribe_audio call)
+AUDIO_CHUNK_CONCURRENCY = int(os.getenv("AUDIO_CHUNK_CONCURRENCY", "3"))
+# Silence detection: level below which audio counts as silent, and minimum gap length
+AUDIO_SILENCE_DB = os.getenv("AUDIO_SILENCE_DB", "-35dB")
+AUDIO_SILENCE_MIN_SECONDS = float(os.getenv("AUDIO_SILENCE_MIN_SECONDS", "0.4"))
+
+SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+@dataclass
+class AudioChunk:
+    index: int
+    start: float
+    end: float
+    path: Path
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(path: str) -> Optional[float]:
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", path],
+            capture_output=True, text=True, timeout=60, check=True,
+        ).stdout.strip()
+        return float(out)
+    except (subprocess.SubprocessError, ValueError, OSError) as e:
+        logger.warning(f"Could not probe duration of {path}: {e}")
+        return None
+
+
+def detect_silences(path: str) -> List[Tuple[float, float]]:
+    """(start, end) of silent stretches, decoded by ffmpeg as a stream (nothing kept in RAM)."""
+    proc = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path,
+         "-af", f"silencedetect=noise={AUDIO_SILENCE_DB}:d={AUDIO_SILENCE_MIN_SECONDS}",
+         "-f", "null", "-"],
+        capture_output=True, text=True, timeout=600,
+    )
+    starts = [float(m) for m in SILENCE_START.findall(proc.stderr)]
+    ends = [float(m) for m in SILENCE_END.findall(proc.stderr)]
+    return list(zip(starts, ends))
+
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]],
+                target: float = AUDIO_CHUNK_SECONDS) -> List[Tuple[float, float]]:
+    """
+    Cut points near every `target` seconds, snapped to the middle of a silence.
+
+    A cut may move anywhere between half and one and a half chunk lengths
+    from the previous one; with no silence in that window it falls at target.
+    """
+    midpoints = [(s + e) / 2 for s, e in silences]
+    bounds, start = [], 0.0
+    while duration - start > target * 1.5:
+        ideal = start + target
+        window = [m for m in midpoints if start + target * 0.5 <= m <= start + target * 1.5]
+        cut = min(window, key=lambda m: abs(m - ideal)) if window else ideal
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, duration))
+    return bounds
+
+
+def export_chunks(path: str, bounds: List[Tuple[float, float]], out_dir: Path) -> List[AudioChunk]:
+    """Write each chunk to disk as 16 kHz mono FLAC, the format Whisper resamples to anyway."""
+    chunks = []
+    for index, (start, end) in enumerate(bounds):
+        chunk_path = out_dir / f"chunk_{index:03d}.flac"
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path,
+             "-ac", "1", "-ar", "16000", "-c:a", "flac", str(chunk_path)],
+            check=True, capture_output=True, timeout=600,
+        )
+        chunks.append(AudioChunk(index, start, end, chunk_path))
+    return chunks
+
+
+def split_audio(path: str, out_dir: Path, target: float = AUDIO_CHUNK_SECONDS) -> Optional[List[AudioChunk]]:
+    """
+    Split long audio on silence into chunk files under out_dir.
+
+    Returns None when the file is short enough for a single request or
+    ffmpeg is not installed, so the caller sends the original file.
+    """
+    if not ffmpeg_available():
+        logger.warning("ffmpeg not found; transcribing the file in a single request")
+        return None
+    duration = probe_duration(path)
+    if duration is None or duration <= target * 1.5:
+        return None
+    bounds = plan_chunks(duration, detect_silences(path), target)
+    chunks = export_chunks(path, bounds, out_dir)
+    logger.info(f"Split {duration:.0f}s of audio into {len(chunks)} chunks: "
+                + ", ".join(f"{c.start:.0f}-{c.end:.0f}s" for c in chunks))
+    return chunks
+
+
+def _field(item, name: str):
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def stitch(chunks: List[AudioChunk], transcriptions: list, timestamps: bool = False) -> str:
+    """
+    Join per-chunk verbose_json results in time order.
+
+    Segment timestamps are shifted by the chunk offset; with timestamps=True
+    each segment is prefixed with its [mm:ss] position in the original file.
+    """
+    segments = []
+    for chunk, transcription in zip(chunks, transcriptions):
+        chunk_segments = _field(transcription, "segments") or []
+        if not chunk_segments:
+            segments.append((chunk.start, (_field(transcription, "text") or "").strip()))
+        for segment in chunk_segments:
+            segments.append((chunk.start + float(_field(segment, "start") or 0),
+                             (_field(segment, "text") or "").strip()))
+    segments.sort(key=lambda s: s[0])
+    if timestamps:
+        return "\n".join(f"[{int(t // 60):02d}:{int(t % 60):02d}] {text}" for t, text in segments if text)
+    return " ".join(text for _, text in segments if text)
@@ -1,18 +1,118 @@
 from langchain_core.tools import tool
+import asyncio
 import os
-import requests
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 from logger_config import get_logger, AUDIO_DIR
+from .audio_chunker import AUDIO_CHUNK_CONCURRENCY, AudioChunk, split_audio, stitch
+from .download_cache import download_cache
+from .groq_client import get_async_groq_client, get_groq_client
+from .result_cache import result_cache
 
 logger = get_logger("audio_transcriber")
 
+AUDIO_EXTENSIONS = ['.mp3', '.mp4', '.mpeg', '.mpga', '.m4a', '.wav', '.webm']
+TRANSCRIPTION_MODEL = "whisper-large-v3-turbo"
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def _local_audio_path(url: str):
+    # Extract filename from URL or use default
+    filename = url.split("/")[-1].split("?")[0]
+    if not any(filename.endswith(ext) for ext in AUDIO_EXTENSIONS):
+        filename = "audio.m4a"
+    return AUDIO_DIR / filename
+
+
+def _transcription_params(language: Optional[str]) -> dict:
+    transcription_params = {
+        "model": TRANSCRIPTION_MODEL,
+        "temperature": 0,
+        "response_format": "verbose_json",
+    }
+    
+    if language:
+        transcription_params["language"] = language
+    return transcription_params
+
+
+def _cache_params(language: Optional[str], timestamps: bool) -> dict:
+    return {"model": TRANSCRIPTION_MODEL, "language": language, "timestamps": timestamps}
+
+
+def _transcribe_file(client, path: str, language: Optional[str]):
+    # The open file is streamed into the multipart upload rather than read into memory
+    logger.info(f"Starting transcription: {os.path.basename(path)} (model {TRANSCRIPTION_MODEL})")
+    with open(path, "rb") as file:
+        return client.audio.transcriptions.create(
+            file=(os.path.basename(path), file), **_transcription_params(language)
+        )
+
+
+async def _atranscribe_file(client, path: str, language: Optional[str]):
+    logger.info(f"Starting transcription: {os.path.basename(path)} (model {TRANSCRIPTION_MODEL})")
+    with open(path, "rb") as file:
+        return await client.audio.transcriptions.create(
+            file=(os.path.basename(path), file), **_transcription_params(language)
+        )
+
+
+def _transcribe(client, audio_source: str, language: Optional[str], timestamps: bool) -> str:
+    """Transcribe short audio in one request, long audio as concurrent silence-split chunks."""
+    with tempfile.TemporaryDirectory(dir=AUDIO_DIR) as tmp:
+        chunks = split_audio(audio_source, Path(tmp))
+        if chunks is None:
+            chunks = [AudioChunk(0, 0.0, 0.0, Path(audio_source))]
+            results = [_transcribe_file(client, audio_source, language)]
+        else:
+            with ThreadPoolExecutor(max_workers=AUDIO_CHUNK_CONCURRENCY) as pool:
+                results = list(pool.map(lambda c: _transcribe_file(client, str(c.path), language), chunks))
+        if len(chunks) == 1 and not timestamps:
+            return results[0].text
+        return stitch(chunks, results, timestamps)
+
+
+async def _atranscribe(client, audio_source: str, language: Optional[str], timestamps: bool) -> str:
+    with tempfile.TemporaryDirectory(dir=AUDIO_DIR) as tmp:
+        chunks = await asyncio.to_thread(split_audio, audio_source, Path(tmp))
+        if chunks is None:
+            chunks = [AudioChunk(0, 0.0, 0.0, Path(audio_source))]
+            results = [await _atranscribe_file(client, audio_source, language)]
+        else:
+            limit = asyncio.Semaphore(AUDIO_CHUNK_CONCURRENCY)
+
+            async def _one(chunk: AudioChunk):
+                async with limit:
+                    return await _atranscribe_file(client, str(chunk.path), language)
+
+            results = await asyncio.gather(*(_one(c) for c in chunks))
+        if len(chunks) == 1 and not timestamps:
+            return results[0].text
+        return stitch(chunks, results, timestamps)
+
+
+def _log_result(result: str) -> str:
+    logger.info(f"Transcription complete: {len(result)} characters")
+    logger.info(f"Preview: {result[:100]}..." if len(result) > 100 else f"Full text: {result}")
+    return result
+
+
 @tool
-def transcribe_audio(audio_source: str, language: Optional[str] = None) -> str:
+def transcribe_audio(audio_source: str, language: Optional[str] = None, timestamps: bool = False,
+                     use_cache: bool = True) -> str:
     """
     Transcribe audio from a file path or URL using Groq's Whisper API.
     
     This tool handles audio transcription for quiz instructions or other audio content.
-    It supports both local files and remote URLs.
+    It supports both local files and remote URLs. Long recordings are split on
+    silence and the chunks are transcribed concurrently, then stitched back in
+    order. Transcripts are cached by audio content, so repeating a call on the
+    same file returns instantly.
     
     Parameters
     ----------
@@ -22,6 +122,10 @@ def transcribe_audio(audio_source: str, language: Optional[str] = None) -> str:
     language : Optional[str]
         ISO-639-1 language code (e.g., "en" for English, "es" for Spanish).
         If None, the model will auto-detect the language.
+    timestamps : bool
+        If True, return one line per segment prefixed with its [mm:ss] position.
+    use_cache : bool
+        Set to False to force a fresh transcription instead of the cached one.
     
     Returns
     -------
@@ -34,37 +138,19 @@ def transcribe_audio(audio_source: str, language: Optional[str] = None) -> str:
     >>> transcribe_audio("data/audio/quiz_audio.wav", language="en")
     """
     try:
-        from groq import Groq
-        from dotenv import load_dotenv
-        load_dotenv()
-        
         logger.info(f"Transcription requested for: {audio_source}")
         if language:
             logger.info(f"Language specified: {language}")
         
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        client = get_groq_client()
         
         # Handle URL downloads
-        if audio_source.startswith("http://") or audio_source.startswith("https://"):
+        if _is_url(audio_source):
             logger.info(f"Downloading audio from URL: {audio_source}")
-            response = requests.get(audio_source, stream=True)
-            response.raise_for_status()
-            
-            # Extract filename from URL or use default
-            filename = audio_source.split("/")[-1].split("?")[0]
-            if not any(filename.endswith(ext) for ext in ['.mp3', '.mp4', '.mpeg', '.mpga', '.m4a', '.wav', '.webm']):
-                filename = "audio.m4a"
-            
-            local_path = AUDIO_DIR / filename
-            
-            total_size = 0
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
+            local_path = _local_audio_path(audio_source)
+            cached = download_cache.download_to(audio_source, local_path)
             
-            logger.info(f"Audio downloaded: {filename} ({total_size} bytes)")
+            logger.info(f"Audio downloaded: {local_path.name} ({cached.size} bytes, cache {cached.status})")
             logger.info(f"Saved to: {local_path}")
             audio_source = str(local_path)
         
@@ -74,31 +160,53 @@ def transcribe_audio(audio_source: str, language: Optional[str] = None) -> str:
             logger.error(error_msg)
             return f"Error: {error_msg}"
         
-        # Get filename for Groq API
-        filename = os.path.basename(audio_source)
+        # Transcribe using Groq's Whisper API (or reuse the cached transcript)
+        return _log_result(result_cache.cached(
+            "transcript", audio_source, _cache_params(language, timestamps),
+            lambda: _transcribe(client, audio_source, language, timestamps), use_cache,
+        ))
         
-        # Transcribe using Groq's Whisper API
-        logger.info(f"Starting transcription: {filename}")
-        logger.info(f"Model: whisper-large-v3-turbo")
+    except ImportError:
+        error_msg = "Groq library not installed. Use 'add_dependencies' tool to install 'groq' package first."
+        logger.error(error_msg)
+        return f"Error: {error_msg}"
+    except Exception as e:
+        error_msg = f"Error transcribing audio: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+async def atranscribe_audio(audio_source: str, language: Optional[str] = None, timestamps: bool = False,
+                            use_cache: bool = True) -> str:
+    """Async twin of transcribe_audio using the AsyncGroq client."""
+    try:
+        logger.info(f"Transcription requested for: {audio_source}")
+        if language:
+            logger.info(f"Language specified: {language}")
         
-        with open(audio_source, "rb") as file:
-            transcription_params = {
-                "file": (filename, file.read()),
-                "model": "whisper-large-v3-turbo",
-                "temperature": 0,
-                "response_format": "verbose_json",
-            }
-            
-            if language:
-                transcription_params["language"] = language
+        client = get_async_groq_client()
+        
+        # Handle URL downloads
+        if _is_url(audio_source):
+            logger.info(f"Downloading audio from URL: {audio_source}")
+            local_path = _local_audio_path(audio_source)
+            cached = await download_cache.adownload_to(audio_source, local_path)
             
-            transcription = client.audio.transcriptions.create(**transcription_params)
+            logger.info(f"Audio downloaded: {local_path.name} ({cached.size} bytes, cache {cached.status})")
+            logger.info(f"Saved to: {local_path}")
+            audio_source = str(local_path)
         
-        result = transcription.text
-        logger.info(f"Transcription complete: {len(result)} characters")
-        logger.info(f"Preview: {result[:100]}..." if len(result) > 100 else f"Full text: {result}")
+        # Verify file exists
+        if not os.path.exists(audio_source):
+            error_msg = f"Audio file not found at {audio_source}"
+            logger.error(error_msg)
+            return f"Error: {error_msg}"
         
-        return result
+        # Transcribe using Groq's Whisper API (or reuse the cached transcript)
+        return _log_result(await result_cache.acached(
+            "transcript", audio_source, _cache_params(language, timestamps),
+            lambda: _atranscribe(client, audio_source, language, timestamps), use_cache,
+        ))
         
     except ImportError:
         error_msg = "Groq library not installed. Use 'add_dependencies' tool to install 'groq' package first."
@@ -108,3 +216,6 @@ def transcribe_audio(audio_source: str, language: Optional[str] = None) -> str:
         error_msg = f"Error transcribing audio: {str(e)}"
         logger.error(error_msg)
         return error_msg
+
+
+transcribe_audio.coroutine = atranscribe_audio
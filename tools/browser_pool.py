@@ -0,0 +1,299 @@
+import asyncio
+import os
+import threading
+import time
+from typing import List, Optional
+from logger_config import get_logger
+
+logger = get_logger("browser_pool")
+
+# Pool configuration (overridable through the environment)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))
+BROWSER_RECYCLE_AFTER_PAGES = int(os.getenv("BROWSER_RECYCLE_AFTER_PAGES", "50"))
+BROWSER_MEMORY_CEILING_MB = int(os.getenv("BROWSER_MEMORY_CEILING_MB", "1024"))
+# Chromium RSS is sampled (a walk of /proc) at most this often
+BROWSER_MEMORY_CHECK_SECONDS = float(os.getenv("BROWSER_MEMORY_CHECK_SECONDS", "15"))
+# No memory-triggered recycle for this long after the last one
+BROWSER_MEMORY_RECYCLE_COOLDOWN_SECONDS = float(os.getenv("BROWSER_MEMORY_RECYCLE_COOLDOWN_SECONDS", "60"))
+BROWSER_PAGE_TIMEOUT_MS = int(os.getenv("BROWSER_PAGE_TIMEOUT_MS", "60000"))
+
+
+def _chromium_rss_mb() -> float:
+    """
+    Sum the resident memory of all Chromium processes spawned by this process.
+
+    Playwright does not expose the browser PID, so we walk /proc for descendants
+    of the current process. Returns 0.0 on platforms without /proc.
+    """
+    if not os.path.isdir("/proc"):
+        return 0.0
+
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # comm is wrapped in parentheses and may contain spaces
+            comm = stat[stat.index("(") + 1:stat.rindex(")")]
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append((int(entry), comm))
+
+    total_kb = 0
+    stack = [os.getpid()]
+    while stack:
+        for pid, comm in children.get(stack.pop(), []):
+            stack.append(pid)
+            if "chrom" not in comm and "headless" not in comm:
+                continue
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                continue
+    return total_kb / 1024
+
+
+class _BrowserSlot:
+    """A launched browser plus the bookkeeping needed to decide when to recycle it."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.launched_at = time.time()
+        self.pages_served = 0
+        self.active_pages = 0
+        self.retiring = False
+
+    def healthy(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Process-wide pool of long-lived headless Chromium browsers.
+
+    Browsers are launched once and reused; every render gets a fresh, isolated
+    browser context that is closed afterwards. Playwright objects are bound to
+    the event loop that created them, so the pool owns a dedicated loop running
+    in a daemon thread and callers submit work to it.
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_pages: int = BROWSER_MAX_PAGES,
+        recycle_after_pages: int = BROWSER_RECYCLE_AFTER_PAGES,
+        memory_ceiling_mb: int = BROWSER_MEMORY_CEILING_MB,
+        memory_check_seconds: float = BROWSER_MEMORY_CHECK_SECONDS,
+        memory_cooldown_seconds: float = BROWSER_MEMORY_RECYCLE_COOLDOWN_SECONDS,
+    ):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.recycle_after_pages = recycle_after_pages
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.memory_check_seconds = memory_check_seconds
+        self.memory_cooldown_seconds = memory_cooldown_seconds
+        self._memory_checked_at = float("-inf")
+        self._memory_recycled_at = float("-inf")
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        self._draining: List[_BrowserSlot] = []
+        self._page_semaphore: Optional[asyncio.Semaphore] = None
+        self._slot_lock: Optional[asyncio.Lock] = None
+        self._launches = 0
+        self._recycles = 0
+        self._memory_recycles = 0
+        self._renders = 0
+
+    # -------------------------------------------------
+    # LIFECYCLE
+    # -------------------------------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="browser-pool",
+                    daemon=True,
+                )
+                self._thread.start()
+            return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def start(self) -> None:
+        """Launch the browsers eagerly (e.g. at application startup)."""
+        self._submit(self._start()).result()
+
+    def shutdown(self) -> None:
+        """Close every browser and stop the Playwright driver and loop thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"Browser pool shutdown did not complete cleanly: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        with self._lock:
+            self._loop = None
+            self._thread = None
+
+    async def _start(self) -> None:
+        if self._slot_lock is None:
+            self._slot_lock = asyncio.Lock()
+            self._page_semaphore = asyncio.Semaphore(self.max_pages)
+        async with self._slot_lock:
+            if self._playwright is None:
+                from playwright.async_api import async_playwright
+                logger.info("Starting Playwright driver")
+                self._playwright = await async_playwright().start()
+            while len(self._slots) < self.size:
+                self._slots.append(await self._launch())
+
+    async def _launch(self) -> _BrowserSlot:
+        started = time.perf_counter()
+        browser = await self._playwright.chromium.launch(headless=True)
+        self._launches += 1
+        logger.info(f"Launched headless Chromium in {time.perf_counter() - started:.2f}s "
+                    f"(launch #{self._launches})")
+        return _BrowserSlot(browser)
+
+    async def _close_slot(self, slot: _BrowserSlot) -> None:
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+
+    async def _shutdown(self) -> None:
+        for slot in self._slots + self._draining:
+            await self._close_slot(slot)
+        self._slots.clear()
+        self._draining.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        # asyncio primitives are bound to this loop; recreate them on restart
+        self._slot_lock = None
+        self._page_semaphore = None
+        logger.info("Browser pool shut down")
+
+    # -------------------------------------------------
+    # HEALTH & RECYCLING
+    # -------------------------------------------------
+    async def _acquire_slot(self) -> _BrowserSlot:
+        async with self._slot_lock:
+            for i, slot in enumerate(self._slots):
+                if not slot.healthy():
+                    logger.warning("Replacing unhealthy browser in pool")
+                    self._retire(slot)
+                    self._slots[i] = await self._launch()
+            return min(self._slots, key=lambda s: s.active_pages)
+
+    def _retire(self, slot: _BrowserSlot) -> None:
+        slot.retiring = True
+        self._recycles += 1
+        self._draining.append(slot)
+
+    async def _release_slot(self, slot: _BrowserSlot) -> None:
+        slot.active_pages -= 1
+        slot.pages_served += 1
+
+        async with self._slot_lock:
+            if slot in self._slots and self.recycle_after_pages and \
+                    slot.pages_served >= self.recycle_after_pages:
+                logger.info(f"Recycling browser after {slot.pages_served} pages")
+                self._retire(slot)
+                self._slots[self._slots.index(slot)] = await self._launch()
+
+            if slot in self._slots and await self._over_memory_ceiling():
+                # Only the browser that just finished a page is replaced; it is closed once its
+                # other pages are done, and the cooldown lets the new RSS settle before the next check
+                logger.info(f"Recycling browser after {slot.pages_served} pages: Chromium RSS exceeds "
+                            f"ceiling {self.memory_ceiling_mb} MB")
+                self._retire(slot)
+                self._slots[self._slots.index(slot)] = await self._launch()
+                self._memory_recycled_at = time.monotonic()
+                self._memory_recycles += 1
+
+            # Close retired browsers once their last page is done
+            for old in [s for s in self._draining if s.active_pages == 0]:
+                self._draining.remove(old)
+                await self._close_slot(old)
+
+    async def _over_memory_ceiling(self) -> bool:
+        """Sampled check of total Chromium RSS, rate-limited and paused after a recycle."""
+        if not self.memory_ceiling_mb:
+            return False
+        now = time.monotonic()
+        if now - self._memory_checked_at < self.memory_check_seconds or \
+                now - self._memory_recycled_at < self.memory_cooldown_seconds:
+            return False
+        self._memory_checked_at = now
+        # The /proc walk is blocking; keep it off the pool's loop so other renders continue
+        return await asyncio.to_thread(_chromium_rss_mb) > self.memory_ceiling_mb
+
+    # -------------------------------------------------
+    # RENDERING
+    # -------------------------------------------------
+    async def _render(self, url: str, wait_until: str) -> str:
+        await self._start()
+        async with self._page_semaphore:
+            slot = await self._acquire_slot()
+            slot.active_pages += 1
+            context = None
+            try:
+                context = await slot.browser.new_context()
+                page = await context.new_page()
+                await page.goto(url, wait_until=wait_until, timeout=BROWSER_PAGE_TIMEOUT_MS)
+                content = await page.content()
+                self._renders += 1
+                return content
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.warning(f"Error closing browser context: {e}")
+                await self._release_slot(slot)
+
+    def render(self, url: str, wait_until: str = "networkidle") -> str:
+        """Render a page in a fresh context and return its HTML (blocking)."""
+        return self._submit(self._render(url, wait_until)).result()
+
+    async def arender(self, url: str, wait_until: str = "networkidle") -> str:
+        """Render a page without blocking the caller's event loop."""
+        return await asyncio.wrap_future(self._submit(self._render(url, wait_until)))
+
+    def stats(self) -> dict:
+        """Snapshot of pool state for health checks and monitoring."""
+        return {
+            "browsers": len(self._slots),
+            "healthy": sum(1 for s in self._slots if s.healthy()),
+            "draining": len(self._draining),
+            "active_pages": sum(s.active_pages for s in self._slots + self._draining),
+            "max_pages": self.max_pages,
+            "launches": self._launches,
+            "recycles": self._recycles,
+            "memory_recycles": self._memory_recycles,
+            "renders": self._renders,
+            "chromium_rss_mb": round(_chromium_rss_mb(), 1),
+        }
+
+
+browser_pool = BrowserPool()
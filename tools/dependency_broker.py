@@ -0,0 +1,290 @@
+import importlib
+import importlib.metadata
+import os
+import re
+import shutil
+import site
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from logger_config import get_logger, DATA_DIR
+from jobs import record_job_metric
+from metrics import Histogram, LATENCY_BUCKETS
+
+logger = get_logger("dependency_broker")
+
+# Packages installed at runtime go here, never into the project environment or uv.lock
+DEPS_OVERLAY_DIR = Path(os.getenv("DEPS_OVERLAY_DIR", str(DATA_DIR / "overlay")))
+# Directory of prebuilt wheels (baked into the Docker image) searched before the package index
+DEPS_WHEELHOUSE = os.getenv("DEPS_WHEELHOUSE", "/opt/wheelhouse")
+# 1 = never contact the package index, install only from the wheelhouse
+DEPS_OFFLINE = os.getenv("DEPS_OFFLINE", "0") == "1"
+DEPS_INSTALL_TIMEOUT_SECONDS = float(os.getenv("DEPS_INSTALL_TIMEOUT_SECONDS", "300"))
+
+INSTALL_SECONDS = Histogram("agent_dependency_install_seconds",
+                            "Time to satisfy one requested package by source", LATENCY_BUCKETS)
+
+REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def canonical_name(name: str) -> str:
+    """PEP 503 normalisation, so Scikit_Learn and scikit-learn are the same package."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def overlay_env(env: Optional[dict] = None) -> dict:
+    """
+    Environment for run_code interpreters: names the overlay in DEPS_OVERLAY_DIR.
+
+    python_worker.py adds it with site.addsitedir, i.e. after site-packages.
+    It is kept off PYTHONPATH, whose entries come before site-packages and
+    would let overlay packages shadow the project's pinned versions.
+    """
+    env = dict(os.environ if env is None else env)
+    paths = [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p and p != str(DEPS_OVERLAY_DIR)]
+    if paths:
+        env["PYTHONPATH"] = os.pathsep.join(paths)
+    else:
+        env.pop("PYTHONPATH", None)
+    env["DEPS_OVERLAY_DIR"] = str(DEPS_OVERLAY_DIR)
+    return env
+
+
+@dataclass
+class Resolution:
+    requirement: str
+    status: str               # "installed", "wheelhouse", "index" or "failed"
+    version: Optional[str]
+    seconds: float
+    error: str = ""
+
+    def describe(self) -> str:
+        if self.status == "failed":
+            return f"{self.requirement}: FAILED ({self.error})"
+        where = "already installed" if self.status == "installed" else f"installed from {self.status}"
+        note = f"; warning: {self.error}" if self.error else ""
+        return f"{self.requirement}: {where}, version {self.version} ({self.seconds:.2f}s){note}"
+
+
+class DependencyBroker:
+    """
+    Satisfies add_dependencies requests without touching the project.
+
+    An index of every installed distribution (project environment plus
+    overlay) answers most requests instantly. Missing packages are installed
+    one by one into an overlay directory that is on the path of the agent and
+    of every run_code interpreter, first from the local wheelhouse and then,
+    unless offline, from the package index. pyproject.toml and uv.lock are
+    never modified.
+
+    Installs use --no-deps: the broker walks each new package's requirements
+    itself and installs only those the project environment and overlay do
+    not already satisfy, so numpy, pandas and the like are never copied into
+    the overlay (where the project's versions would shadow them anyway).
+    Requirements that cannot be installed, or that conflict with a project
+    package, are reported by name.
+    """
+
+    def __init__(self, overlay: Path = DEPS_OVERLAY_DIR, wheelhouse: str = DEPS_WHEELHOUSE,
+                 offline: bool = DEPS_OFFLINE):
+        self.overlay = overlay
+        self.wheelhouse = wheelhouse if wheelhouse and os.path.isdir(wheelhouse) else None
+        self.offline = offline
+        self.overlay.mkdir(parents=True, exist_ok=True)
+        # Appended (with its .pth files), so the overlay can add packages but never shadow the locked ones
+        if str(self.overlay) not in sys.path:
+            site.addsitedir(str(self.overlay))
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, str]] = None
+        self._latency: Dict[str, dict] = {}
+        self._counts = {"installed": 0, "wheelhouse": 0, "index": 0, "failed": 0}
+
+    # -------------------------------------------------
+    # INDEX
+    # -------------------------------------------------
+    def _build_index(self) -> Dict[str, str]:
+        index = {}
+        for dist in importlib.metadata.distributions(path=[*sys.path]):
+            name = dist.metadata["Name"]
+            if name:
+                index.setdefault(canonical_name(name), dist.version)
+        return index
+
+    def installed_version(self, name: str) -> Optional[str]:
+        if self._index is None:
+            started = time.perf_counter()
+            self._index = self._build_index()
+            logger.info(f"Indexed {len(self._index)} installed distributions in "
+                        f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        return self._index.get(canonical_name(name))
+
+    def _in_overlay(self, name: str) -> bool:
+        return any(canonical_name(dist.metadata["Name"] or "") == canonical_name(name)
+                   for dist in importlib.metadata.distributions(path=[str(self.overlay)]))
+
+    @staticmethod
+    def _satisfied(requirement: str, version: Optional[str]) -> bool:
+        if version is None:
+            return False
+        try:
+            from packaging.requirements import Requirement
+            return Requirement(requirement).specifier.contains(version, prereleases=True)
+        except Exception:
+            # Unparseable specifier: trust the name match
+            return True
+
+    # -------------------------------------------------
+    # INSTALLATION
+    # -------------------------------------------------
+    def _installer(self) -> List[str]:
+        if shutil.which("uv"):
+            return ["uv", "pip", "install", "--python", sys.executable, "--no-deps", "--target", str(self.overlay)]
+        return [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--quiet", "--upgrade",
+                "--no-deps", "--target", str(self.overlay)]
+
+    def _attempts(self) -> List[tuple]:
+        """(source, extra installer args) in the order they are tried."""
+        attempts = []
+        if self.wheelhouse:
+            attempts.append(("wheelhouse", ["--no-index", "--find-links", self.wheelhouse]))
+        if not self.offline:
+            attempts.append(("index", ["--find-links", self.wheelhouse] if self.wheelhouse else []))
+        return attempts
+
+    def _install_one(self, requirement: str) -> tuple:
+        """Install one distribution without its dependencies: (source, None) or (None, error)."""
+        errors = []
+        for source, extra in self._attempts():
+            try:
+                subprocess.run(self._installer() + extra + [requirement], check=True, capture_output=True,
+                               text=True, timeout=DEPS_INSTALL_TIMEOUT_SECONDS)
+            except subprocess.CalledProcessError as e:
+                output = (e.stderr or e.stdout or "").strip().splitlines()
+                errors.append(f"{source}: {output[-1] if output else f'exit code {e.returncode}'}")
+                continue
+            except (subprocess.TimeoutExpired, OSError) as e:
+                errors.append(f"{source}: {e}")
+                continue
+            # New files in the overlay must become importable in this process too
+            importlib.invalidate_caches()
+            self._index = None
+            return source, None
+        if not errors:
+            errors.append("offline and no wheelhouse configured")
+        return None, "; ".join(errors)
+
+    @staticmethod
+    def _dependencies(name: str, extras) -> list:
+        """Requirements of the installed distribution `name` that apply here, with the given extras."""
+        from packaging.requirements import Requirement
+        for dist in importlib.metadata.distributions(path=[*sys.path]):
+            if canonical_name(dist.metadata["Name"] or "") == canonical_name(name):
+                break
+        else:
+            return []
+        deps = []
+        for line in dist.requires or []:
+            dep = Requirement(line)
+            if dep.marker is None or any(dep.marker.evaluate({"extra": extra}) for extra in ["", *extras]):
+                dep.marker = None
+                deps.append(dep)
+        return deps
+
+    def _install(self, requirement: str) -> Resolution:
+        """Install requirement and whichever of its (transitive) dependencies are missing."""
+        from packaging.requirements import Requirement
+        started = time.perf_counter()
+        root = Requirement(requirement)
+        source, error = self._install_one(requirement)
+        if source is None:
+            return Resolution(requirement, "failed", None, time.perf_counter() - started, error)
+        missing, conflicts = [], []
+        pending = [(root.name, root.extras)]
+        seen = {(canonical_name(root.name), frozenset(root.extras))}
+        while pending:
+            name, extras = pending.pop(0)
+            for dep in self._dependencies(name, extras):
+                key = (canonical_name(dep.name), frozenset(dep.extras))
+                if key in seen:
+                    continue
+                seen.add(key)
+                version = self.installed_version(dep.name)
+                if self._satisfied(str(dep), version):
+                    # Already-present packages are consistent with their own dependencies;
+                    # only the extras asked for here can add new ones
+                    if dep.extras:
+                        pending.append((dep.name, dep.extras))
+                    continue
+                if version is not None and not self._in_overlay(dep.name):
+                    conflicts.append(f"{dep} (project has {version})")
+                    continue
+                logger.info(f"Installing {dep}, required by {name} (present: {version or 'no'})")
+                _, dep_error = self._install_one(str(dep))
+                if dep_error:
+                    missing.append(f"{dep} ({dep_error})")
+                    continue
+                pending.append((dep.name, dep.extras))
+        version = self.installed_version(root.name)
+        seconds = time.perf_counter() - started
+        if missing:
+            return Resolution(requirement, "failed", version, seconds,
+                              f"installed {root.name} {version}, but these dependencies could not be installed: "
+                              + ", ".join(missing))
+        warning = ("needs versions the project environment does not have, so it may not work: "
+                   + ", ".join(conflicts)) if conflicts else ""
+        return Resolution(requirement, source, version, seconds, warning)
+
+    def _record(self, resolution: Resolution) -> None:
+        INSTALL_SECONDS.observe(resolution.seconds, source=resolution.status)
+        record_job_metric("dependency_seconds", resolution.seconds)
+        self._counts[resolution.status] += 1
+        self._latency[resolution.requirement] = {"status": resolution.status,
+                                                 "seconds": round(resolution.seconds, 3)}
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    def ensure(self, requirements: List[str]) -> List[Resolution]:
+        """Resolve each requirement, installing only what is missing."""
+        results = []
+        with self._lock:
+            for requirement in requirements:
+                match = REQUIREMENT_NAME.match(requirement)
+                if not match:
+                    resolution = Resolution(requirement, "failed", None, 0.0, "not a package name")
+                else:
+                    started = time.perf_counter()
+                    version = self.installed_version(match.group(1))
+                    if self._satisfied(requirement, version):
+                        resolution = Resolution(requirement, "installed", version, time.perf_counter() - started)
+                    elif version is not None and not self._in_overlay(match.group(1)):
+                        # The overlay comes last on the path, so it could never shadow a project package
+                        resolution = Resolution(requirement, "failed", version, time.perf_counter() - started,
+                                                f"version {version} is part of the project environment "
+                                                "and cannot be replaced; adapt the code to it")
+                    else:
+                        logger.info(f"Installing {requirement} into {self.overlay} "
+                                    f"(present: {version or 'no'})")
+                        resolution = self._install(requirement)
+                self._record(resolution)
+                logger.info(resolution.describe())
+                results.append(resolution)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "overlay": str(self.overlay),
+                "wheelhouse": self.wheelhouse,
+                "offline": self.offline,
+                "indexed_distributions": len(self._index) if self._index is not None else None,
+                "resolutions": dict(self._counts),
+                "packages": dict(self._latency),
+            }
+
+
+dependency_broker = DependencyBroker()
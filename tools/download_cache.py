@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from logger_config import get_logger, CACHE_DIR
+from metrics import observe_download
+from .http_client import get_async_client, get_client
+
+logger = get_logger("download_cache")
+
+# Cache configuration (overridable through the environment)
+DOWNLOAD_CACHE_MAX_MB = int(os.getenv("DOWNLOAD_CACHE_MAX_MB", "1024"))
+# How long a response without Cache-Control max-age is served without revalidating (0 = always revalidate)
+DOWNLOAD_CACHE_FRESH_SECONDS = float(os.getenv("DOWNLOAD_CACHE_FRESH_SECONDS", "0"))
+
+CHUNK_SIZE = 8192
+
+MAX_AGE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)")
+
+
+def freshness_lifetime(headers, default_seconds: float = DOWNLOAD_CACHE_FRESH_SECONDS) -> Optional[float]:
+    """Seconds a response may be reused without revalidation, or None if it must not be stored."""
+    directives = headers.get("cache-control", "").lower()
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    match = MAX_AGE.search(directives)
+    if not match:
+        return default_seconds
+    try:
+        age = float(headers.get("age", "0"))
+    except ValueError:
+        age = 0.0
+    return max(float(match.group(1)) - age, 0.0)
+
+
+@dataclass
+class CachedFile:
+    """Result of a cache lookup: the blob on disk and how it was obtained."""
+    path: Path
+    size: int
+    sha256: str
+    status: str  # "hit", "revalidated", "miss" or "no-store" (not kept; removed once copied)
+
+
+class DownloadCache:
+    """
+    Shared on-disk cache for remote files, content-addressed by SHA-256.
+
+    URLs map to blobs in an SQLite index together with their ETag and
+    Last-Modified validators. An entry is served directly only while the
+    response's Cache-Control max-age allows it; otherwise it is revalidated
+    with a conditional GET, so a 304 costs no body transfer. no-store
+    responses are never indexed.
+    Identical content fetched from different URLs is stored once, and the
+    least recently used blobs are evicted when the cache exceeds its size cap.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR / "downloads", max_mb: int = DOWNLOAD_CACHE_MAX_MB,
+                 fresh_seconds: float = DOWNLOAD_CACHE_FRESH_SECONDS):
+        self.root = root
+        self.blobs = root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.db_path = root / "index.sqlite"
+        self.max_bytes = max_mb * 1024 * 1024
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+        with closing(self._connect()) as db, db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    fresh_until REAL NOT NULL DEFAULT 0
+                )
+            """)
+            # Indexes created before fresh_until existed: their entries are revalidated on next use
+            if "fresh_until" not in {row[1] for row in db.execute("PRAGMA table_info(entries)")}:
+                db.execute("ALTER TABLE entries ADD COLUMN fresh_until REAL NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    # -------------------------------------------------
+    # INDEX
+    # -------------------------------------------------
+    def _lookup(self, url: str) -> Optional[dict]:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT sha256, size, etag, last_modified, fetched_at, fresh_until FROM entries WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None or not (self.blobs / row[0]).exists():
+            return None
+        return dict(zip(("sha256", "size", "etag", "last_modified", "fetched_at", "fresh_until"), row))
+
+    def _touch(self, url: str, fresh_until: Optional[float] = None) -> None:
+        """Record an access; fresh_until is given when a 304 renewed the entry."""
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            if fresh_until is not None:
+                db.execute("UPDATE entries SET last_access = ?, fetched_at = ?, fresh_until = ? WHERE url = ?",
+                           (now, now, fresh_until, url))
+            else:
+                db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (now, url))
+
+    def _store(self, url: str, sha256: str, size: int, headers, lifetime: float) -> None:
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (url, sha256, size, etag, last_modified, fetched_at, last_access, "
+                "fresh_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, headers.get("etag"), headers.get("last-modified"), now, now, now + lifetime),
+            )
+        self._evict(keep=sha256)
+
+    def _forget(self, url: str) -> None:
+        """Drop url's entry (its response became no-store), and its blob if nothing else uses it."""
+        with closing(self._connect()) as db, db:
+            row = db.execute("SELECT sha256 FROM entries WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if not db.execute("SELECT 1 FROM entries WHERE sha256 = ?", row).fetchone():
+                (self.blobs / row[0]).unlink(missing_ok=True)
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used blobs (never `keep`) until the cache fits in max_bytes."""
+        with closing(self._connect()) as db, db:
+            blobs = db.execute(
+                "SELECT sha256, MAX(size), MAX(last_access) FROM entries GROUP BY sha256 ORDER BY MAX(last_access)"
+            ).fetchall()
+            total = sum(size for _, size, _ in blobs)
+            for sha256, size, _ in blobs:
+                if total <= self.max_bytes:
+                    break
+                if sha256 == keep:
+                    continue
+                db.execute("DELETE FROM entries WHERE sha256 = ?", (sha256,))
+                (self.blobs / sha256).unlink(missing_ok=True)
+                total -= size
+                logger.info(f"Evicted cached blob {sha256[:12]} ({size} bytes)")
+
+    def _record(self, status: str, size: int) -> None:
+        with self._lock:
+            self._stats[{"hit": "hits", "revalidated": "revalidated", "miss": "misses",
+                         "no-store": "misses"}[status]] += 1
+            if status in ("miss", "no-store"):
+                self._stats["bytes_downloaded"] += size
+            else:
+                self._stats["bytes_saved"] += size
+
+    # -------------------------------------------------
+    # FETCH HELPERS
+    # -------------------------------------------------
+    def _conditional_headers(self, entry: Optional[dict]) -> dict:
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def _is_fresh(entry: Optional[dict]) -> bool:
+        return entry is not None and time.time() < entry["fresh_until"]
+
+    def _hit(self, url: str, entry: dict, status: str, headers=None) -> CachedFile:
+        """Serve entry; headers are those of the 304 that revalidated it, if any."""
+        if status == "revalidated":
+            lifetime = freshness_lifetime(headers, self.fresh_seconds)
+            self._touch(url, time.time() + (lifetime or 0.0))
+        else:
+            self._touch(url)
+        self._record(status, entry["size"])
+        observe_download("cache", entry["size"])
+        logger.info(f"Cache {status}: {url} ({entry['size']} bytes)")
+        return CachedFile(self.blobs / entry["sha256"], entry["size"], entry["sha256"], status)
+
+    def _begin_blob(self):
+        tmp = self.blobs / f".tmp-{uuid.uuid4().hex}"
+        return tmp, open(tmp, "wb"), hashlib.sha256()
+
+    def _commit_blob(self, url: str, tmp: Path, digest, size: int, headers) -> CachedFile:
+        sha256 = digest.hexdigest()
+        observe_download("network", size)
+        lifetime = freshness_lifetime(headers, self.fresh_seconds)
+        if lifetime is None:
+            # Handed to the caller as the temporary file, never indexed
+            self._forget(url)
+            self._record("no-store", size)
+            logger.info(f"Not caching {url} (Cache-Control: no-store, {size} bytes)")
+            return CachedFile(tmp, size, sha256, "no-store")
+        blob = self.blobs / sha256
+        if blob.exists():
+            tmp.unlink()
+        else:
+            os.replace(tmp, blob)
+        self._store(url, sha256, size, headers, lifetime)
+        self._record("miss", size)
+        logger.info(f"Cache miss: {url} ({size} bytes, sha256 {sha256[:12]}, fresh for {lifetime:.0f}s)")
+        return CachedFile(blob, size, sha256, "miss")
+
+    @staticmethod
+    def _release(cached: CachedFile) -> None:
+        if cached.status == "no-store":
+            cached.path.unlink(missing_ok=True)
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    def fetch(self, url: str) -> CachedFile:
+        """
+        Return the cached blob for url, downloading or revalidating as needed.
+
+        A "no-store" result is a temporary file the caller must remove; use
+        download_to, which does.
+        """
+        entry = self._lookup(url)
+        if self._is_fresh(entry):
+            return self._hit(url, entry, "hit")
+
+        with get_client().stream("GET", url, headers=self._conditional_headers(entry)) as response:
+            if response.status_code == 304 and entry:
+                return self._hit(url, entry, "revalidated", response.headers)
+            response.raise_for_status()
+            tmp, f, digest = self._begin_blob()
+            size = 0
+            try:
+                with f:
+                    for chunk in response.iter_bytes(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+            return self._commit_blob(url, tmp, digest, size, response.headers)
+
+    async def afetch(self, url: str) -> CachedFile:
+        """Async twin of fetch; index queries, eviction and blob moves run in worker threads."""
+        entry = await asyncio.to_thread(self._lookup, url)
+        if self._is_fresh(entry):
+            return await asyncio.to_thread(self._hit, url, entry, "hit")
+
+        async with get_async_client().stream("GET", url, headers=self._conditional_headers(entry)) as response:
+            if response.status_code == 304 and entry:
+                return await asyncio.to_thread(self._hit, url, entry, "revalidated", response.headers)
+            response.raise_for_status()
+            tmp, f, digest = await asyncio.to_thread(self._begin_blob)
+            size = 0
+            try:
+                with f:
+                    async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+            return await asyncio.to_thread(self._commit_blob, url, tmp, digest, size, response.headers)
+
+    def download_to(self, url: str, dest: Path) -> CachedFile:
+        """Fetch url through the cache and copy the content to dest."""
+        cached = self.fetch(url)
+        try:
+            shutil.copyfile(cached.path, dest)
+        finally:
+            self._release(cached)
+        return cached
+
+    async def adownload_to(self, url: str, dest: Path) -> CachedFile:
+        """Async twin of download_to."""
+        cached = await self.afetch(url)
+        try:
+            await asyncio.to_thread(shutil.copyfile, cached.path, dest)
+        finally:
+            await asyncio.to_thread(self._release, cached)
+        return cached
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus current cache size, for monitoring."""
+        with closing(self._connect()) as db:
+            entries, size = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT sha256, MAX(size) AS size FROM entries GROUP BY sha256)"
+            ).fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats.update({
+            "blobs": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0,
+        })
+        return stats
+
+
+download_cache = DownloadCache()
@@ -1,7 +1,6 @@
 from langchain_core.tools import tool
-import requests
-import os
 from logger_config import get_logger, DOWNLOADS_DIR
+from .download_cache import download_cache
 
 logger = get_logger("download_file")
 
@@ -22,19 +21,34 @@ def download_file(url: str, filename: str) -> str:
         logger.info(f"Downloading file from URL: {url}")
         logger.info(f"Target filename: {filename}")
         
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+        filepath = DOWNLOADS_DIR / filename
+        
+        # Served from the shared cache when this URL was fetched before
+        cached = download_cache.download_to(url, filepath)
+        
+        logger.info(f"Download complete: {filename} ({cached.size} bytes, cache {cached.status})")
+        logger.info(f"Saved to: {filepath}")
+        
+        # Return relative path from downloads directory
+        return str(filepath.relative_to(filepath.parent.parent.parent))
+        
+    except Exception as e:
+        error_msg = f"Error downloading file: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+async def adownload_file(url: str, filename: str) -> str:
+    """Async twin of download_file that streams through the cache on the shared async client."""
+    try:
+        logger.info(f"Downloading file from URL: {url}")
+        logger.info(f"Target filename: {filename}")
         
         filepath = DOWNLOADS_DIR / filename
         
-        with open(filepath, "wb") as f:
-            total_size = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    total_size += len(chunk)
+        cached = await download_cache.adownload_to(url, filepath)
         
-        logger.info(f"Download complete: {filename} ({total_size} bytes)")
+        logger.info(f"Download complete: {filename} ({cached.size} bytes, cache {cached.status})")
         logger.info(f"Saved to: {filepath}")
         
         # Return relative path from downloads directory
@@ -44,3 +58,6 @@ def download_file(url: str, filename: str) -> str:
         error_msg = f"Error downloading file: {str(e)}"
         logger.error(error_msg)
         return error_msg
+
+
+download_file.coroutine = adownload_file
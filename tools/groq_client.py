@@ -0,0 +1,51 @@
+import asyncio
+import os
+import threading
+import weakref
+from logger_config import get_logger
+
+logger = get_logger("groq_client")
+
+# groq is imported on first use: it is only needed by transcribe_audio and may not be installed
+
+# -------------------------------------------------
+# SHARED CLIENTS
+# -------------------------------------------------
+_lock = threading.Lock()
+_client = None
+# The async client's connection pool is bound to the event loop that created it
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_env_loaded = False
+
+
+def _api_key() -> str:
+    """GROQ_API_KEY, reading .env once per process instead of on every call."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv("GROQ_API_KEY")
+
+
+def get_groq_client():
+    """Process-wide Groq client (thread-safe); raises ImportError if groq is missing."""
+    global _client
+    with _lock:
+        if _client is None:
+            from groq import Groq
+            _client = Groq(api_key=_api_key())
+            logger.info("Groq client ready")
+        return _client
+
+
+def get_async_groq_client():
+    """AsyncGroq client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            from groq import AsyncGroq
+            client = AsyncGroq(api_key=_api_key())
+            _async_clients[loop] = client
+        return client
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Optional
+import httpx
+from logger_config import get_logger
+
+logger = get_logger("http_client")
+
+# Connection pool and timeout configuration (overridable through the environment)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+# Retries for idempotent requests (connection failures are retried for every method)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_RETRY_AFTER_SECONDS = 30
+
+try:
+    import h2  # noqa: F401  (installed by the httpx[http2] dependency)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    # An environment built without the extra still works, over HTTP/1.1 only
+    HTTP2_AVAILABLE = False
+    logger.warning("h2 is not installed; HTTP/2 is disabled (install httpx[http2])")
+
+TIMEOUT = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
+
+
+class PoolStats:
+    """Thread-safe counters shared by the sync and async clients."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._hosts = Counter()
+
+    def record(self, key: str, host: Optional[str] = None) -> None:
+        with self._lock:
+            self._counts[key] += 1
+            if host:
+                self._hosts[host] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, hosts = dict(self._counts), dict(self._hosts)
+        requests = counts.get("requests", 0)
+        opened = counts.get("connections_opened", 0)
+        return {
+            "requests": requests,
+            "connections_opened": opened,
+            "connection_reuse_ratio": round(1 - opened / requests, 3) if requests else 0.0,
+            "retries": counts.get("retries", 0),
+            "failures": counts.get("failures", 0),
+            "http2_requests": counts.get("http2_requests", 0),
+            "requests_per_host": hosts,
+        }
+
+
+stats = PoolStats()
+
+
+def _should_retry(method: str, attempt: int, status: Optional[int] = None,
+                  error: Optional[Exception] = None) -> bool:
+    if attempt >= HTTP_RETRIES:
+        return False
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        # The request never reached the server, so even a POST is safe to resend
+        return True
+    if method not in IDEMPOTENT_METHODS:
+        return False
+    return error is not None or status in RETRY_STATUSES
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Exponential backoff with jitter, honouring a numeric Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER_SECONDS)
+    return HTTP_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+def _record_response(request: httpx.Request, response: httpx.Response) -> None:
+    stats.record("requests", request.url.host)
+    if response.extensions.get("http_version") == b"HTTP/2":
+        stats.record("http2_requests")
+
+
+def _sync_trace(event: str, info: dict) -> None:
+    if event == "connection.connect_tcp.complete":
+        stats.record("connections_opened")
+
+
+async def _async_trace(event: str, info: dict) -> None:
+    _sync_trace(event, info)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Wraps the pooled transport with backoff retries and pool statistics."""
+
+    def __init__(self, transport: httpx.HTTPTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = _sync_trace
+        attempt = 0
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                if not _should_retry(request.method, attempt, error=e):
+                    stats.record("failures")
+                    raise
+                delay = _backoff(attempt)
+                logger.warning(f"{request.method} {request.url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if not _should_retry(request.method, attempt, status=response.status_code):
+                    _record_response(request, response)
+                    return response
+                delay = _backoff(attempt, response)
+                # Drain the (small) error body so the connection goes back to the pool
+                response.read()
+                response.close()
+                logger.warning(f"{request.method} {request.url} returned {response.status_code}, "
+                               f"retrying in {delay:.1f}s")
+            stats.record("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Async twin of RetryTransport."""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = _async_trace
+        attempt = 0
+        while True:
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                if not _should_retry(request.method, attempt, error=e):
+                    stats.record("failures")
+                    raise
+                delay = _backoff(attempt)
+                logger.warning(f"{request.method} {request.url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if not _should_retry(request.method, attempt, status=response.status_code):
+                    _record_response(request, response)
+                    return response
+                delay = _backoff(attempt, response)
+                await response.aread()
+                await response.aclose()
+                logger.warning(f"{request.method} {request.url} returned {response.status_code}, "
+                               f"retrying in {delay:.1f}s")
+            stats.record("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# -------------------------------------------------
+# SHARED CLIENTS
+# -------------------------------------------------
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+# httpx connection pools are bound to the event loop that created them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.Client:
+    """Process-wide pooled client for blocking code (thread-safe)."""
+    global _client
+    with _lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                transport=RetryTransport(httpx.HTTPTransport(limits=LIMITS, http2=HTTP2_AVAILABLE)),
+                timeout=TIMEOUT,
+                follow_redirects=True,
+            )
+            logger.info(f"HTTP client ready (http2={HTTP2_AVAILABLE}, "
+                        f"max_connections={HTTP_MAX_CONNECTIONS}, keepalive={HTTP_MAX_KEEPALIVE})")
+        return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                transport=AsyncRetryTransport(httpx.AsyncHTTPTransport(limits=LIMITS, http2=HTTP2_AVAILABLE)),
+                timeout=TIMEOUT,
+                follow_redirects=True,
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def close_client() -> None:
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_async_client() -> None:
+    """Close the async client of the running event loop, if one was created."""
+    with _lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def pool_stats() -> dict:
+    """Request, connection-reuse and retry counters for monitoring."""
+    return {"http2_available": HTTP2_AVAILABLE, **stats.snapshot()}
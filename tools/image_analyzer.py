@@ -1,75 +1,49 @@
 from langchain_core.tools import tool
+import asyncio
 import os
-import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from logger_config import get_logger, DOWNLOADS_DIR
+from .download_cache import download_cache
+from .image_stats import STATS_OPERATIONS, analyze as analyze_stats, describe as describe_pixels, load_rgb
+from .ocr_engine import OCR_TARGET_DPI, OCR_TILE_HEIGHT, ocr_images
+from .result_cache import result_cache
 
 logger = get_logger("image_analyzer")
 
-@tool
-def analyze_image(image_source: str, operation: str = "ocr", language: str = "eng") -> str:
-    """
-    Analyze images from a file path or URL using various operations.
-    
-    This tool handles image processing for quiz tasks including OCR (text extraction),
-    metadata extraction, and basic image analysis. Supports both local files and remote URLs.
-    
-    Parameters
-    ----------
-    image_source : str
-        Either a local file path (e.g., "data/downloads/image.png") or a URL to an image file.
-        Supported formats: png, jpg, jpeg, gif, bmp, tiff, webp
-    operation : str
-        The operation to perform on the image. Options:
-        - "ocr": Extract text from image (default)
-        - "metadata": Get image properties (size, format, mode, etc.)
-        - "describe": Basic image analysis (colors, dimensions)
-    language : str
-        Language code for OCR (default: "eng" for English).
-        Other options: "fra" (French), "deu" (German), "spa" (Spanish), etc.
-    
-    Returns
-    -------
-    str
-        The result of the image operation (extracted text, metadata, or description).
-    
-    Examples
-    --------
-    >>> analyze_image("https://example.com/document.png", operation="ocr")
-    >>> analyze_image("data/downloads/chart.jpg", operation="metadata")
-    >>> analyze_image("data/downloads/screenshot.png", operation="describe")
-    """
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp']
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def _local_image_path(url: str, taken: Optional[set] = None):
+    # Extract filename from URL or use default
+    filename = url.split("/")[-1].split("?")[0]
+    if not any(filename.endswith(ext) for ext in IMAGE_EXTENSIONS):
+        filename = "image.png"
+    path = DOWNLOADS_DIR / filename
+    # Batch calls can contain different URLs with the same file name
+    n = 1
+    while taken is not None and path in taken:
+        path = DOWNLOADS_DIR / f"{os.path.splitext(filename)[0]}_{n}{os.path.splitext(filename)[1]}"
+        n += 1
+    if taken is not None:
+        taken.add(path)
+    return path
+
+
+def _ocr_params(language: str, preprocess: bool) -> dict:
+    # Everything that changes the OCR output is part of the cache key
+    return {"operation": "ocr", "language": language, "preprocess": preprocess,
+            "target_dpi": OCR_TARGET_DPI if preprocess else None, "tile_height": OCR_TILE_HEIGHT}
+
+
+def _analyze_local(image_source: str, operation: str, language: str, preprocess: bool = True) -> str:
+    """Run the requested operation on an image that is already on disk."""
     try:
         from PIL import Image
         import pytesseract
-        from io import BytesIO
-        
-        logger.info(f"Image analysis requested for: {image_source}")
-        logger.info(f"Operation: {operation}, Language: {language}")
-        
-        # Handle URL downloads
-        if image_source.startswith("http://") or image_source.startswith("https://"):
-            logger.info(f"Downloading image from URL: {image_source}")
-            response = requests.get(image_source, stream=True)
-            response.raise_for_status()
-            
-            # Extract filename from URL or use default
-            filename = image_source.split("/")[-1].split("?")[0]
-            if not any(filename.endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp']):
-                filename = "image.png"
-            
-            local_path = DOWNLOADS_DIR / filename
-            
-            total_size = 0
-            with open(local_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
-            
-            logger.info(f"Image downloaded: {filename} ({total_size} bytes)")
-            logger.info(f"Saved to: {local_path}")
-            image_source = str(local_path)
         
         # Verify file exists
         if not os.path.exists(image_source):
@@ -83,11 +57,11 @@ def analyze_image(image_source: str, operation: str = "ocr", language: str = "en
         
         # Perform requested operation
         if operation == "ocr":
-            logger.info(f"Performing OCR with language: {language}")
-            text = pytesseract.image_to_string(img, lang=language)
+            logger.info(f"Performing OCR with language: {language} (preprocess={preprocess})")
+            text = ocr_images([image_source], language, preprocess)[0].render()
             logger.info(f"OCR complete: {len(text)} characters extracted")
             logger.info(f"Preview: {text[:200]}..." if len(text) > 200 else f"Full text: {text}")
-            return text.strip()
+            return text
         
         elif operation == "metadata":
             logger.info("Extracting image metadata")
@@ -117,11 +91,13 @@ def analyze_image(image_source: str, operation: str = "ocr", language: str = "en
 - File Size: {os.path.getsize(image_source)} bytes
 - Aspect Ratio: {img.size[0]/img.size[1]:.2f}
 """
+            description += describe_pixels(load_rgb(image_source))
             logger.info("Description complete")
             return description
         
         else:
-            error_msg = f"Unknown operation: {operation}. Use 'ocr', 'metadata', or 'describe'"
+            error_msg = (f"Unknown operation: {operation}. Use 'ocr', 'metadata', 'describe', "
+                         + ", ".join(f"'{op}'" for op in STATS_OPERATIONS))
             logger.error(error_msg)
             return f"Error: {error_msg}"
         
@@ -129,7 +105,214 @@ def analyze_image(image_source: str, operation: str = "ocr", language: str = "en
         error_msg = "Required libraries not installed. Use 'add_dependencies' tool to install 'pillow' and 'pytesseract' packages first."
         logger.error(error_msg)
         return f"Error: {error_msg}"
+
+
+def _analyze_cached(image_source: str, operation: str, language: str, use_cache: bool,
+                    preprocess: bool = True) -> str:
+    """OCR results are cached by image content; metadata and describe are cheap enough to recompute."""
+    if operation != "ocr" or not os.path.exists(image_source):
+        return _analyze_local(image_source, operation, language, preprocess)
+    return result_cache.cached(
+        "ocr", image_source, _ocr_params(language, preprocess),
+        lambda: _analyze_local(image_source, operation, language, preprocess), use_cache,
+    )
+
+
+def _analyze_stats(image_source: str, operation: str, compare_with: Optional[str], color: Optional[str],
+                   tolerance: int, k: int, bins: int) -> str:
+    """Vectorised pixel statistics (NumPy) on images already on disk."""
+    try:
+        for path in (image_source, compare_with):
+            if path and not os.path.exists(path):
+                error_msg = f"Image file not found at {path}"
+                logger.error(error_msg)
+                return f"Error: {error_msg}"
+        return analyze_stats(operation, image_source, compare_with, color=color, tolerance=tolerance, k=k, bins=bins)
+    except ImportError:
+        error_msg = "Required libraries not installed. Use 'add_dependencies' tool to install 'pillow' and 'numpy' packages first."
+        logger.error(error_msg)
+        return f"Error: {error_msg}"
+
+
+def _ocr_batch(paths: List[str], language: str, use_cache: bool, preprocess: bool) -> str:
+    """OCR several images in one pass: cached ones are reused, the tiles of the rest share the pool."""
+    try:
+        results, missing = {}, []
+        params = _ocr_params(language, preprocess)
+        for path in dict.fromkeys(paths):
+            if not os.path.exists(path):
+                results[path] = f"Error: Image file not found at {path}"
+                continue
+            key, value = result_cache.lookup("ocr", path, params, use_cache)
+            if value is None:
+                missing.append((path, key))
+            else:
+                results[path] = value
+        if missing:
+            for (path, key), result in zip(missing, ocr_images([p for p, _ in missing], language, preprocess)):
+                results[path] = result.render()
+                if key is not None:
+                    result_cache.put(key, "ocr", results[path])
+        logger.info(f"Batch OCR complete: {len(results)} images, {len(missing)} recognised, "
+                    f"{len(results) - len(missing)} from cache or missing")
+        return "\n\n".join(f"=== {path} ===\n{results[path]}" for path in dict.fromkeys(paths))
+    except ImportError:
+        error_msg = "Required libraries not installed. Use 'add_dependencies' tool to install 'pillow' and 'pytesseract' packages first."
+        logger.error(error_msg)
+        return f"Error: {error_msg}"
+
+
+def _fetch_image(image_source: str, taken: Optional[set] = None) -> str:
+    """Download URLs through the cache; local paths are returned unchanged."""
+    if not _is_url(image_source):
+        return image_source
+    logger.info(f"Downloading image from URL: {image_source}")
+    local_path = _local_image_path(image_source, taken)
+    cached = download_cache.download_to(image_source, local_path)
+    
+    logger.info(f"Image downloaded: {local_path.name} ({cached.size} bytes, cache {cached.status})")
+    logger.info(f"Saved to: {local_path}")
+    return str(local_path)
+
+
+async def _afetch_image(image_source: str, taken: Optional[set] = None) -> str:
+    if not _is_url(image_source):
+        return image_source
+    logger.info(f"Downloading image from URL: {image_source}")
+    local_path = _local_image_path(image_source, taken)
+    cached = await download_cache.adownload_to(image_source, local_path)
+    
+    logger.info(f"Image downloaded: {local_path.name} ({cached.size} bytes, cache {cached.status})")
+    logger.info(f"Saved to: {local_path}")
+    return str(local_path)
+
+
+@tool
+def analyze_image(image_source: str, operation: str = "ocr", language: str = "eng", use_cache: bool = True,
+                  preprocess: bool = True, image_sources: Optional[List[str]] = None,
+                  compare_with: Optional[str] = None, color: Optional[str] = None, tolerance: int = 0,
+                  k: int = 5, bins: int = 16) -> str:
+    """
+    Analyze images from a file path or URL using various operations.
+    
+    This tool handles image processing for quiz tasks including OCR (text extraction),
+    metadata extraction, and pixel statistics (colour counts, histograms, dominant
+    colours, differences between two images) computed with NumPy over the whole
+    image, so there is no need to loop over pixels in run_code. Supports both local
+    files and remote URLs.
+    OCR resamples the image to ~300 DPI, converts it to black-and-white text, splits
+    very tall images into bands recognised in parallel, and ends with a summary line
+    giving the mean Tesseract confidence (0-100) of each band.
+    
+    Parameters
+    ----------
+    image_source : str
+        Either a local file path (e.g., "data/downloads/image.png") or a URL to an image file.
+        Supported formats: png, jpg, jpeg, gif, bmp, tiff, webp
+    operation : str
+        The operation to perform on the image. Options:
+        - "ocr": Extract text from image (default)
+        - "metadata": Get image properties (size, format, mode, etc.)
+        - "describe": Dimensions, per-channel statistics and dominant colours
+        - "stats": Per-channel min/max/mean/std/median and mean brightness
+        - "histogram": Per-channel pixel counts in `bins` ranges of 0-255
+        - "colors": Number of distinct colours and the most frequent ones; with `color`,
+          the number of pixels of that colour
+        - "dominant_colors": `k` main colours (k-means) and their share of the image
+        - "diff": Pixels that differ from the image `compare_with`, their bounding box,
+          and a saved mask image of the changes
+    language : str
+        Language code for OCR (default: "eng" for English).
+        Other options: "fra" (French), "deu" (German), "spa" (Spanish), etc.
+    use_cache : bool
+        OCR results are cached by image content. Set to False to force a fresh OCR pass.
+    preprocess : bool
+        Resample and binarise before OCR (default). Set to False to OCR the raw image,
+        e.g. when confidence is low on a clean, already high-resolution image.
+    image_sources : Optional[List[str]]
+        More images (paths or URLs) to OCR in the same call together with image_source.
+        Only used with operation="ocr"; each result is headed by "=== <path> ===".
+    compare_with : Optional[str]
+        Second image (path or URL) for operation="diff"; must have the same size.
+    color : Optional[str]
+        Colour to count for operation="colors": "#ff0000", "255,0,0" or a name like "red".
+    tolerance : int
+        Largest per-channel difference (0-255) still counted as the same colour /
+        unchanged pixel, for "colors" and "diff" (default 0 = exact).
+    k : int
+        Number of clusters for "dominant_colors" (default 5).
+    bins : int
+        Number of ranges for "histogram" (default 16; 256 = every level).
+    
+    Returns
+    -------
+    str
+        The result of the image operation (extracted text, metadata, or description).
+    
+    Examples
+    --------
+    >>> analyze_image("https://example.com/document.png", operation="ocr")
+    >>> analyze_image("data/downloads/page1.png", image_sources=["data/downloads/page2.png"])
+    >>> analyze_image("data/downloads/chart.jpg", operation="metadata")
+    >>> analyze_image("data/downloads/screenshot.png", operation="describe")
+    >>> analyze_image("data/downloads/flag.png", operation="colors", color="#ff0000", tolerance=10)
+    >>> analyze_image("data/downloads/a.png", operation="diff", compare_with="data/downloads/b.png")
+    """
+    try:
+        logger.info(f"Image analysis requested for: {image_source}")
+        logger.info(f"Operation: {operation}, Language: {language}"
+                    + (f", batch of {1 + len(image_sources)} images" if image_sources else ""))
+        
+        if image_sources and operation == "ocr":
+            taken = set()
+            paths = [_fetch_image(source, taken) for source in [image_source, *image_sources]]
+            return _ocr_batch(paths, language, use_cache, preprocess)
+        
+        if operation in STATS_OPERATIONS:
+            taken = set()
+            image_source = _fetch_image(image_source, taken)
+            compare_with = _fetch_image(compare_with, taken) if compare_with else None
+            return _analyze_stats(image_source, operation, compare_with, color, tolerance, k, bins)
+        
+        return _analyze_cached(_fetch_image(image_source), operation, language, use_cache, preprocess)
+        
     except Exception as e:
         error_msg = f"Error analyzing image: {str(e)}"
         logger.error(error_msg)
         return error_msg
+
+
+async def aanalyze_image(image_source: str, operation: str = "ocr", language: str = "eng",
+                         use_cache: bool = True, preprocess: bool = True,
+                         image_sources: Optional[List[str]] = None,
+                         compare_with: Optional[str] = None, color: Optional[str] = None, tolerance: int = 0,
+                         k: int = 5, bins: int = 16) -> str:
+    """Async twin of analyze_image; downloads through the cache and runs PIL/Tesseract in a thread."""
+    try:
+        logger.info(f"Image analysis requested for: {image_source}")
+        logger.info(f"Operation: {operation}, Language: {language}"
+                    + (f", batch of {1 + len(image_sources)} images" if image_sources else ""))
+        
+        if image_sources and operation == "ocr":
+            taken = set()
+            paths = await asyncio.gather(*(_afetch_image(source, taken) for source in [image_source, *image_sources]))
+            return await asyncio.to_thread(_ocr_batch, list(paths), language, use_cache, preprocess)
+        
+        if operation in STATS_OPERATIONS:
+            taken = set()
+            image_source = await _afetch_image(image_source, taken)
+            compare_with = await _afetch_image(compare_with, taken) if compare_with else None
+            return await asyncio.to_thread(_analyze_stats, image_source, operation, compare_with, color,
+                                           tolerance, k, bins)
+        
+        image_source = await _afetch_image(image_source)
+        # OCR and PIL decoding are CPU-bound, keep them off the event loop
+        return await asyncio.to_thread(_analyze_cached, image_source, operation, language, use_cache, preprocess)
+        
+    except Exception as e:
+        error_msg = f"Error analyzing image: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+analyze_image.coroutine = aanalyze_image
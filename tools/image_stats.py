@@ -0,0 +1,308 @@
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from logger_config import get_logger, CACHE_DIR, DOWNLOADS_DIR
+from .result_cache import file_sha256
+
+logger = get_logger("image_stats")
+
+# Images with more pixels than this are decoded once into a memory-mapped .npy file
+IMAGE_MEMMAP_PIXELS = int(os.getenv("IMAGE_MEMMAP_PIXELS", str(16_000_000)))
+# Disk budget of decoded arrays kept for reuse (oldest are removed first)
+IMAGE_MEMMAP_MAX_MB = int(os.getenv("IMAGE_MEMMAP_MAX_MB", "512"))
+# Pixels processed per vectorised step, bounding temporary memory on large images
+IMAGE_STATS_CHUNK_PIXELS = int(os.getenv("IMAGE_STATS_CHUNK_PIXELS", str(2_000_000)))
+
+ARRAYS_DIR = CACHE_DIR / "arrays"
+CHANNELS = ("R", "G", "B")
+KMEANS_SAMPLE = 100_000
+KMEANS_ITERATIONS = 25
+
+
+# -------------------------------------------------
+# LOADING
+# -------------------------------------------------
+def _trim_arrays(keep: Path) -> None:
+    files = sorted(ARRAYS_DIR.glob("*.npy"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    for path in files:
+        if total <= IMAGE_MEMMAP_MAX_MB * 1024 * 1024:
+            break
+        if path != keep:
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+
+def load_rgb(path: str):
+    """
+    Pixels of an image as a (height, width, 3) uint8 array.
+
+    Small images are decoded in memory. Large ones are decoded band by band
+    into a memory-mapped .npy file keyed by the image's SHA-256, so later
+    calls on the same image skip decoding and only touch the pages they read.
+    """
+    import numpy as np
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(path))
+    if img.width * img.height <= IMAGE_MEMMAP_PIXELS:
+        return np.asarray(img.convert("RGB"))
+
+    ARRAYS_DIR.mkdir(parents=True, exist_ok=True)
+    array_path = ARRAYS_DIR / f"{file_sha256(path)}.npy"
+    if array_path.exists():
+        array_path.touch()
+        return np.load(array_path, mmap_mode="r")
+    started = time.perf_counter()
+    tmp_path = array_path.with_suffix(f".{os.getpid()}.tmp")
+    array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(img.height, img.width, 3))
+    rows = max(1, IMAGE_STATS_CHUNK_PIXELS // img.width)
+    for top in range(0, img.height, rows):
+        bottom = min(top + rows, img.height)
+        array[top:bottom] = np.asarray(img.crop((0, top, img.width, bottom)).convert("RGB"))
+    array.flush()
+    del array
+    os.replace(tmp_path, array_path)
+    _trim_arrays(keep=array_path)
+    logger.info(f"Decoded {path} ({img.width}x{img.height}) into {array_path.name} "
+                f"in {time.perf_counter() - started:.2f}s")
+    return np.load(array_path, mmap_mode="r")
+
+
+def _chunks(pixels) -> Iterator:
+    """(n, 3) blocks of pixels, a few rows at a time."""
+    rows = max(1, IMAGE_STATS_CHUNK_PIXELS // max(pixels.shape[1], 1))
+    for top in range(0, pixels.shape[0], rows):
+        yield pixels[top:top + rows].reshape(-1, 3)
+
+
+def parse_color(color: str) -> Tuple[int, int, int]:
+    """'#ff8800', 'ff8800', '#f80', '255,136,0' or a CSS colour name -> (r, g, b)."""
+    color = color.strip()
+    if "," in color:
+        r, g, b = (int(v) for v in color.strip("()rgb ").split(","))
+        return r, g, b
+    from PIL import ImageColor
+    if not color.startswith("#") and all(c in "0123456789abcdefABCDEF" for c in color) and len(color) in (3, 6):
+        color = "#" + color
+    return ImageColor.getrgb(color)[:3]
+
+
+def _hex(rgb) -> str:
+    return "#%02x%02x%02x" % tuple(int(v) for v in rgb)
+
+
+# -------------------------------------------------
+# STATISTICS
+# -------------------------------------------------
+def channel_histograms(pixels):
+    """(3, 256) exact per-channel counts."""
+    import numpy as np
+    counts = np.zeros((3, 256), dtype=np.int64)
+    for block in _chunks(pixels):
+        for c in range(3):
+            counts[c] += np.bincount(block[:, c], minlength=256)
+    return counts
+
+
+def channel_stats(pixels) -> str:
+    """Min, max, mean, std and median of each channel, all derived from the exact histograms."""
+    import numpy as np
+    counts = channel_histograms(pixels)
+    levels = np.arange(256)
+    total = counts[0].sum()
+    lines = [f"Pixels: {total} ({pixels.shape[1]}x{pixels.shape[0]})",
+             "channel   min   max     mean      std  median"]
+    luma = np.array([0.299, 0.587, 0.114])
+    means = []
+    for c, name in enumerate(CHANNELS):
+        present = np.flatnonzero(counts[c])
+        mean = (counts[c] * levels).sum() / total
+        std = np.sqrt((counts[c] * (levels - mean) ** 2).sum() / total)
+        median = int(np.searchsorted(np.cumsum(counts[c]), (total + 1) / 2))
+        means.append(mean)
+        lines.append(f"{name:>7} {present[0]:5d} {present[-1]:5d} {mean:8.2f} {std:8.2f} {median:7d}")
+    lines.append(f"Mean colour: {_hex(np.round(means))}, mean brightness (luma): {float(luma @ means):.2f}")
+    return "\n".join(lines)
+
+
+def histogram(pixels, bins: int = 16) -> str:
+    """Per-channel counts grouped into `bins` equal ranges of the 0-255 scale."""
+    counts = channel_histograms(pixels)
+    bins = min(max(bins, 1), 256)
+    edges = [round(i * 256 / bins) for i in range(bins + 1)]
+    lines = ["range        " + "".join(f"{name:>12}" for name in CHANNELS)]
+    for low, high in zip(edges, edges[1:]):
+        lines.append(f"{low:3d}-{high - 1:3d}    " + "".join(f"{int(counts[c][low:high].sum()):12d}" for c in range(3)))
+    return "\n".join(lines)
+
+
+def color_counts(pixels, top: int = 10, color: Optional[str] = None, tolerance: int = 0) -> str:
+    """
+    Distinct colours and the most frequent ones; with `color`, the number of
+    pixels within `tolerance` (max per-channel difference) of that colour.
+    """
+    import numpy as np
+    total = pixels.shape[0] * pixels.shape[1]
+    codes, counts, matching = [], [], 0
+    target = np.array(parse_color(color), dtype=np.int16) if color else None
+    for block in _chunks(pixels):
+        packed = (block[:, 0].astype(np.uint32) << 16) | (block[:, 1].astype(np.uint32) << 8) | block[:, 2]
+        unique, n = np.unique(packed, return_counts=True)
+        codes.append(unique)
+        counts.append(n)
+        if target is not None:
+            matching += int((np.abs(block.astype(np.int16) - target).max(axis=1) <= tolerance).sum())
+    unique, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+    order = np.argsort(totals)[::-1][:top]
+    lines = [f"Pixels: {total}, distinct colours: {len(unique)}", f"Top {len(order)} colours:"]
+    for i in order:
+        code = int(unique[i])
+        rgb = (code >> 16, (code >> 8) & 255, code & 255)
+        lines.append(f"  {_hex(rgb)} rgb{rgb}: {totals[i]} px ({totals[i] / total:.2%})")
+    if target is not None:
+        lines.append(f"Pixels matching {_hex(target)} (tolerance {tolerance}): {matching} ({matching / total:.2%})")
+    return "\n".join(lines)
+
+
+def _nearest(points, centers):
+    """
+    (index of, squared distance to) the nearest centre for each (n, 3) point.
+
+    Centres are compared one at a time in float32, so temporary memory stays
+    at a few n-sized vectors instead of an (n, k, 3) float64 array.
+    """
+    import numpy as np
+    labels = np.zeros(len(points), dtype=np.intp)
+    best = np.full(len(points), np.inf, dtype=np.float32)
+    distance = np.empty(len(points), dtype=np.float32)
+    scratch = np.empty(len(points), dtype=np.float32)
+    for i, center in enumerate(np.asarray(centers, dtype=np.float32)):
+        distance.fill(0)
+        for c in range(3):
+            np.subtract(points[:, c], center[c], out=scratch)
+            distance += np.square(scratch, out=scratch)
+        closer = distance < best
+        best[closer] = distance[closer]
+        labels[closer] = i
+    return labels, best
+
+
+def dominant_colors(pixels, k: int = 5, seed: int = 0) -> str:
+    """
+    k-means clusters of the image colours (k-means++ seeding on a pixel
+    sample), with each cluster's exact share of all pixels.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    total = pixels.shape[0] * pixels.shape[1]
+    flat_index = rng.choice(total, size=min(KMEANS_SAMPLE, total), replace=False)
+    rows, cols = np.divmod(np.sort(flat_index), pixels.shape[1])
+    sample = pixels[rows, cols].astype(np.float64)
+    k = max(1, min(k, len(np.unique(sample, axis=0))))
+
+    centers = sample[[rng.integers(len(sample))]]
+    while len(centers) < k:
+        distance = _nearest(sample, centers)[1].astype(np.float64)
+        centers = np.vstack([centers, sample[rng.choice(len(sample), p=distance / distance.sum())]])
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _nearest(sample, centers)[0]
+        updated = np.array([sample[labels == i].mean(axis=0) if (labels == i).any() else centers[i] for i in range(k)])
+        if np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    shares = np.zeros(k, dtype=np.int64)
+    for block in _chunks(pixels):
+        shares += np.bincount(_nearest(block, centers)[0], minlength=k)
+    lines = [f"Dominant colours (k-means, k={k}):"]
+    for i in np.argsort(shares)[::-1]:
+        rgb = tuple(int(v) for v in np.round(centers[i]))
+        lines.append(f"  {_hex(rgb)} rgb{rgb}: {shares[i] / total:.2%}")
+    return "\n".join(lines)
+
+
+def image_diff(pixels, other, tolerance: int = 0, mask_path: Optional[Path] = None) -> str:
+    """
+    Pixels that differ between two same-sized images (max channel difference
+    above `tolerance`): count, bounding box, per-channel mean difference, and
+    optionally a black/white mask of the changes saved to mask_path.
+    """
+    import numpy as np
+    if pixels.shape != other.shape:
+        return (f"Error: images differ in size ({pixels.shape[1]}x{pixels.shape[0]} vs "
+                f"{other.shape[1]}x{other.shape[0]}); resize one with run_code first")
+    height, width = pixels.shape[:2]
+    rows = max(1, IMAGE_STATS_CHUNK_PIXELS // width)
+    changed_rows = np.zeros(height, dtype=bool)
+    changed_cols = np.zeros(width, dtype=bool)
+    abs_sum = np.zeros(3, dtype=np.float64)
+    max_diff = 0
+    changed = 0
+    mask = np.lib.format.open_memmap(mask_path.with_suffix(".npy"), mode="w+", dtype=np.uint8,
+                                     shape=(height, width)) if mask_path else None
+    for top in range(0, height, rows):
+        a = pixels[top:top + rows].astype(np.int16)
+        delta = np.abs(a - other[top:top + rows].astype(np.int16))
+        differs = delta.max(axis=2) > tolerance
+        changed += int(differs.sum())
+        changed_rows[top:top + rows] = differs.any(axis=1)
+        changed_cols |= differs.any(axis=0)
+        abs_sum += delta.reshape(-1, 3).sum(axis=0)
+        max_diff = max(max_diff, int(delta.max()))
+        if mask is not None:
+            mask[top:top + rows] = differs * np.uint8(255)
+
+    total = height * width
+    lines = [f"Changed pixels: {changed} of {total} ({changed / total:.2%}, tolerance {tolerance})"]
+    if changed:
+        ys, xs = np.flatnonzero(changed_rows), np.flatnonzero(changed_cols)
+        lines.append(f"Bounding box of changes: x {xs[0]}-{xs[-1]}, y {ys[0]}-{ys[-1]}")
+    lines.append("Mean absolute difference: " + ", ".join(
+        f"{name} {abs_sum[c] / total:.3f}" for c, name in enumerate(CHANNELS)) + f"; max {max_diff}")
+    if mask is not None:
+        from PIL import Image
+        Image.fromarray(np.asarray(mask)).save(mask_path)
+        del mask
+        mask_path.with_suffix(".npy").unlink(missing_ok=True)
+        lines.append(f"Difference mask (white = changed): {mask_path}")
+    return "\n".join(lines)
+
+
+def describe(pixels) -> str:
+    """Channel statistics plus the main colours, for the analyze_image 'describe' operation."""
+    return channel_stats(pixels) + "\n" + dominant_colors(pixels, k=5)
+
+
+def diff_mask_path(path: str, other_path: str) -> Path:
+    names = f"{Path(path).stem}_vs_{Path(other_path).stem}"
+    return DOWNLOADS_DIR / f"diff_{names}.png"
+
+
+def analyze(operation: str, path: str, other_path: Optional[str] = None, color: Optional[str] = None,
+            tolerance: int = 0, k: int = 5, bins: int = 16) -> str:
+    """Run one statistics operation on an image file and log how long it took."""
+    started = time.perf_counter()
+    pixels = load_rgb(path)
+    if operation == "stats":
+        result = channel_stats(pixels)
+    elif operation == "histogram":
+        result = histogram(pixels, bins)
+    elif operation == "colors":
+        result = color_counts(pixels, color=color, tolerance=tolerance)
+    elif operation == "dominant_colors":
+        result = dominant_colors(pixels, k)
+    elif operation == "diff":
+        if not other_path:
+            return "Error: operation 'diff' needs compare_with (a second image)"
+        result = image_diff(pixels, load_rgb(other_path), tolerance, diff_mask_path(path, other_path))
+    else:
+        result = describe(pixels)
+    logger.info(f"Image {operation} of {path} ({pixels.shape[1]}x{pixels.shape[0]}) "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return result
+
+
+STATS_OPERATIONS: List[str] = ["stats", "histogram", "colors", "dominant_colors", "diff"]
@@ -0,0 +1,240 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from logger_config import get_logger
+
+logger = get_logger("ocr_engine")
+
+# Images are resampled so text lands near this resolution (Tesseract is tuned for ~300 DPI)
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+# Assumed resolution of images without DPI metadata (screenshots, web images)
+OCR_DEFAULT_DPI = int(os.getenv("OCR_DEFAULT_DPI", "150"))
+OCR_MAX_UPSCALE = float(os.getenv("OCR_MAX_UPSCALE", "2.0"))
+# Upper bound on the resampled image size, whatever the DPI says
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", str(40_000_000)))
+# Images taller than 1.5x this are cut into bands of roughly this height
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "2000"))
+# Processes OCRing tiles in parallel (1 = OCR inline in the calling thread)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Tesseract page segmentation: 3 = fully automatic layout analysis
+OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "--psm 3")
+
+
+@dataclass
+class OcrTile:
+    index: int
+    top: int
+    bottom: int
+    text: str = ""
+    confidence: Optional[float] = None  # mean word confidence, 0-100
+
+
+@dataclass
+class OcrResult:
+    path: str
+    size: Tuple[int, int]   # size OCR'd, after resampling
+    scale: float
+    preprocessed: bool
+    tiles: List[OcrTile] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(t.text for t in self.tiles if t.text)
+
+    @property
+    def confidence(self) -> Optional[float]:
+        scores = [t.confidence for t in self.tiles if t.confidence is not None]
+        return round(sum(scores) / len(scores), 1) if scores else None
+
+    def render(self) -> str:
+        """Text followed by a one-line summary of how it was read and how reliable it is."""
+        per_tile = "/".join("-" if t.confidence is None else f"{t.confidence:.0f}" for t in self.tiles)
+        steps = f"{self.scale:.2f}x resample, grayscale, binarized" if self.preprocessed else "raw image"
+        summary = (f"[OCR: {self.size[0]}x{self.size[1]} px ({steps}), {len(self.tiles)} tile(s), "
+                   f"confidence {per_tile} (mean {self.confidence if self.confidence is not None else '-'})]")
+        return f"{self.text.strip()}\n\n{summary}"
+
+
+# -------------------------------------------------
+# PREPROCESSING
+# -------------------------------------------------
+def load_image(path: str):
+    """Open an image upright and flattened onto white (transparent text would vanish otherwise)."""
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(path))
+    if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, "white")
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    return img
+
+
+def _source_dpi(img) -> float:
+    dpi = img.info.get("dpi")
+    try:
+        value = float(dpi[0]) if dpi else 0.0
+    except (TypeError, ValueError, IndexError):
+        value = 0.0
+    # Many encoders write 72 or 1 as a placeholder rather than a real scan resolution
+    return value if value > 72 else OCR_DEFAULT_DPI
+
+
+def rescale(img) -> Tuple[object, float]:
+    """Resample towards OCR_TARGET_DPI, bounded by OCR_MAX_UPSCALE and OCR_MAX_PIXELS."""
+    from PIL import Image
+    scale = min(OCR_TARGET_DPI / _source_dpi(img), OCR_MAX_UPSCALE)
+    scale = min(scale, (OCR_MAX_PIXELS / (img.width * img.height)) ** 0.5)
+    if abs(scale - 1) < 0.05:
+        return img, 1.0
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.Resampling.LANCZOS), scale
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Grey level that best separates ink from background (Otsu's method on a 256-bin histogram)."""
+    import numpy as np
+    hist = np.asarray(histogram[:256], dtype=np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    mean_bg = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_bg[-1] * weight_bg - mean_bg * weight_bg[-1]) ** 2 / (weight_bg * weight_fg)
+    return int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+
+
+def binarize(img):
+    """Grayscale, stretch contrast and threshold to black text on white."""
+    from PIL import ImageOps
+    gray = ImageOps.autocontrast(img.convert("L"), cutoff=1)
+    threshold = otsu_threshold(gray.histogram())
+    binary = gray.point(lambda p: 255 if p > threshold else 0)
+    # Light text on a dark background: invert so ink is the minority, as Tesseract expects
+    if binary.histogram()[0] > binary.width * binary.height / 2:
+        binary = ImageOps.invert(binary)
+    return binary
+
+
+# -------------------------------------------------
+# TILING
+# -------------------------------------------------
+def blank_runs(img) -> List[Tuple[int, int]]:
+    """(start, end) of runs of rows without ink, the safe places to cut between text lines."""
+    import numpy as np
+    gray = np.asarray(img.convert("L"))
+    threshold = otsu_threshold(np.bincount(gray.ravel(), minlength=256).tolist())
+    ink = gray <= threshold
+    if ink.mean() > 0.5:
+        ink = ~ink
+    blank = ~ink.any(axis=1)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], blank.astype(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def plan_bands(height: int, blanks: List[Tuple[int, int]], target: int = OCR_TILE_HEIGHT) -> List[Tuple[int, int]]:
+    """Cut points near every `target` rows, snapped to the middle of a blank run."""
+    midpoints = [(s + e) // 2 for s, e in blanks]
+    bounds, start = [], 0
+    while height - start > target * 1.5:
+        ideal = start + target
+        window = [m for m in midpoints if start + target * 0.5 <= m <= start + target * 1.5]
+        cut = min(window, key=lambda m: abs(m - ideal)) if window else ideal
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, height))
+    return bounds
+
+
+def prepare(path: str, preprocess: bool = True):
+    """Load, optionally preprocess, and cut an image into bands; returns (result, tile images)."""
+    img = load_image(path)
+    scale = 1.0
+    if preprocess:
+        img, scale = rescale(img)
+        img = binarize(img)
+    bands = [(0, img.height)]
+    if img.height > OCR_TILE_HEIGHT * 1.5:
+        bands = plan_bands(img.height, blank_runs(img))
+    result = OcrResult(path, img.size, scale, preprocess,
+                       [OcrTile(i, top, bottom) for i, (top, bottom) in enumerate(bands)])
+    tiles = [img.crop((0, top, img.width, bottom)) for top, bottom in bands]
+    return result, tiles
+
+
+# -------------------------------------------------
+# RECOGNITION
+# -------------------------------------------------
+def ocr_tile(tile, language: str, config: str = OCR_TESSERACT_CONFIG) -> Tuple[str, Optional[float]]:
+    """Text of one tile, laid out by Tesseract block/paragraph/line, and its mean word confidence."""
+    import pytesseract
+    data = pytesseract.image_to_data(tile, lang=language, config=config, output_type=pytesseract.Output.DICT)
+    lines, confidences, previous = [], [], None
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if line != previous:
+            if previous is not None and line[:2] != previous[:2]:
+                lines.append("")
+            lines.append(word)
+            previous = line
+        else:
+            lines[-1] += " " + word
+        confidence = float(data["conf"][i])
+        if confidence >= 0:
+            confidences.append(confidence)
+    mean = round(sum(confidences) / len(confidences), 1) if confidences else None
+    return "\n".join(lines), mean
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server can copy held locks into the child
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"OCR process pool started with {OCR_WORKERS} workers")
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def ocr_images(paths: List[str], language: str = "eng", preprocess: bool = True) -> List[OcrResult]:
+    """
+    OCR one or more images. Every tile of every image is recognised in the
+    process pool when there is more than one; a single tile runs inline.
+    """
+    started = time.perf_counter()
+    prepared = [prepare(path, preprocess) for path in paths]
+    jobs = [(result, tile, image) for result, images in prepared for tile, image in zip(result.tiles, images)]
+    if len(jobs) > 1 and OCR_WORKERS > 1:
+        try:
+            futures = [_get_pool().submit(ocr_tile, image, language) for _, _, image in jobs]
+            outputs = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            logger.warning(f"OCR process pool failed ({e}); recognising tiles inline")
+            shutdown_pool()
+            outputs = [ocr_tile(image, language) for _, _, image in jobs]
+    else:
+        outputs = [ocr_tile(image, language) for _, _, image in jobs]
+    for (_, tile, _), (text, confidence) in zip(jobs, outputs):
+        tile.text, tile.confidence = text, confidence
+    results = [result for result, _ in prepared]
+    logger.info(f"OCR of {len(paths)} image(s), {len(jobs)} tile(s) in {time.perf_counter() - started:.2f}s: "
+                + ", ".join(f"{os.path.basename(r.path)} conf {r.confidence}" for r in results))
+    return results
@@ -0,0 +1,149 @@
+import csv
+import hashlib
+import io
+import os
+import re
+from typing import List, Tuple
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from logger_config import get_logger, PAGES_DIR, PROJECT_ROOT
+
+logger = get_logger("page_extractor")
+
+# Character budget for the extracted page handed to the LLM
+PAGE_EXTRACT_MAX_CHARS = int(os.getenv("PAGE_EXTRACT_MAX_CHARS", "12000"))
+
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "iframe", "head"]
+BLOCK_TAGS = {"p", "div", "section", "article", "li", "br", "h1", "h2", "h3", "h4", "h5", "h6",
+              "pre", "blockquote", "tr", "header", "footer", "main", "form", "ul", "ol", "dd", "dt"}
+FILE_EXTENSIONS = {
+    ".csv", ".json", ".xlsx", ".xls", ".pdf", ".zip", ".txt", ".tsv", ".parquet", ".xml",
+    ".mp3", ".wav", ".m4a", ".ogg", ".opus", ".flac", ".webm", ".mp4",
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff", ".webp",
+}
+
+
+def save_raw_html(url: str, html: str) -> str:
+    """Keep the full HTML under data/pages/ and return its project-relative path."""
+    name = hashlib.sha256(f"{url}\n{html}".encode()).hexdigest()[:16]
+    path = PAGES_DIR / f"{name}.html"
+    if not path.exists():
+        path.write_text(html, encoding="utf-8")
+    return str(path.relative_to(PROJECT_ROOT))
+
+
+def _is_file_link(url: str) -> bool:
+    path = url.split("?", 1)[0].split("#", 1)[0].lower()
+    return os.path.splitext(path)[1] in FILE_EXTENSIONS
+
+
+def _table_csv(table) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in table.find_all("tr"):
+        writer.writerow(cell.get_text(" ", strip=True) for cell in row.find_all(["th", "td"]))
+    return buffer.getvalue().strip()
+
+
+def _visible_text(soup) -> str:
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+    text = soup.get_text()
+    lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _fit(sections: List[Tuple[str, str]], budget: int, raw_path: str) -> str:
+    """
+    Share the budget between sections: small sections are kept whole and the
+    largest ones split what is left, each cut with a pointer to the raw HTML.
+    """
+    order = sorted(range(len(sections)), key=lambda i: len(sections[i][1]))
+    remaining, kept = budget, {}
+    for n, i in enumerate(order):
+        body = sections[i][1]
+        share = remaining // (len(order) - n)
+        if len(body) > share:
+            body = body[:share] + f"\n... [{len(body) - share} chars omitted; full page in {raw_path}]"
+        kept[i] = body
+        remaining -= min(len(sections[i][1]), share)
+    return "\n\n".join(f"## {title}\n{kept[i]}" for i, (title, _) in enumerate(sections))
+
+
+def extract_page(url: str, html: str, max_chars: int = PAGE_EXTRACT_MAX_CHARS) -> str:
+    """
+    Turn a page into a compact, LLM-friendly digest.
+
+    Sections: visible text (tables replaced by placeholders), forms with their
+    absolute submit endpoints and fields, tables as CSV, a manifest of media
+    and file links, and the remaining links with absolute URLs. The raw HTML
+    is written under data/pages/ and its path is included in the digest.
+    """
+    raw_path = save_raw_html(url, html)
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    base = soup.find("base", href=True)
+    base_url = urljoin(url, base["href"]) if base else url
+
+    # Media and file manifest
+    media, seen = [], set()
+    for tag in soup.find_all(["audio", "video", "source", "img", "a", "embed", "object"]):
+        src = tag.get("src") or tag.get("data") or (tag.get("href") if tag.name == "a" else None)
+        if not src or src.startswith(("javascript:", "mailto:", "#")):
+            continue
+        absolute = urljoin(base_url, src)
+        if tag.name == "a" and not _is_file_link(absolute):
+            continue
+        if absolute in seen:
+            continue
+        seen.add(absolute)
+        label = tag.get("alt") or tag.get("title") or tag.get_text(" ", strip=True)
+        media.append(f"- [{tag.name}] {absolute}" + (f" ({label})" if label else ""))
+
+    # Forms and their submit endpoints
+    forms = []
+    for form in soup.find_all("form"):
+        action = urljoin(base_url, form.get("action") or url)
+        fields = [
+            f"{field.get('name')}={field.get('type', field.name)}"
+            + (f" (value: {field.get('value')})" if field.get("value") else "")
+            for field in form.find_all(["input", "select", "textarea", "button"]) if field.get("name")
+        ]
+        forms.append(f"- {form.get('method', 'get').upper()} {action}" + (f" fields: {', '.join(fields)}" if fields else ""))
+
+    # Tables as CSV, replaced by placeholders in the text
+    tables = []
+    for n, table in enumerate(soup.find_all("table"), 1):
+        tables.append(f"[table {n}]\n{_table_csv(table)}")
+        table.replace_with(f"\n[table {n}]\n")
+
+    # Remaining navigational links
+    links, seen_links = [], set()
+    for a in soup.find_all("a", href=True):
+        absolute = urljoin(base_url, a["href"])
+        if absolute in seen or absolute in seen_links or a["href"].startswith(("javascript:", "#")):
+            continue
+        seen_links.add(absolute)
+        text = a.get_text(" ", strip=True)
+        links.append(f"- {text} -> {absolute}" if text else f"- {absolute}")
+
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    text = _visible_text(soup)
+
+    sections = [("Text", text or "(no visible text)")]
+    if forms:
+        sections.append(("Forms", "\n".join(forms)))
+    if tables:
+        sections.append(("Tables (CSV)", "\n\n".join(tables)))
+    if media:
+        sections.append(("Media and files", "\n".join(media)))
+    if links:
+        sections.append(("Links", "\n".join(links)))
+
+    header = f"# {title or url}\nURL: {url}\nRaw HTML ({len(html)} chars): {raw_path}\n\n"
+    digest = header + _fit(sections, max(max_chars - len(header), 500), raw_path)
+    logger.info(f"Extracted {url}: {len(html)} chars of HTML -> {len(digest)} chars "
+                f"({len(tables)} tables, {len(forms)} forms, {len(media)} media/files, {len(links)} links)")
+    return digest
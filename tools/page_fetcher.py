@@ -0,0 +1,254 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup
+from logger_config import get_logger
+from jobs import record_job_metric
+from metrics import Histogram, LATENCY_BUCKETS, observe_download
+from .browser_pool import browser_pool
+from .http_client import get_async_client, get_client
+
+logger = get_logger("page_fetcher")
+
+# "auto" tries a plain GET first; "render" always uses Chromium (the old behaviour)
+FETCH_MODE = os.getenv("FETCH_MODE", "auto")
+# How long a per-pattern "needs JavaScript" decision is trusted
+FETCH_DECISION_TTL_SECONDS = float(os.getenv("FETCH_DECISION_TTL_SECONDS", "3600"))
+# Pages with scripts but less visible text than this are assumed to be built client-side
+FETCH_MIN_TEXT_CHARS = int(os.getenv("FETCH_MIN_TEXT_CHARS", "200"))
+
+STATIC, RENDER = "static", "render"
+
+# Content types whose bodies are returned as text when they are not HTML
+TEXT_TYPES = ("text/", "json", "xml", "javascript", "csv", "yaml")
+
+# Inline script calls that build or rewrite the DOM after load
+DOM_MUTATION = re.compile(
+    r"innerHTML|outerHTML|insertAdjacentHTML|document\.write|appendChild|replaceChildren"
+    r"|textContent\s*=|innerText\s*=|createElement|\batob\s*\(|\bfetch\s*\(|XMLHttpRequest"
+)
+APP_ROOT_IDS = {"root", "app", "__next", "__nuxt", "svelte", "main-app"}
+NOSCRIPT_HINT = re.compile(r"enable javascript|requires javascript|javascript is (disabled|required)", re.I)
+# Path segments that vary between otherwise identical pages (ids, hashes, numbers)
+VARIABLE_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8,}|[0-9a-f-]{36})$", re.I)
+
+FETCH_SECONDS = Histogram("agent_fetch_seconds", "Page fetch wall time by tier", LATENCY_BUCKETS)
+
+
+@dataclass
+class FetchResult:
+    html: str
+    tier: str        # "static" or "render"
+    seconds: float
+    reason: str      # why this tier was used
+    is_html: bool = True
+
+
+def url_pattern(url: str) -> str:
+    """host + path with variable segments collapsed, e.g. quiz.example/q/* for /q/834."""
+    parts = urlsplit(url)
+    segments = ["*" if VARIABLE_SEGMENT.match(s) else s for s in parts.path.split("/")]
+    return f"{parts.netloc}{'/'.join(segments)}"
+
+
+def _looks_like_html(response) -> bool:
+    content_type = response.headers.get("content-type", "")
+    if "html" in content_type:
+        return True
+    if content_type and "octet-stream" not in content_type:
+        return False
+    # Missing or generic content type: sniff the start of the body
+    head = response.content[:256].lstrip().lower()
+    return head.startswith((b"<!doctype html", b"<html"))
+
+
+def _looks_like_text(response) -> bool:
+    content_type = response.headers.get("content-type", "").lower()
+    if content_type and "octet-stream" not in content_type:
+        return any(t in content_type for t in TEXT_TYPES)
+    head = response.content[:1024]
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still text
+        return e.start >= len(head) - 3
+    return True
+
+
+def _binary_notice(url: str, response) -> str:
+    content_type = response.headers.get("content-type", "") or "unknown type"
+    return (f"{url} is not a web page: {content_type}, {len(response.content)} bytes of binary content. "
+            "Use download_file to save it, then open the file with analyze_image, transcribe_audio or run_code.")
+
+
+def render_reason(html: str) -> Optional[str]:
+    """
+    Return why a statically fetched page still needs JavaScript, or None if complete.
+
+    Signals: inline scripts that write into the DOM (the usual quiz pattern of
+    decoding content into an empty div), empty single-page-app mount points,
+    <noscript> warnings, and script-heavy pages with almost no visible text.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    scripts = soup.find_all("script")
+    for script in scripts:
+        if not script.get("src") and DOM_MUTATION.search(script.get_text()):
+            return "inline script mutates the DOM"
+    for element in soup.find_all(id=True):
+        if element.get("id") in APP_ROOT_IDS and not element.get_text(strip=True) and not element.find(True):
+            return f"empty app root #{element['id']}"
+    for noscript in soup.find_all("noscript"):
+        if NOSCRIPT_HINT.search(noscript.get_text()):
+            return "page asks for JavaScript"
+    if scripts:
+        for tag in soup(["script", "style", "noscript", "template"]):
+            tag.decompose()
+        if len(soup.get_text(" ", strip=True)) < FETCH_MIN_TEXT_CHARS:
+            return "scripts present but little visible text"
+    return None
+
+
+class PageFetcher:
+    """
+    Tiered page fetcher: plain HTTP GET first, Chromium only when needed.
+
+    The static response is checked for signs of client-side rendering and
+    escalated to the browser pool if any are found. A page found to be built
+    client-side marks its host/path pattern, so later pages of the pattern
+    skip the wasted GET. Failed GETs and error statuses escalate only the
+    call at hand: a timeout or a one-off 503 says nothing about the pattern.
+    Non-HTML text (JSON, CSV) is returned as is; binary bodies are replaced
+    by a notice pointing to download_file.
+    """
+
+    def __init__(self, mode: str = FETCH_MODE, ttl: float = FETCH_DECISION_TTL_SECONDS):
+        self.mode = mode
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._decisions = {}  # pattern -> (RENDER, decided_at)
+        # Running average of browser render time, used to report time saved
+        self._render_avg: Optional[float] = None
+
+    # -------------------------------------------------
+    # DECISIONS
+    # -------------------------------------------------
+    def _cached_tier(self, pattern: str) -> Optional[str]:
+        if self.mode == RENDER:
+            return RENDER
+        with self._lock:
+            decision = self._decisions.get(pattern)
+        if decision and time.time() - decision[1] < self.ttl:
+            return decision[0]
+        return None
+
+    def _remember(self, pattern: str, tier: str) -> None:
+        with self._lock:
+            self._decisions[pattern] = (tier, time.time())
+
+    def _static_verdict(self, response) -> Tuple[Optional[str], bool]:
+        """
+        (why the static response can't be used as-is or None if it can,
+        whether that holds for every page of the URL's pattern).
+        """
+        if response.status_code >= 400:
+            return f"HTTP {response.status_code}", False
+        if not _looks_like_html(response):
+            return None, False
+        reason = render_reason(response.text)
+        return reason, reason is not None
+
+    def _static_result(self, url: str, pattern: str, response, started: float) -> FetchResult:
+        if _looks_like_html(response):
+            return self._finish(url, pattern, response.text, STATIC, started, "complete without JavaScript")
+        if _looks_like_text(response):
+            body = response.text
+        else:
+            body = _binary_notice(url, response)
+        result = self._finish(url, pattern, body, STATIC, started, "not HTML", size=len(response.content))
+        result.is_html = False
+        return result
+
+    def _render_done(self, seconds: float) -> None:
+        with self._lock:
+            self._render_avg = seconds if self._render_avg is None else 0.8 * self._render_avg + 0.2 * seconds
+
+    def _finish(self, url: str, pattern: str, html: str, tier: str, started: float, reason: str,
+                size: Optional[int] = None) -> FetchResult:
+        seconds = time.perf_counter() - started
+        FETCH_SECONDS.observe(seconds, tier=tier)
+        if tier == RENDER:
+            self._render_done(seconds)
+            logger.info(f"Fetched {url} via {tier} in {seconds:.2f}s ({reason})")
+        else:
+            observe_download("network", len(html.encode()) if size is None else size)
+            saved = max((self._render_avg or 0.0) - seconds, 0.0)
+            record_job_metric("render_seconds_saved", saved)
+            logger.info(f"Fetched {url} via {tier} in {seconds:.2f}s "
+                        f"(saved ~{saved:.2f}s vs rendering, pattern {pattern})")
+        return FetchResult(html, tier, seconds, reason)
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    def fetch(self, url: str) -> FetchResult:
+        started = time.perf_counter()
+        pattern = url_pattern(url)
+        cached = self._cached_tier(pattern)
+        if cached != RENDER:
+            try:
+                response = get_client().get(url)
+                reason, for_pattern = self._static_verdict(response)
+            except Exception as e:
+                reason, for_pattern = f"plain GET failed: {e}", False
+            if reason is None:
+                return self._static_result(url, pattern, response, started)
+            logger.info(f"Escalating {url} to the browser after {time.perf_counter() - started:.2f}s: {reason}")
+            if for_pattern:
+                self._remember(pattern, RENDER)
+        else:
+            reason = "cached decision" if self.mode != RENDER else "FETCH_MODE=render"
+        html = browser_pool.render(url, wait_until="networkidle")
+        observe_download("browser", len(html.encode()))
+        return self._finish(url, pattern, html, RENDER, started, reason)
+
+    async def afetch(self, url: str) -> FetchResult:
+        """Async twin of fetch."""
+        started = time.perf_counter()
+        pattern = url_pattern(url)
+        cached = self._cached_tier(pattern)
+        if cached != RENDER:
+            try:
+                response = await get_async_client().get(url)
+                reason, for_pattern = self._static_verdict(response)
+            except Exception as e:
+                reason, for_pattern = f"plain GET failed: {e}", False
+            if reason is None:
+                return self._static_result(url, pattern, response, started)
+            logger.info(f"Escalating {url} to the browser after {time.perf_counter() - started:.2f}s: {reason}")
+            if for_pattern:
+                self._remember(pattern, RENDER)
+        else:
+            reason = "cached decision" if self.mode != RENDER else "FETCH_MODE=render"
+        html = await browser_pool.arender(url, wait_until="networkidle")
+        observe_download("browser", len(html.encode()))
+        return self._finish(url, pattern, html, RENDER, started, reason)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.time()
+            patterns = sum(1 for _, decided_at in self._decisions.values() if now - decided_at < self.ttl)
+            avg = self._render_avg
+        return {
+            "mode": self.mode,
+            "patterns_render": patterns,
+            "avg_render_seconds": round(avg, 3) if avg is not None else None,
+        }
+
+
+page_fetcher = PageFetcher()
@@ -0,0 +1,129 @@
+import os
+import signal
+import subprocess
+import threading
+from pathlib import Path
+from typing import IO, Optional
+from logger_config import get_logger
+
+logger = get_logger("process_limits")
+
+# Limits applied to every run_code snippet (overridable through the environment)
+RUN_CODE_TIMEOUT_SECONDS = float(os.getenv("RUN_CODE_TIMEOUT_SECONDS", "120"))
+RUN_CODE_MAX_MEMORY_MB = int(os.getenv("RUN_CODE_MAX_MEMORY_MB", "2048"))
+# Threads each numpy/OpenBLAS/OpenMP pool may start in a snippet (0 = library default, one per core)
+RUN_CODE_MAX_THREADS = int(os.getenv("RUN_CODE_MAX_THREADS", "4"))
+RUN_CODE_MAX_OUTPUT_CHARS = int(os.getenv("RUN_CODE_MAX_OUTPUT_CHARS", "50000"))
+
+READ_CHUNK = 8192
+TAIL_CHARS = 2000
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_MAX_THREADS")
+
+
+def apply_rlimits(cpu_seconds: Optional[float] = None) -> None:
+    """
+    preexec_fn for snippet processes: cap data memory and, optionally, CPU time.
+
+    RLIMIT_DATA counts heap and writable private mappings, not reserved
+    address space, so the per-thread arenas numpy/OpenBLAS map at import do
+    not trip it on many-core hosts. Exceeding the memory cap surfaces as
+    MemoryError inside Python; exceeding the CPU cap delivers SIGXCPU and
+    terminates the process.
+    """
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return
+    if RUN_CODE_MAX_MEMORY_MB > 0:
+        limit = RUN_CODE_MAX_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds) + 1, resource.RLIM_INFINITY))
+
+
+def snippet_env(env: dict) -> dict:
+    """Environment for snippet processes: BLAS/OpenMP pools capped at RUN_CODE_MAX_THREADS unless set."""
+    env = dict(env)
+    if RUN_CODE_MAX_THREADS > 0:
+        for name in THREAD_VARIABLES:
+            env.setdefault(name, str(RUN_CODE_MAX_THREADS))
+    return env
+
+
+def kill_process_tree(pid: int) -> None:
+    """Kill a process and everything it spawned (it must lead its own session)."""
+    try:
+        os.killpg(os.getpgid(pid), signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except AttributeError:  # No process groups on Windows
+        subprocess.call(["taskkill", "/F", "/T", "/PID", str(pid)])
+
+
+class OutputCapture:
+    """
+    Incrementally collect process output, keeping at most max_chars.
+
+    The head of the output is kept up to the cap, plus a short rolling tail so
+    the final traceback line is never lost. Callers must keep reading the pipe
+    to EOF so the child never blocks on a full buffer; everything in between
+    is only counted, not stored.
+    """
+
+    def __init__(self, max_chars: int = RUN_CODE_MAX_OUTPUT_CHARS):
+        self.max_chars = max_chars
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        room = self.max_chars - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self.tail = (self.tail + chunk)[-TAIL_CHARS:]
+
+    def text(self) -> str:
+        return capped_text(bytes(self.head), bytes(self.tail), self.total)
+
+
+def drain_in_thread(stream: IO[bytes], capture: OutputCapture) -> threading.Thread:
+    """Read a pipe into an OutputCapture on a daemon thread until EOF."""
+    def _drain():
+        for chunk in iter(lambda: stream.read1(READ_CHUNK), b""):
+            capture.feed(chunk)
+
+    thread = threading.Thread(target=_drain, daemon=True)
+    thread.start()
+    return thread
+
+
+def capped_text(head: bytes, tail: bytes, total: int) -> str:
+    omitted = total - len(head) - len(tail)
+    text = head.decode(errors="replace")
+    if omitted > 0:
+        text += f"\n... [output truncated: {omitted} bytes omitted] ...\n"
+    return text + tail.decode(errors="replace")
+
+
+def read_capped_file(path: Path, max_chars: int = RUN_CODE_MAX_OUTPUT_CHARS) -> str:
+    """Read a captured output file, keeping its head and tail within the cap."""
+    if not path.exists():
+        return ""
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        head = f.read(max_chars)
+        tail = b""
+        if size > len(head):
+            f.seek(max(len(head), size - TAIL_CHARS))
+            tail = f.read()
+    return capped_text(head, tail, size)
+
+
+def looks_like_oom(return_code: Optional[int], stderr: str, killed_by_us: bool) -> bool:
+    """Heuristic: MemoryError from the memory cap or a SIGKILL we did not send."""
+    if "MemoryError" in stderr:
+        return True
+    return return_code == -signal.SIGKILL and not killed_by_us
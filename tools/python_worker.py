@@ -0,0 +1,165 @@
+"""
+Warm Python interpreter used by run_code.
+
+This file is executed as a script by worker_pool.py and run_code.py, so it
+only uses the standard library. In pool mode it imports the common data-science modules
+once, then reads one JSON request per line on stdin, runs the referenced
+script in a fresh namespace with stdout/stderr redirected to the given files,
+and answers with one JSON line. In --once mode it runs a single script like
+`python script.py` would and reports its execution time on stderr.
+"""
+import importlib
+import json
+import os
+import site
+import sys
+import time
+import traceback
+
+TIMING_MARKER = "__RUN_CODE_TIMING__"
+DEFAULT_PRELOAD = "numpy,pandas"
+
+
+def _current_rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _cpu_seconds() -> float:
+    """User + system CPU of this interpreter and its waited-for children."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _execute(path: str) -> int:
+    """Run a script in an isolated namespace and return its exit code."""
+    namespace = {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__}
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    sys.argv = [path]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    # add_dependencies may have installed packages into the overlay since the last snippet
+    importlib.invalidate_caches()
+    try:
+        with open(path) as f:
+            code = compile(f.read(), path, "exec")
+        exec(code, namespace)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # Skip this harness frame so the traceback starts at the user's script
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+
+
+def _limit_cpu(seconds) -> None:
+    """Allow this run `seconds` more CPU time on top of what the worker already used."""
+    if not seconds:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _redirect(fd: int, path: str) -> int:
+    saved = os.dup(fd)
+    target = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(target, fd)
+    os.close(target)
+    return saved
+
+
+def _restore(fd: int, saved: int) -> None:
+    os.dup2(saved, fd)
+    os.close(saved)
+
+
+def serve() -> None:
+    # Keep private copies of the real stdin/stdout for the protocol so user code
+    # reading stdin or writing to fd 1 cannot corrupt it
+    requests = os.fdopen(os.dup(0), "r")
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    cwd = os.getcwd()
+
+    preloaded = []
+    for name in filter(None, os.getenv("RUN_CODE_PRELOAD", DEFAULT_PRELOAD).split(",")):
+        try:
+            __import__(name.strip())
+            preloaded.append(name.strip())
+        except Exception:
+            pass
+    protocol.write(json.dumps({"ready": True, "preloaded": preloaded}) + "\n")
+
+    for line in requests:
+        request = json.loads(line)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_out = _redirect(1, request["stdout"])
+        saved_err = _redirect(2, request["stderr"])
+        _limit_cpu(request.get("cpu_seconds"))
+        started, cpu_started = time.perf_counter(), _cpu_seconds()
+        try:
+            return_code = _execute(request["path"])
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _restore(1, saved_out)
+            _restore(2, saved_err)
+            os.chdir(cwd)
+        protocol.write(json.dumps({
+            "return_code": return_code,
+            "exec_seconds": time.perf_counter() - started,
+            "cpu_seconds": _cpu_seconds() - cpu_started,
+            "rss_kb": _current_rss_kb(),
+        }) + "\n")
+
+
+def run_once(path: str) -> int:
+    started, cpu_started = time.perf_counter(), _cpu_seconds()
+    return_code = _execute(path)
+    sys.stdout.flush()
+    timing = {"exec_seconds": time.perf_counter() - started, "cpu_seconds": _cpu_seconds() - cpu_started}
+    print(f"{TIMING_MARKER} {json.dumps(timing)}", file=sys.stderr)
+    return return_code
+
+
+if __name__ == "__main__":
+    # Drop this file's directory from sys.path so user code cannot shadow-import tools/
+    sys.path.pop(0)
+    # Packages installed by add_dependencies, after site-packages so they never shadow the project's
+    if os.getenv("DEPS_OVERLAY_DIR"):
+        site.addsitedir(os.environ["DEPS_OVERLAY_DIR"])
+    if len(sys.argv) == 3 and sys.argv[1] == "--once":
+        sys.exit(run_once(sys.argv[2]))
+    serve()
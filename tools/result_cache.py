@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from logger_config import get_logger, CACHE_DIR
+
+logger = get_logger("result_cache")
+
+# Cache configuration (overridable through the environment)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_error(value: str) -> bool:
+    return value.startswith("Error")
+
+
+class ResultCache:
+    """
+    Persistent cache of expensive media results (transcripts, OCR text).
+
+    Keys combine the SHA-256 of the media bytes with the parameters that
+    affect the result (kind, model, language, operation...), so the same file
+    under another name or URL still hits. Entries expire after the TTL and the
+    least recently used ones are evicted when the cache exceeds its size cap.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR / "results.sqlite", enabled: bool = RESULT_CACHE_ENABLED,
+                 ttl: float = RESULT_CACHE_TTL_SECONDS, max_mb: int = RESULT_CACHE_MAX_MB):
+        self.path = path
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0}
+        with closing(self._connect()) as db, db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def make_key(kind: str, sha256: str, params: dict) -> str:
+        return hashlib.sha256(f"{kind}\n{sha256}\n{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+
+    # -------------------------------------------------
+    # STORE
+    # -------------------------------------------------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            row = db.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, kind: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode())
+        with closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                       (key, kind, value, size, now, now))
+            db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop least recently used entries until the cache fits again
+                for old_key, old_size in db.execute(
+                    "SELECT key, size FROM results WHERE key != ? ORDER BY last_access", (key,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= old_size
+        self._count("stored")
+
+    # -------------------------------------------------
+    # MEMOISATION
+    # -------------------------------------------------
+    def lookup(self, kind: str, media_path: str, params: dict, use_cache: bool):
+        """Return (key, cached value or None); key is None when caching is off."""
+        if not self.enabled:
+            return None, None
+        started = time.perf_counter()
+        key = self.make_key(kind, file_sha256(media_path), params)
+        if not use_cache:
+            self._count("bypassed")
+            logger.info(f"Result cache bypassed for {kind} of {media_path}")
+            return key, None
+        value = self.get(key)
+        if value is None:
+            self._count("misses")
+            return key, None
+        self._count("hits")
+        logger.info(f"Result cache hit for {kind} of {media_path} "
+                    f"({len(value)} chars in {(time.perf_counter() - started) * 1000:.1f} ms)")
+        return key, value
+
+    def cached(self, kind: str, media_path: str, params: dict, compute: Callable[[], str],
+               use_cache: bool = True) -> str:
+        """
+        Return the cached result for this media file and params, or compute and store it.
+
+        use_cache=False skips the lookup but still stores the fresh result.
+        Error strings are never stored.
+        """
+        key, value = self.lookup(kind, media_path, params, use_cache)
+        if value is not None:
+            return value
+        value = compute()
+        if key is not None and not _is_error(value):
+            self.put(key, kind, value)
+        return value
+
+    async def acached(self, kind: str, media_path: str, params: dict, compute: Callable[[], Awaitable[str]],
+                      use_cache: bool = True) -> str:
+        """Async twin of cached; hashing and SQLite access run in a thread."""
+        key, value = await asyncio.to_thread(self.lookup, kind, media_path, params, use_cache)
+        if value is not None:
+            return value
+        value = await compute()
+        if key is not None and not _is_error(value):
+            await asyncio.to_thread(self.put, key, kind, value)
+        return value
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as db:
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"enabled": self.enabled, "entries": entries, "size_bytes": size, "max_bytes": self.max_bytes})
+        return stats
+
+
+result_cache = ResultCache()
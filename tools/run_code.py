@@ -1,13 +1,24 @@
-from google import genai
+import asyncio
+import json
+import logging
 import subprocess
+import time
+import uuid
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
-from google.genai import types
 from logger_config import get_logger, CODE_WORKSPACE_DIR, PROJECT_ROOT
+from metrics import observe_subprocess_cpu
+from deadlines import cap_timeout
+from .python_worker import TIMING_MARKER
+from .dependency_broker import overlay_env
+from .worker_pool import worker_pool, WORKER_SCRIPT
+from .process_limits import (
+    RUN_CODE_TIMEOUT_SECONDS, READ_CHUNK, OutputCapture, apply_rlimits,
+    drain_in_thread, kill_process_tree, looks_like_oom, snippet_env
+)
 
 load_dotenv()
-client = genai.Client()
 logger = get_logger("run_code")
 
 def strip_code_fences(code: str) -> str:
@@ -20,6 +31,161 @@ def strip_code_fences(code: str) -> str:
         code = code.rsplit("\n", 1)[0]
     return code.strip()
 
+def _write_runner(code: str):
+    logger.info("Code execution requested")
+    logger.info(f"Code length: {len(code)} characters")
+    
+    # A unique file per invocation so concurrent agents never overwrite each other
+    filename = f"runner_{uuid.uuid4().hex[:12]}.py"
+    filepath = CODE_WORKSPACE_DIR / filename
+   
+    logger.info(f"Writing code to: {filepath}")
+    with open(filepath, "w") as f:
+        f.write(code)
+    return filepath
+
+def _runner_command(filepath) -> list:
+    # The worker script in --once mode runs the file like `python runner.py`
+    # and reports the execution time, so interpreter startup can be measured
+    logger.info("Executing code with 'uv run' from project root...")
+    logger.info(f"Working directory: {PROJECT_ROOT}")
+    return [
+        "uv", "run", str(WORKER_SCRIPT.relative_to(PROJECT_ROOT)),
+        "--once", str(filepath.relative_to(PROJECT_ROOT))
+    ]
+
+def _split_timing(stderr: str, total_seconds: float):
+    """Strip the timing line appended by --once mode; return (stderr, startup, exec, cpu)."""
+    head, sep, tail = stderr.rpartition(TIMING_MARKER)
+    if not sep:
+        return stderr, None, total_seconds, None
+    try:
+        timing = json.loads(tail)
+        exec_seconds = timing["exec_seconds"]
+    except (ValueError, KeyError):
+        return stderr, None, total_seconds, None
+    return head, max(total_seconds - exec_seconds, 0.0), exec_seconds, timing.get("cpu_seconds")
+
+def _log_timing(mode: str, startup_seconds, exec_seconds: float, cpu_seconds=None) -> None:
+    startup = f"{startup_seconds:.2f}s" if startup_seconds is not None else "n/a"
+    cpu = f"{cpu_seconds:.2f}s" if cpu_seconds is not None else "n/a"
+    logger.info(f"Timing ({mode}): startup {startup}, execution {exec_seconds:.2f}s, CPU {cpu}")
+    if cpu_seconds is not None:
+        observe_subprocess_cpu("run_code", cpu_seconds)
+
+def _result(stdout: str, stderr: str, return_code: int,
+            timed_out: bool = False, oom_killed: bool = False) -> dict:
+    # A single record per execution, so output previews from parallel jobs never interleave
+    lines = [f"Execution complete. Return code: {return_code}"]
+    if timed_out:
+        lines.append("Execution timed out; process tree killed")
+    if oom_killed:
+        lines.append("Execution ran out of memory")
+    if stdout:
+        lines.append(f"STDOUT ({len(stdout)} chars): {stdout[:200]}..." if len(stdout) > 200 else f"STDOUT: {stdout}")
+    if stderr:
+        lines.append(f"STDERR: {stderr[:200]}..." if len(stderr) > 200 else f"STDERR: {stderr}")
+    level = logging.WARNING if timed_out or oom_killed or stderr else logging.INFO
+    logger.log(level, "\n".join(lines), extra={"event": "run_code_result", "return_code": return_code})
+    
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "return_code": return_code,
+        "timed_out": timed_out,
+        "oom_killed": oom_killed
+    }
+
+def _failure(e: Exception) -> dict:
+    error_msg = str(e)
+    logger.error(f"Code execution failed: {error_msg}")
+    return {
+        "stdout": "",
+        "stderr": error_msg,
+        "return_code": -1,
+        "timed_out": False,
+        "oom_killed": False
+    }
+
+def _cold_result(stdout: str, stderr: str, return_code: int, timed_out: bool, total_seconds: float) -> dict:
+    stderr, startup_seconds, exec_seconds, cpu_seconds = _split_timing(stderr, total_seconds)
+    _log_timing("cold", startup_seconds, exec_seconds, cpu_seconds)
+    if timed_out:
+        stderr += f"\nTimed out after {total_seconds:.0f}s"
+    return _result(stdout, stderr, return_code, timed_out,
+                   looks_like_oom(return_code, stderr, killed_by_us=timed_out))
+
+def _run_warm(filepath, timeout: float):
+    """Run on a pre-started interpreter; None means fall back to the cold path."""
+    warm = worker_pool.run(filepath, timeout)
+    if warm is None:
+        return None
+    _log_timing("warm", warm["startup_seconds"], warm["exec_seconds"], warm["cpu_seconds"])
+    return _result(warm["stdout"], warm["stderr"], warm["return_code"],
+                   warm["timed_out"], warm["oom_killed"])
+
+def _run_cold(filepath, timeout: float) -> dict:
+    started = time.perf_counter()
+    # Run from project root so data/ paths work correctly; a new session lets
+    # a timeout kill the whole process tree (uv, python and any children)
+    proc = subprocess.Popen(
+        _runner_command(filepath),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=str(PROJECT_ROOT),  # Run from project root
+        env=snippet_env(overlay_env()),  # shared overlay, capped BLAS threads
+        start_new_session=True,
+        preexec_fn=lambda: apply_rlimits(cpu_seconds=timeout)
+    )
+    stdout, stderr = OutputCapture(), OutputCapture()
+    readers = [drain_in_thread(proc.stdout, stdout), drain_in_thread(proc.stderr, stderr)]
+    
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        kill_process_tree(proc.pid)
+        proc.wait()
+    for reader in readers:
+        reader.join(timeout=5)
+    
+    return _cold_result(stdout.text(), stderr.text(), proc.returncode, timed_out,
+                        time.perf_counter() - started)
+
+async def _adrain(stream, capture: OutputCapture) -> None:
+    while chunk := await stream.read(READ_CHUNK):
+        capture.feed(chunk)
+
+async def _arun_cold(filepath, timeout: float) -> dict:
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *_runner_command(filepath),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=str(PROJECT_ROOT),  # Run from project root
+        env=snippet_env(overlay_env()),  # shared overlay, capped BLAS threads
+        start_new_session=True,
+        preexec_fn=lambda: apply_rlimits(cpu_seconds=timeout)
+    )
+    stdout, stderr = OutputCapture(), OutputCapture()
+    readers = asyncio.gather(_adrain(proc.stdout, stdout), _adrain(proc.stderr, stderr))
+    
+    timed_out = False
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        kill_process_tree(proc.pid)
+        await proc.wait()
+    try:
+        await asyncio.wait_for(readers, timeout=5)
+    except asyncio.TimeoutError:
+        pass
+    
+    return _cold_result(stdout.text(), stderr.text(), proc.returncode, timed_out,
+                        time.perf_counter() - started)
+
 @tool
 def run_code(code: str) -> dict:
     """
@@ -27,9 +193,15 @@ def run_code(code: str) -> dict:
     This tool:
       1. Takes in python code as input
       3. Writes code into a temporary .py file in the workspace
-      4. Executes the file from project root (so data/ paths work)
+      4. Executes the file from project root (so data/ paths work) on a warm
+         interpreter with pandas/numpy already imported
       5. Returns its output
 
+    Execution is limited in wall-clock time, CPU time, memory and output size.
+    Long-running code is killed and reported with "timed_out": true; code that
+    exhausts memory is reported with "oom_killed": true. Output beyond the cap
+    is truncated.
+
     Parameters
     ----------
     code : str
@@ -41,49 +213,45 @@ def run_code(code: str) -> dict:
         {
             "stdout": <program output>,
             "stderr": <errors if any>,
-            "return_code": <exit code>
+            "return_code": <exit code>,
+            "timed_out": <True if killed for exceeding the time limit>,
+            "oom_killed": <True if it ran out of memory>
         }
     """
+    filepath = None
     try:
-        logger.info("Code execution requested")
-        logger.info(f"Code length: {len(code)} characters")
-        
-        filename = "runner.py"
-        filepath = CODE_WORKSPACE_DIR / filename
-       
-        logger.info(f"Writing code to: {filepath}")
-        with open(filepath, "w") as f:
-            f.write(code)
+        filepath = _write_runner(code)
+        # Never longer than what is left of the quiz task
+        timeout = cap_timeout(RUN_CODE_TIMEOUT_SECONDS)
         
-        logger.info("Executing code with 'uv run' from project root...")
-        logger.info(f"Working directory: {PROJECT_ROOT}")
-        
-        # Run from project root so data/ paths work correctly
-        proc = subprocess.Popen(
-            ["uv", "run", str(filepath.relative_to(PROJECT_ROOT))],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd=str(PROJECT_ROOT)  # Run from project root
-        )
-        stdout, stderr = proc.communicate()
-
-        logger.info(f"Execution complete. Return code: {proc.returncode}")
-        if stdout:
-            logger.info(f"STDOUT ({len(stdout)} chars): {stdout[:200]}..." if len(stdout) > 200 else f"STDOUT: {stdout}")
-        if stderr:
-            logger.warning(f"STDERR: {stderr[:200]}..." if len(stderr) > 200 else f"STDERR: {stderr}")
+        result = _run_warm(filepath, timeout)
+        if result is not None:
+            return result
+        return _run_cold(filepath, timeout)
+    except Exception as e:
+        return _failure(e)
+    finally:
+        if filepath is not None:
+            filepath.unlink(missing_ok=True)
+
+
+async def arun_code(code: str) -> dict:
+    """Async twin of run_code: warm worker in a thread, else an asyncio subprocess."""
+    filepath = None
+    try:
+        filepath = _write_runner(code)
+        # Never longer than what is left of the quiz task
+        timeout = cap_timeout(RUN_CODE_TIMEOUT_SECONDS)
         
-        return {
-            "stdout": stdout,
-            "stderr": stderr,
-            "return_code": proc.returncode
-        }
+        result = await asyncio.to_thread(_run_warm, filepath, timeout)
+        if result is not None:
+            return result
+        return await _arun_cold(filepath, timeout)
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"Code execution failed: {error_msg}")
-        return {
-            "stdout": "",
-            "stderr": error_msg,
-            "return_code": -1
-        }
+        return _failure(e)
+    finally:
+        if filepath is not None:
+            filepath.unlink(missing_ok=True)
+
+
+run_code.coroutine = arun_code
@@ -1,11 +1,69 @@
 from langchain_core.tools import tool
-import requests
+import httpx
 import json
 from typing import Any, Dict, Optional
 from logger_config import get_logger
+from .http_client import get_async_client, get_client
 
 logger = get_logger("post_request")
 
+
+def _log_request(url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> None:
+    # One record per request, so concurrent jobs never interleave inside a payload
+    logger.info(
+        "="*80 + "\nPOST REQUEST\n"
+        f"URL: {url}\n"
+        f"Headers: {json.dumps(headers, indent=2)}\n"
+        f"Payload (JSON):\n{json.dumps(payload, indent=2)}\n" + "-"*80,
+        extra={"event": "post_request", "url": url},
+    )
+
+
+def _process_response(data: Any) -> Any:
+    """Log the quiz server response and apply the resubmission rules."""
+    delay = data.get("delay", 0)
+    delay = delay if isinstance(delay, (int, float)) else 0
+    correct = data.get("correct")
+    message = data.get("message", "")
+    next_url = data.get("url", "")
+    
+    lines = [f"Answer Correct: {correct}", f"Time Elapsed: {delay}s"]
+    if message:
+        lines.append(f"Server Message: {message}")
+    if next_url:
+        lines.append(f"Next URL: {next_url}")
+    lines.append(f"Full Response (JSON):\n{json.dumps(data, indent=2)}\n" + "="*80)
+    logger.info("\n".join(lines), extra={"event": "post_response", "correct": correct, "delay": delay})
+    
+    # Process response according to quiz logic
+    if not correct and delay < 180:
+        data.pop("url", None)
+    if delay >= 180:
+        data = {
+            "url": data.get("url")
+        }
+    
+    return data
+
+
+def _log_http_error(url: str, status_code: int, reason: str, err_resp) -> Any:
+    try:
+        err_data = err_resp.json()
+        body = f"Error Response (JSON):\n{json.dumps(err_data, indent=2)}"
+    except ValueError:
+        err_data = err_resp.text
+        body = f"Error Response (Text): {err_data}"
+    logger.error("="*80 + f"\nHTTP ERROR: {status_code} {reason}\nURL: {url}\n{body}\n" + "="*80,
+                 extra={"event": "post_error", "url": url, "status": status_code})
+    return err_data
+
+
+def _log_unexpected_error(url: str, e: Exception) -> str:
+    logger.error("="*80 + f"\nUNEXPECTED ERROR during POST request\nURL: {url}\nError: {str(e)}\n" + "="*80,
+                 extra={"event": "post_error", "url": url})
+    return str(e)
+
+
 @tool
 def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
     """
@@ -26,82 +84,52 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         returned. Otherwise, the raw text response is returned.
 
     Raises:
-        requests.HTTPError: If the server responds with an unsuccessful status.
-        requests.RequestException: For network-related errors.
+        httpx.HTTPStatusError: If the server responds with an unsuccessful status.
+        httpx.HTTPError: For network-related errors.
     """
     headers = headers or {"Content-Type": "application/json"}
     try:
-        # Log request details with clear separator
-        logger.info("="*80)
-        logger.info("POST REQUEST")
-        logger.info(f"URL: {url}")
-        logger.info(f"Headers: {json.dumps(headers, indent=2)}")
-        logger.info("Payload (JSON):")
-        for line in json.dumps(payload, indent=2).split('\n'):
-            logger.info(f"  {line}")
-        logger.info("-"*80)
+        _log_request(url, payload, headers)
         
-        response = requests.post(url, json=payload, headers=headers)
+        # Pooled client: keep-alive to the quiz host, connect/read timeouts
+        response = get_client().post(url, json=payload, headers=headers)
 
         # Raise on 4xx/5xx
         response.raise_for_status()
 
-        logger.info(f"Response Status: {response.status_code} {response.reason}")
+        logger.info(f"Response Status: {response.status_code} {response.reason_phrase}")
         
-        # Try to return JSON, fallback to raw text
-        data = response.json()
-        delay = data.get("delay", 0)
-        delay = delay if isinstance(delay, (int, float)) else 0
-        correct = data.get("correct")
-        message = data.get("message", "")
-        next_url = data.get("url", "")
+        return _process_response(response.json())
         
-        logger.info(f"Answer Correct: {correct}")
-        logger.info(f"Time Elapsed: {delay}s")
-        if message:
-            logger.info(f"Server Message: {message}")
-        if next_url:
-            logger.info(f"Next URL: {next_url}")
-        
-        logger.info("Full Response (JSON):")
-        for line in json.dumps(data, indent=2).split('\n'):
-            logger.info(f"  {line}")
-        logger.info("="*80)
+    except httpx.HTTPStatusError as e:
+        # Extract server's error response
+        return _log_http_error(url, e.response.status_code, e.response.reason_phrase, e.response)
+
+    except Exception as e:
+        return _log_unexpected_error(url, e)
+
+
+async def apost_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+    """Async twin of post_request using httpx, so the event loop is never blocked."""
+    headers = headers or {"Content-Type": "application/json"}
+    try:
+        _log_request(url, payload, headers)
         
-        # Process response according to quiz logic
-        if not correct and delay < 180:
-            del data["url"]
-        if delay >= 180:
-            data = {
-                "url": data.get("url")
-            }
+        response = await get_async_client().post(url, json=payload, headers=headers)
+
+        # Raise on 4xx/5xx
+        response.raise_for_status()
+
+        logger.info(f"Response Status: {response.status_code} {response.reason_phrase}")
         
-        return data
+        return _process_response(response.json())
         
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Extract server's error response
-        err_resp = e.response
-        
-        logger.error("="*80)
-        logger.error(f"HTTP ERROR: {e.response.status_code} {e.response.reason}")
-        logger.error(f"URL: {url}")
-
-        try:
-            err_data = err_resp.json()
-            logger.error("Error Response (JSON):")
-            for line in json.dumps(err_data, indent=2).split('\n'):
-                logger.error(f"  {line}")
-        except ValueError:
-            err_data = err_resp.text
-            logger.error(f"Error Response (Text): {err_data}")
-        
-        logger.error("="*80)
-        return err_data
+        return _log_http_error(url, e.response.status_code, e.response.reason_phrase, e.response)
 
     except Exception as e:
-        logger.error("="*80)
-        logger.error(f"UNEXPECTED ERROR during POST request")
-        logger.error(f"URL: {url}")
-        logger.error(f"Error: {str(e)}")
-        logger.error("="*80)
-        return str(e)
+        return _log_unexpected_error(url, e)
+
+
+post_request.coroutine = apost_request
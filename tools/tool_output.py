@@ -0,0 +1,76 @@
+from langchain_core.tools import tool
+import asyncio
+import hashlib
+from logger_config import get_logger, TOOL_OUTPUT_DIR
+
+logger = get_logger("tool_output")
+
+DEFAULT_READ_LENGTH = 20000
+# Longest slice one call returns, so a read stays within the conversation's tool output cap
+MAX_READ_LENGTH = 20000
+
+
+def save_tool_output(content: str) -> str:
+    """Persist a full tool output under data/tool_outputs/ and return its handle."""
+    handle = hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()[:16]
+    path = TOOL_OUTPUT_DIR / f"{handle}.txt"
+    if not path.exists():
+        path.write_text(content, encoding="utf-8", errors="replace")
+        logger.info(f"Stored tool output {handle} ({len(content)} characters)")
+    return handle
+
+
+def load_tool_output(handle: str) -> str:
+    # Handles are hex digests; reject anything that could escape the directory
+    if not handle.isalnum():
+        raise ValueError(f"Invalid handle: {handle}")
+    path = TOOL_OUTPUT_DIR / f"{handle}.txt"
+    if not path.exists():
+        raise FileNotFoundError(f"No stored output for handle {handle}")
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+@tool
+def read_tool_output(handle: str, offset: int = 0, length: int = DEFAULT_READ_LENGTH) -> str:
+    """
+    Read part of an earlier tool output that was truncated in the conversation.
+
+    Large tool results (rendered HTML, long program output, transcripts) are
+    shortened in the message history and replaced with a digest plus a handle.
+    Use this tool to fetch the omitted text instead of re-running the original tool.
+
+    Parameters
+    ----------
+    handle : str
+        The handle printed in the truncation notice.
+    offset : int
+        Character offset to start reading from (default 0).
+    length : int
+        Number of characters to return (default and maximum 20000).
+
+    Returns
+    -------
+    str
+        The requested slice of the stored output, followed by a note if more remains.
+    """
+    try:
+        content = load_tool_output(handle)
+        length = min(length, MAX_READ_LENGTH)
+        chunk = content[offset:offset + length]
+        logger.info(f"Read {len(chunk)} characters of output {handle} from offset {offset}")
+        end = offset + len(chunk)
+        if end < len(content):
+            chunk += f"\n... [{len(content) - end} more characters; continue with offset={end}]"
+        return chunk
+    except Exception as e:
+        error_msg = f"Error reading tool output: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+async def aread_tool_output(handle: str, offset: int = 0, length: int = DEFAULT_READ_LENGTH) -> str:
+    """Async twin of read_tool_output that reads the file in a worker thread."""
+    return await asyncio.to_thread(read_tool_output.func, handle, offset, length)
+
+
+read_tool_output.coroutine = aread_tool_output
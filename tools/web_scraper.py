@@ -1,18 +1,31 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
 from logger_config import get_logger
+from .page_extractor import extract_page
+from .page_fetcher import FetchResult, page_fetcher
 
 logger = get_logger("web_scraper")
 
+
+def _page_digest(url: str, result: FetchResult) -> str:
+    # Non-HTML responses (JSON, CSV, text endpoints) are already compact
+    content = extract_page(url, result.html) if result.is_html else result.html
+    logger.info(f"Content extracted successfully ({len(content)} characters)")
+    return content
+
+
 @tool
 def get_rendered_html(url: str) -> str:
     """
-    Fetch and return the fully rendered HTML of a webpage.
+    Fetch a webpage and return a compact digest of its rendered content.
 
-    This function uses Playwright to load a webpage in a headless Chromium
-    browser, allowing all JavaScript on the page to execute. Use this for
-    dynamic websites that require rendering.
+    The page is first fetched with a plain HTTP GET; if it relies on
+    JavaScript to build its content (inline scripts writing into the DOM,
+    empty app containers), it is loaded in a headless Chromium browser from a
+    process-wide pool so all scripts execute. The rendered HTML is then
+    reduced to what matters: visible text, forms with their absolute submit
+    endpoints, tables as CSV, a manifest of audio/image/file links, and other
+    links with absolute URLs. The full raw HTML is saved under data/pages/
+    and its path is included, so it can be parsed with run_code if needed.
 
     IMPORTANT RESTRICTIONS:
     - ONLY use this for actual HTML webpages (articles, documentation, dashboards).
@@ -27,28 +40,30 @@ def get_rendered_html(url: str) -> str:
     Returns
     -------
     str
-        The fully rendered and cleaned HTML content.
+        The page digest (text, forms, tables, media, links) and the path of
+        the raw HTML on disk.
     """
     logger.info(f"Fetching and rendering URL: {url}")
     try:
-        with sync_playwright() as p:
-            logger.info("Launching headless Chromium browser")
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+        # Plain GET when the page is complete without JS, pooled browser otherwise
+        return _page_digest(url, page_fetcher.fetch(url))
 
-            # Load the page (let JS execute)
-            logger.info(f"Loading page: {url}")
-            page.goto(url, wait_until="networkidle")
-            logger.info("Page loaded, extracting content")
+    except Exception as e:
+        error_msg = f"Error fetching/rendering page: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
 
-            # Extract rendered HTML
-            content = page.content()
 
-            browser.close()
-            logger.info(f"Content extracted successfully ({len(content)} characters)")
-            return content
+async def aget_rendered_html(url: str) -> str:
+    """Async twin of get_rendered_html using the async tiered fetcher."""
+    logger.info(f"Fetching and rendering URL: {url}")
+    try:
+        return _page_digest(url, await page_fetcher.afetch(url))
 
     except Exception as e:
         error_msg = f"Error fetching/rendering page: {str(e)}"
         logger.error(error_msg)
         return error_msg
+
+
+get_rendered_html.coroutine = aget_rendered_html
@@ -0,0 +1,193 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from logger_config import get_logger, PROJECT_ROOT
+from .dependency_broker import overlay_env
+from .process_limits import apply_rlimits, kill_process_tree, looks_like_oom, read_capped_file, snippet_env
+
+logger = get_logger("worker_pool")
+
+# Number of warm interpreters kept ready for run_code (0 disables the pool)
+RUN_CODE_WARM_WORKERS = int(os.getenv("RUN_CODE_WARM_WORKERS", "2"))
+# Recycle a worker after this many snippets or once its RSS exceeds the ceiling
+RUN_CODE_WORKER_MAX_RUNS = int(os.getenv("RUN_CODE_WORKER_MAX_RUNS", "50"))
+RUN_CODE_WORKER_MAX_RSS_MB = int(os.getenv("RUN_CODE_WORKER_MAX_RSS_MB", "1024"))
+# How long a call waits for a free worker before falling back to a cold subprocess
+RUN_CODE_WORKER_WAIT_SECONDS = float(os.getenv("RUN_CODE_WORKER_WAIT_SECONDS", "30"))
+
+WORKER_SCRIPT = Path(__file__).with_name("python_worker.py")
+
+
+class _Worker:
+    """One pre-started interpreter speaking the line-delimited JSON protocol of python_worker.py."""
+
+    def __init__(self):
+        started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            cwd=str(PROJECT_ROOT),
+            # Packages installed by add_dependencies live in the shared overlay
+            env=snippet_env(overlay_env()),
+            # Own session so a timeout kills the worker and anything the snippet spawned
+            start_new_session=True,
+            preexec_fn=apply_rlimits,
+        )
+        self.runs = 0
+        self.timed_out = False
+        ready = self._read()
+        logger.info(f"Warm worker {self.proc.pid} ready in {time.perf_counter() - started:.2f}s "
+                    f"(preloaded: {', '.join(ready.get('preloaded', [])) or 'nothing'})")
+
+    def _read(self) -> dict:
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"worker exited with code {self.proc.poll()}")
+        return json.loads(line)
+
+    def execute(self, path: Path, stdout_path: Path, stderr_path: Path, timeout: float) -> dict:
+        self.proc.stdin.write(json.dumps({
+            "path": str(path),
+            "stdout": str(stdout_path),
+            "stderr": str(stderr_path),
+            "cpu_seconds": timeout,
+        }) + "\n")
+        self.proc.stdin.flush()
+        # The protocol read blocks, so enforce the wall-clock limit from a timer
+        timer = threading.Timer(timeout, self._kill_for_timeout)
+        timer.start()
+        try:
+            reply = self._read()
+        finally:
+            timer.cancel()
+        self.runs += 1
+        return reply
+
+    def _kill_for_timeout(self) -> None:
+        self.timed_out = True
+        kill_process_tree(self.proc.pid)
+
+    def close(self) -> None:
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            kill_process_tree(self.proc.pid)
+
+
+class WorkerPool:
+    """
+    Pool of warm Python interpreters for run_code.
+
+    Workers import the common data-science modules once at startup, so a
+    snippet only pays for its own execution instead of `uv run` environment
+    resolution plus pandas/numpy imports. Each snippet runs in a fresh
+    namespace; workers are recycled after RUN_CODE_WORKER_MAX_RUNS snippets or
+    when their RSS exceeds RUN_CODE_WORKER_MAX_RSS_MB.
+    """
+
+    def __init__(self, size: int = RUN_CODE_WARM_WORKERS):
+        self.size = size
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _spawn(self) -> None:
+        try:
+            self._idle.put(_Worker())
+        except Exception as e:
+            logger.error(f"Failed to start warm worker: {e}")
+
+    def _spawn_async(self) -> None:
+        threading.Thread(target=self._spawn, name="run-code-worker-spawn", daemon=True).start()
+
+    def start(self) -> None:
+        """Pre-start the workers in the background (idempotent)."""
+        with self._lock:
+            if self._started or self.size <= 0:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._spawn_async()
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._started = False
+
+    def run(self, path: Path, timeout: float) -> Optional[dict]:
+        """
+        Execute a script on a warm worker, killing it if it exceeds timeout.
+
+        Returns None when no worker is available so the caller can fall back
+        to a cold subprocess.
+        """
+        if self.size <= 0:
+            return None
+        self.start()
+
+        waited = time.perf_counter()
+        try:
+            worker = self._idle.get(timeout=min(RUN_CODE_WORKER_WAIT_SECONDS, timeout))
+        except queue.Empty:
+            logger.warning("No warm worker available, falling back to a cold interpreter")
+            return None
+        startup_seconds = time.perf_counter() - waited
+
+        stdout_path = path.with_suffix(".out")
+        stderr_path = path.with_suffix(".err")
+        try:
+            reply = worker.execute(path, stdout_path, stderr_path, timeout)
+        except Exception as e:
+            # Timed out, or the snippet took the interpreter down (OOM, segfault, os._exit)
+            worker.close()
+            self._spawn_async()
+            error = f"Timed out after {timeout:.0f}s" if worker.timed_out else f"Worker process died: {e}"
+            logger.error(f"Warm worker {worker.proc.pid}: {error}")
+            reply = {"return_code": worker.proc.returncode if worker.proc.returncode is not None else -1,
+                     "exec_seconds": time.perf_counter() - waited - startup_seconds,
+                     "rss_kb": 0, "error": error}
+
+        stdout = read_capped_file(stdout_path)
+        stderr = read_capped_file(stderr_path)
+        if reply.get("error"):
+            stderr += f"\n{reply['error']}"
+        for p in (stdout_path, stderr_path):
+            p.unlink(missing_ok=True)
+
+        if not reply.get("error"):
+            rss_mb = reply.get("rss_kb", 0) / 1024
+            if worker.runs >= RUN_CODE_WORKER_MAX_RUNS or rss_mb > RUN_CODE_WORKER_MAX_RSS_MB:
+                logger.info(f"Recycling warm worker {worker.proc.pid} "
+                            f"after {worker.runs} runs ({rss_mb:.0f} MB RSS)")
+                worker.close()
+                self._spawn_async()
+            else:
+                self._idle.put(worker)
+
+        return {
+            "stdout": stdout,
+            "stderr": stderr,
+            "return_code": reply["return_code"],
+            "timed_out": worker.timed_out,
+            "oom_killed": looks_like_oom(reply["return_code"], stderr, killed_by_us=worker.timed_out),
+            "startup_seconds": startup_seconds,
+            "exec_seconds": reply["exec_seconds"],
+            "cpu_seconds": reply.get("cpu_seconds"),
+        }
+
+
+worker_pool = WorkerPool()